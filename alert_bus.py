@@ -0,0 +1,207 @@
+from typing import NamedTuple, AsyncIterator
+from request_scheduler import backoff_delay
+from loguru import logger
+
+import asyncio
+import base64
+import glob
+import json
+import time
+import os
+
+
+class Alert(NamedTuple):
+    """
+    The class `Alert` is a sent alert, `record` is its `AlertData.to_json` for consumers that don't
+    parse the Telegram HTML message, e.g. webhooks.
+    """
+    msg: str
+    image: bytes
+    time: float
+    exchange: str = ''
+    ticker: str = ''
+    record: dict = None
+
+
+def encode(alert: Alert) -> bytes:
+    """
+    The function `encode` frames an alert as one JSON line for the Unix socket.
+    """
+    return json.dumps({**alert._asdict(), 'image': base64.b64encode(alert.image).decode()}).encode() + b'\n'
+
+
+def decode(line: bytes) -> Alert:
+    data = json.loads(line)
+    data['image'] = base64.b64decode(data['image'])
+    return Alert(**data)
+
+
+class Throttle:
+    """
+    The class `Throttle` lets one alert through every `interval` seconds.
+    """
+
+    def __init__(self, interval: float = 0) -> None:
+        self.interval = interval
+        self._last = float('-inf')
+
+    @property
+    def next(self) -> float:
+        # the interval may be changed between two alerts, e.g. by a settings reload
+        return self._last + self.interval
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.next
+
+    def mark(self) -> None:
+        self._last = time.monotonic()
+
+
+class Subscription:
+    """
+    The class `Subscription` is the queue of one subscriber of the `AlertBus`. With an `interval` the
+    alerts that arrive less than `interval` seconds after the last delivered one are dropped, or, with
+    `latest`, only the newest of them is kept and delivered when the interval is over. A slow
+    subscriber loses its oldest alerts above `maxsize`, the publisher never waits.
+    """
+
+    def __init__(self, bus: 'AlertBus', interval: float = 0, latest: bool = False, maxsize: int = 100) -> None:
+        self.bus = bus
+        self.throttle = Throttle(interval)
+        self.latest = latest
+        self.dropped = 0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def offer(self, alert: Alert) -> None:
+        if not self.latest and not self.throttle.ready():
+            self.dropped += 1
+            return
+        if self.queue.full() or (self.latest and self.throttle.interval):
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+        self.queue.put_nowait(alert)
+
+    async def get(self) -> Alert:
+        if self.latest:
+            await asyncio.sleep(max(0.0, self.throttle.next - time.monotonic()))
+        alert = await self.queue.get()
+        self.throttle.mark()
+        return alert
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Alert:
+        return await self.get()
+
+    def close(self) -> None:
+        self.bus.subscribers.discard(self)
+
+
+class AlertBus:
+    """
+    The class `AlertBus` passes sent alerts to subscribers of the same process and, through `serve`, to
+    other processes over a Unix socket, one JSON line per alert. Publishing never blocks the alert
+    pipeline.
+    """
+
+    def __init__(self) -> None:
+        self.subscribers: set[Subscription] = set()
+
+    def subscribe(self, interval: float = 0, latest: bool = False, maxsize: int = 100) -> Subscription:
+        """
+        The function `subscribe` adds a subscriber.
+
+        :param interval: The `interval` parameter is the minimal time in seconds between two delivered
+        alerts, 0 delivers every alert
+        :type interval: float
+        :param latest: The `latest` parameter keeps the newest throttled alert instead of dropping it
+        :type latest: bool
+        :param maxsize: The `maxsize` parameter is the maximal number of queued alerts
+        :type maxsize: int
+        :return: a `Subscription`, an async iterator of `Alert`.
+        """
+        subscription = Subscription(self, interval, latest, maxsize)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def publish(self, alert: Alert) -> None:
+        for subscription in list(self.subscribers):
+            subscription.offer(alert)
+
+    async def serve(self, path: str) -> asyncio.AbstractServer:
+        """
+        The function `serve` publishes the alerts on a Unix socket. The socket file is created with a
+        temporary name and renamed to `path`, so clients never connect to a half-initialized server.
+
+        :param path: The `path` parameter is the path of the socket, e.g. 'temp/alerts.sock'
+        :type path: str
+        :return: the `asyncio` server.
+        """
+        async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            subscription = self.subscribe()
+            try:
+                async for alert in subscription:
+                    writer.write(encode(alert))
+                    await writer.drain()
+            except (ConnectionError, OSError, asyncio.CancelledError):
+                # the client is gone or the server stops
+                pass
+            finally:
+                subscription.close()
+                writer.close()
+
+        tmp_path = f'{path}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        server = await asyncio.start_unix_server(client, tmp_path)
+        os.replace(tmp_path, path)
+        return server
+
+
+async def listen(pattern: str = 'temp/alerts*.sock') -> AsyncIterator[Alert]:
+    """
+    The function `listen` receives the alerts of all worker processes whose sockets match `pattern`.
+    Broken connections are reopened with jittered backoff and new sockets are picked up.
+
+    :param pattern: The `pattern` parameter is a glob pattern of the socket paths
+    :type pattern: str
+    :return: an async iterator of `Alert`.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    readers: dict[str, asyncio.Task] = {}
+
+    async def read(path: str) -> None:
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(path, limit=2**26)
+                attempt = 0
+                try:
+                    while line := await reader.readline():
+                        await queue.put(decode(line))
+                finally:
+                    writer.close()
+            except (ConnectionError, OSError) as e:
+                if not os.path.exists(path):
+                    return
+                logger.error(f'{path} | {e}')
+            await asyncio.sleep(backoff_delay(attempt, maximum=30))
+            attempt += 1
+
+    async def discover() -> None:
+        while True:
+            for path in glob.glob(pattern):
+                if path.endswith('.sock') and (path not in readers or readers[path].done()):
+                    readers[path] = asyncio.create_task(read(path))
+            await asyncio.sleep(30)
+
+    discovery = asyncio.create_task(discover())
+    try:
+        while True:
+            yield await queue.get()
+    finally:
+        discovery.cancel()
+        for task in readers.values():
+            task.cancel()
@@ -0,0 +1,194 @@
+from utils import send_alert_message
+from ccxt.base.exchange import Exchange
+from metrics import StageMetrics, stage_metrics
+from ohlcv_cache import price_since
+from worker_context import WorkerContext
+from alert_bus import Alert
+from price_store import PriceStore
+from detector import Pump
+from consolidator import CoinMove
+from message_templates import AlertData, TemplateStore, message_templates
+from loguru import logger
+
+import asyncio
+import time
+
+
+def percent_change(new_price: float, old_price: float) -> float:
+    """
+    The function `percent_change` returns the change in percent from `old_price`, None without an old
+    price.
+    """
+    if not old_price:
+        return None
+    return (new_price/old_price-1)*100
+
+
+def kind_of(pump: Pump) -> str:
+    return pump.rule.kind if pump.rule is not None else 'rise'
+
+
+def move_of(pump: Pump) -> float:
+    """
+    The function `move_of` returns the size of the move of a trigger in the unit of its rule, the
+    percent difference for triggers without a rule value.
+    """
+    return pump.value or abs(pump.percent)
+
+
+class AlertPipeline:
+    """
+    The class `AlertPipeline` enriches and sends alerts outside of the detection loop. Triggers are put
+    into a queue by `submit` and processed by a bounded number of worker tasks, the OHLCV and news
+    fetches of one alert run concurrently. The reference prices and the chart are taken from one cached
+    series of 5m candles. A ticker stays pending until its alert is sent or has failed, so the detection
+    loop doesn't queue it twice. The message is rendered from an `AlertData` record with the template of
+    the exchange and its language. If the context has an `AlertStore`, a trigger within the cooldown of
+    its symbol is dropped by `submit` before any enrichment, unless its move escalated.
+    """
+
+    def __init__(self, exchange: Exchange, exchange_name: str, context: WorkerContext,
+                 store: PriceStore, workers: int = 4,
+                 metrics: StageMetrics = stage_metrics,
+                 templates: TemplateStore = message_templates) -> None:
+        """
+        :param exchange: The `exchange` parameter is the `ccxt.async_support` exchange of the worker
+        :type exchange: Exchange
+        :param exchange_name: The `exchange_name` parameter is the name of the exchange
+        :type exchange_name: str
+        :param context: The `context` parameter holds the HTTP session, OHLCV cache, news service, chart
+        renderer, Telegram delivery and settings shared by the exchanges
+        :type context: WorkerContext
+        :param store: The `store` parameter is the `PriceStore`, the history of a ticker is cleared after
+        its alert is sent
+        :type store: PriceStore
+        :param workers: The `workers` parameter is the number of alerts enriched at the same time
+        :type workers: int
+        :param metrics: The `metrics` parameter is the `StageMetrics` that receives per-stage latencies
+        :type metrics: StageMetrics
+        :param templates: The `templates` parameter is the `TemplateStore` of the message templates
+        :type templates: TemplateStore
+        """
+        self.exchange = exchange
+        self.exchange_name = exchange_name
+        self.context = context
+        self.store = store
+        self.workers = workers
+        self.metrics = metrics
+        self.templates = templates
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pending: set[str] = set()
+
+    def submit(self, pump: Pump, move: CoinMove = None) -> bool:
+        """
+        The function `submit` queues a trigger without waiting for it to be processed.
+
+        :param pump: The `pump` parameter is a trigger returned by `detect_pumps`
+        :type pump: Pump
+        :param move: The `move` parameter is the optional `CoinMove` of the coin on all exchanges, its
+        breakdown is added to the message
+        :type move: CoinMove
+        :return: True if the trigger was queued, False if the ticker is already pending or in its
+        cooldown.
+        """
+        if pump.ticker in self.pending:
+            return False
+        alert_store = self.context.alert_store
+        if alert_store is not None:
+            current = self.context.settings.current.exchanges[self.exchange_name]
+            if not alert_store.allows(self.exchange_name, pump.ticker, kind_of(pump), move_of(pump),
+                                      current.alert_cooldown_minutes * 60, current.escalation_percent):
+                logger.info(f'{self.exchange_name} | {pump.ticker} {kind_of(pump)} alert suppressed, in the cooldown of the alert store')
+                self.metrics.inc('suppressed_alerts', exchange=self.exchange_name, rule=kind_of(pump))
+                return False
+        self.pending.add(pump.ticker)
+        self.queue.put_nowait((pump, move, time.perf_counter()))
+        self.metrics.set('pending_alerts', len(self.pending), exchange=self.exchange_name)
+        return True
+
+    async def run(self) -> None:
+        """
+        The function `run` starts the worker tasks and runs until it is cancelled.
+        """
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def _worker(self) -> None:
+        while True:
+            pump, move, queued_at = await self.queue.get()
+            try:
+                await self._process(pump, move, queued_at)
+            except Exception as e:
+                logger.error(f'{self.exchange_name} | {pump.ticker} | {e}')
+                self.metrics.inc('alert_errors', exchange=self.exchange_name)
+                self._record(pump, 'failed')
+            finally:
+                self.pending.discard(pump.ticker)
+                self.metrics.set('pending_alerts', len(self.pending), exchange=self.exchange_name)
+                self.queue.task_done()
+
+    def _record(self, pump: Pump, status: str) -> None:
+        if self.context.alert_store is None:
+            return
+        try:
+            self.context.alert_store.record(
+                self.exchange_name, pump.ticker, kind_of(pump), move_of(pump), pump.percent, pump.new_price, status
+            )
+        except Exception as e:
+            logger.error(f'{self.exchange_name} | {pump.ticker} | Alert store | {e}')
+
+    async def _timed(self, stage: str, coroutine):
+        with self.metrics.timer(stage, exchange=self.exchange_name):
+            return await coroutine
+
+    async def deliver(self, data: AlertData, msg: str, graph: bytes) -> None:
+        """
+        The function `deliver` sends a formatted alert to the Telegram chats and publishes it on the
+        `AlertBus`.
+
+        :param data: The `data` parameter is the record of the alert
+        :type data: AlertData
+        :param msg: The `msg` parameter is the Telegram HTML message
+        :type msg: str
+        :param graph: The `graph` parameter is the PNG chart
+        :type graph: bytes
+        """
+        chat_ids = self.context.settings.current.telegram.chat_ids
+        record = data.to_json()
+        await self._timed('send', send_alert_message(self.context.delivery, chat_ids, msg, graph, record))
+        if self.context.bus is not None:
+            self.context.bus.publish(Alert(msg, graph, data.time, self.exchange_name, data.ticker, record))
+
+    async def _process(self, pump: Pump, move: CoinMove, queued_at: float) -> None:
+        ticker, index, old_price, new_price = pump[:4]
+        current = self.context.settings.current
+        self.metrics.observe('queue_wait', time.perf_counter() - queued_at, exchange=self.exchange_name)
+
+        now_time = self.exchange.milliseconds()
+        # the reference prices and the chart come from one cached series of 5m candles, a cold symbol
+        # costs the 288 candles of 24 hours, a repeated alert only the new candles
+        candles, have_news = await asyncio.gather(
+            self._timed('ohlcv', self.context.ohlcv_cache.candles(self.exchange, ticker, '5m', now_time - 24*60*60*10**3)),
+            self._timed('news', self.context.news_service.has_recent_news(ticker.split('/')[0]))
+        )
+        yesterday_change = percent_change(new_price, price_since(candles, now_time - 24*60*60*10**3))
+        half_hour_change = percent_change(new_price, price_since(candles, now_time - 30*60*10**3))
+        candlesticks = candles[candles[:, 0] >= now_time - 800*60*10**3].tolist()
+        graph = await self._timed(
+            'render', asyncio.to_thread(self.context.renderer.render, candlesticks, ticker, self.exchange_name, new_price)
+        )
+
+        kind = kind_of(pump)
+        data = AlertData(
+            self.exchange_name, ticker, kind, index+1, pump.value, old_price, new_price, yesterday_change,
+            half_hour_change, have_news, *AlertData.venues_of(move), time.time()
+        )
+        template = self.templates.get(self.exchange_name, current.exchanges[self.exchange_name].language)
+        msg = template.render(data, current.telegram.nums_precision)
+        await self.deliver(data, msg, graph)
+        self._record(pump, 'sent')
+        self.store.clear(ticker)
+
+        total = time.perf_counter() - queued_at
+        self.metrics.observe('total', total, exchange=self.exchange_name)
+        self.metrics.inc('alerts', exchange=self.exchange_name, rule=kind)
+        logger.info(f'{self.exchange_name} | {ticker} alert sent in {total:.2f}s')
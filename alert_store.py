@@ -0,0 +1,159 @@
+from typing import NamedTuple
+from threading import Lock
+
+import sqlite3
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL NOT NULL,
+    percent REAL NOT NULL,
+    price REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_exchange_symbol_time ON alerts (exchange, symbol, time);
+CREATE INDEX IF NOT EXISTS alerts_time ON alerts (time);
+"""
+COLUMNS = 'time, exchange, symbol, kind, value, percent, price, status'
+
+
+class AlertRecord(NamedTuple):
+    time: float
+    exchange: str
+    symbol: str
+    kind: str
+    value: float
+    percent: float
+    price: float
+    status: str
+
+
+class AlertStore:
+    """
+    The class `AlertStore` records the alerts in a SQLite database in WAL mode, so the status bot can
+    read it while the workers write. The last sent alert of every exchange, symbol and kind of rule is
+    also kept in a dictionary, so `allows` decides in O(1) before any enrichment whether a trigger is
+    in the cooldown of the symbol. Within the cooldown a trigger is only alerted again if its move grew
+    by `escalation_percent` percent against the last alert.
+    """
+
+    def __init__(self, filename: str = 'temp/alerts.db', retention_days: float = 90, readonly: bool = False) -> None:
+        """
+        :param filename: The `filename` parameter is the path of the database
+        :type filename: str
+        :param retention_days: The `retention_days` parameter is the number of days the alerts are kept
+        :type retention_days: float
+        :param readonly: The `readonly` parameter opens an existing database for queries only, e.g. in
+        the status bot
+        :type readonly: bool
+        """
+        self.filename = filename
+        self._lock = Lock()
+        self._last: dict[tuple, tuple] = {}
+        if readonly:
+            self.connection = sqlite3.connect(f'file:{filename}?mode=ro', uri=True, check_same_thread=False)
+            return
+        self.connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute('DELETE FROM alerts WHERE time < ?', (time.time() - retention_days*24*60*60,))
+        # SQLite takes the bare columns of a MAX() aggregate from the row of the maximum
+        for exchange, symbol, kind, sent_at, value in self.connection.execute(
+            "SELECT exchange, symbol, kind, MAX(time), value FROM alerts WHERE status = 'sent' GROUP BY exchange, symbol, kind"
+        ):
+            self._last[(exchange, symbol, kind)] = (sent_at, value)
+
+    def allows(self, exchange: str, symbol: str, kind: str, value: float, cooldown: float,
+               escalation_percent: float) -> bool:
+        """
+        The function `allows` checks if a trigger may be alerted.
+
+        :param exchange: The `exchange` parameter is the name of the exchange
+        :type exchange: str
+        :param symbol: The `symbol` parameter is the ticker symbol
+        :type symbol: str
+        :param kind: The `kind` parameter is the kind of the rule, e.g. 'rise'
+        :type kind: str
+        :param value: The `value` parameter is the size of the move in the unit of the rule, e.g. the
+        percent of a rise
+        :type value: float
+        :param cooldown: The `cooldown` parameter is the time in seconds after an alert of the symbol
+        :type cooldown: float
+        :param escalation_percent: The `escalation_percent` parameter is the growth in percent of the move
+        that is alerted within the cooldown, 0 never alerts within the cooldown
+        :type escalation_percent: float
+        :return: True if there was no alert within the cooldown or the move escalated.
+        """
+        last = self._last.get((exchange, symbol, kind))
+        if last is None or time.time() - last[0] >= cooldown:
+            return True
+        return escalation_percent > 0 and abs(value) >= abs(last[1]) * (1 + escalation_percent / 100)
+
+    def record(self, exchange: str, symbol: str, kind: str, value: float, percent: float, price: float,
+               status: str = 'sent') -> None:
+        """
+        The function `record` stores an alert. Only sent alerts start a cooldown.
+
+        :param status: The `status` parameter is 'sent' or 'failed'
+        :type status: str
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                f'INSERT INTO alerts ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (now, exchange, symbol, kind, value, percent, price, status)
+            )
+        if status == 'sent':
+            self.mark(exchange, symbol, kind, value, now)
+
+    def mark(self, exchange: str, symbol: str, kind: str, value: float, timestamp: float = None) -> None:
+        """
+        The function `mark` starts the cooldown of a symbol without storing an alert, e.g. in a shard
+        whose alerts are stored by the coordinator after it sent them.
+        """
+        self._last[(exchange, symbol, kind)] = (timestamp if timestamp is not None else time.time(), value)
+
+    def recent(self, limit: int = 10) -> list:
+        """
+        The function `recent` returns the last alerts.
+
+        :return: a list of `AlertRecord` from the newest one.
+        """
+        with self._lock:
+            rows = self.connection.execute(f'SELECT {COLUMNS} FROM alerts ORDER BY time DESC LIMIT ?', (limit,)).fetchall()
+        return [AlertRecord(*row) for row in rows]
+
+    def history(self, exchange: str, symbol: str, since: float = 0) -> list:
+        """
+        The function `history` returns the alerts of one symbol since a timestamp in seconds.
+
+        :return: a list of `AlertRecord` from the oldest one.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                f'SELECT {COLUMNS} FROM alerts WHERE exchange = ? AND symbol = ? AND time >= ? ORDER BY time',
+                (exchange, symbol, since)
+            ).fetchall()
+        return [AlertRecord(*row) for row in rows]
+
+    def counts(self, since: float) -> dict:
+        """
+        The function `counts` counts the alerts since a timestamp in seconds.
+
+        :return: a dictionary with `(exchange, status)` keys.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT exchange, status, COUNT(*) FROM alerts WHERE time >= ? GROUP BY exchange, status', (since,)
+            ).fetchall()
+        return {(exchange, status): count for exchange, status, count in rows}
+
+    def close(self) -> None:
+        self.connection.close()
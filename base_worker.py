@@ -1,18 +1,38 @@
 from utils import *
 from configparser import RawConfigParser
 from ccxt.base.exchange import Exchange
-from threading import Thread
-from decimal import Decimal
+from price_store import PriceStore
+from rule_engine import RuleEngine
+from settings import Settings, SettingsWatcher, ExchangeSettings
+from alert_pipeline import AlertPipeline
+from metrics import stage_metrics, serve_metrics
+from profiler import SamplingProfiler
+from request_scheduler import RequestScheduler, backoff_delay, PRIORITY_TICKERS, PRIORITY_ENRICHMENT, PRIORITY_BACKGROUND
+from ohlcv_cache import OhlcvCache
+from market_index import MarketIndex, parse_patterns, DEFAULT_EXCLUDE
+from news_service import NewsService
+from chart_renderer import get_renderer
+from worker_context import WorkerContext
+from alert_bus import AlertBus
+from demo_bot import relay
+from consolidator import Consolidator, CoinMove, format_gap
+from telegram_delivery import TelegramDelivery
+from tick_history import TickHistory
+from alert_store import AlertStore
+from streaming import CcxtProTransport, WebSocketTransport, stream_watcher
+from ccxt.base.errors import NotSupported
 from loguru import logger
 
-import schedule
+import ccxt.async_support
+import numpy as np
+import aiohttp
+import asyncio
 import time
-import json
-import ccxt
 import os
 
 
-def get_tickers_prices(exchange: Exchange, exchange_name: str, nums_precision: int) -> dict:
+async def get_tickers_prices(exchange: Exchange, exchange_name: str, nums_precision: int, index: MarketIndex,
+                             volumes: dict = None) -> dict:
     """
     The function `get_tickers_prices` retrieves ticker prices from different exchanges based on the
     exchange name and precision of the numbers.
@@ -27,70 +47,71 @@ def get_tickers_prices(exchange: Exchange, exchange_name: str, nums_precision: i
     decimal places to consider when filtering tickers based on their last trade price. For example, if
     `nums_precision` is set to 2, tickers with a last trade price less than 0.01 will be excluded from
     :type nums_precision: int
+    :param index: The `index` parameter is the `MarketIndex` with the watched symbols of the exchange
+    :type index: MarketIndex
+    :param volumes: The `volumes` parameter is an optional dictionary that receives the 24h quote volume
+    of every returned ticker
+    :type volumes: dict
     :return: a dictionary containing ticker symbols as keys and their corresponding prices as values.
     """
+    min_price = 1/10**nums_precision
     prices = {}
+    start = time.perf_counter()
     try:
         if exchange_name in ('binance', 'bybit'):
-            response = exchange.fetch_tickers()
-            tickers = [tckr for tckr in response if 'USDT' in tckr and response[tckr]['last'] is not None]
-            prices.update({ticker: response[ticker]['last'] for ticker in tickers if response[ticker]['last'] > 1/10**nums_precision})
+            response = await exchange.fetch_tickers()
+            symbols = index.symbols
+            for symbol, ticker in response.items():
+                price = ticker['last']
+                if symbol in symbols and price is not None and price > min_price:
+                    prices[symbol] = price
+                    if volumes is not None:
+                        volumes[symbol] = ticker.get('quoteVolume')
         elif exchange_name == 'kucoin':
-            response = exchange.fetch_markets()
-            tickers = [tckr for tckr in response if tckr['info']['quoteCurrency'] == 'USDT']
-            prices.update({ticker['symbol']: ticker['info']['lastTradePrice'] for ticker in tickers if ticker['info']['lastTradePrice'] > 1/10**nums_precision})
+            # kucoinfutures has no fetch_tickers, the active contracts carry the last trade price
+            response = await exchange.futuresPublicGetContractsActive()
+            ids = index.ids
+            for contract in response['data']:
+                symbol = ids.get(contract['symbol'])
+                price = contract.get('lastTradePrice')
+                if symbol is not None and price is not None and float(price) > min_price:
+                    prices[symbol] = float(price)
+                    if volumes is not None:
+                        volumes[symbol] = contract.get('turnoverOf24h')
     except Exception as e:
         logger.error(f'Error {exchange_name} | {e}')
-        return {}   
+        stage_metrics.inc('ticker_errors', exchange=exchange_name)
+        return {}
+    finally:
+        stage_metrics.observe('tickers', time.perf_counter() - start, exchange=exchange_name)
     return prices
 
 
-def get_tickers_data(exchange_name: str) -> dict:
+def update_tickers_info(exchange_name: str, store: PriceStore) -> None:
     """
-    The function `get_tickers_data` retrieves ticker data from a JSON file based on the exchange name
-    and returns it as a dictionary.
-    
-    :param exchange_name: The exchange_name parameter is a string that represents the name of the
-    exchange. It is used to construct the file path for the tickers data file
-    :type exchange_name: str
-    :return: a dictionary.
-    """
-    while True:
-        try:
-            with open(f'temp/{exchange_name}_tickers.json') as f:
-                data = json.load(f)
-            return data
-        except Exception as e:
-            logger.error(e)
-            return {}
-
-
-def update_tickers_info(exchange_name: str, tickers_info: dict) -> None:
-    """
-    The function `update_tickers_info` writes the `tickers_info` dictionary to a JSON file with the name
-    `exchange_name_tickers.json` in the `temp` directory.
+    The function `update_tickers_info` writes a snapshot of the price store to the JSON file
+    `temp/{exchange_name}_tickers.json`. The snapshot is optional and only used for inspection, the
+    workers themselves read prices from the store.
     
     :param exchange_name: The exchange_name parameter is a string that represents the name of the
     exchange. It is used to create a unique filename for the JSON file that will store the tickers
     information
     :type exchange_name: str
-    :param tickers_info: The `tickers_info` parameter is a dictionary that contains information about
-    tickers. It is used to store and update ticker information for a specific exchange
-    :type tickers_info: dict
+    :param store: The `store` parameter is the `PriceStore` shared by `watcher` and `sender`
+    :type store: PriceStore
     """
-    while True:
-        try:
-            with open(f'temp/{exchange_name}_tickers.json', 'w') as f:
-                json.dump(tickers_info, f, indent=4)
-            break
-        except Exception as e:
-            logger.error(e)
+    try:
+        with stage_metrics.timer('snapshot', exchange=exchange_name):
+            store.snapshot(f'temp/{exchange_name}_tickers.json')
+    except Exception as e:
+        logger.error(e)
 
 
-def watcher(exchange, exchange_name: str, nums_precision: int) -> None:
+async def watcher(exchange, exchange_name: str, nums_precision: int, store: PriceStore, index: MarketIndex,
+                  history: TickHistory = None, volume_store: PriceStore = None) -> None:
     """
-    The `watcher` function retrieves ticker prices from an exchange, stores them in a JSON file, and
-    updates the ticker information if the file already exists.
+    The `watcher` function retrieves ticker prices from an exchange and pushes them into the price
+    store as a new minute slot and into the tick history.
     
     :param exchange: The "exchange" parameter is an object or instance of a class that represents a
     cryptocurrency exchange. It is used to interact with the exchange's API and retrieve ticker prices
@@ -100,41 +121,62 @@ def watcher(exchange, exchange_name: str, nums_precision: int) -> None:
     :param nums_precision: The `nums_precision` parameter is an integer that represents the number of
     decimal places to round the ticker prices to
     :type nums_precision: int
-    :return: The function `watcher` does not return anything. It performs some operations and updates
-    tickers information, but it does not have a return statement.
+    :param store: The `store` parameter is the `PriceStore` that keeps the per-minute prices
+    :type store: PriceStore
+    :param index: The `index` parameter is the `MarketIndex` with the watched symbols
+    :type index: MarketIndex
+    :param history: The `history` parameter is an optional `TickHistory` that records every tick
+    :type history: TickHistory
+    :param volume_store: The `volume_store` parameter is an optional `PriceStore` that receives the 24h
+    quote volumes of the tickers for the volume rules
+    :type volume_store: PriceStore
     """
-    tickers_prices = get_tickers_prices(exchange, exchange_name, nums_precision)
+    volumes = {} if volume_store is not None else None
+    tickers_prices = await get_tickers_prices(exchange, exchange_name, nums_precision, index, volumes)
     k = 0
     while tickers_prices == {}:
-        tickers_prices = get_tickers_prices(exchange, exchange_name, nums_precision)
+        await asyncio.sleep(backoff_delay(k, maximum=30))
+        tickers_prices = await get_tickers_prices(exchange, exchange_name, nums_precision, index, volumes)
+        stage_metrics.inc('watcher_retries', exchange=exchange_name)
         k += 1
-        if k > 10:
+        if k == 10:
             logger.error(f'{exchange_name} | Too many errors while getting tickers.')
-    data_filename = f'temp/{exchange_name}_tickers.json'
-    if os.path.exists(data_filename):
-        try:
-            data = get_tickers_data(exchange_name)
-            for ticker in tickers_prices:
-                if ticker not in data:
-                    data[ticker] = [tickers_prices[ticker]]
-                else:
-                    data[ticker].insert(0, tickers_prices[ticker])
-                    if len(data[ticker]) > 10:
-                        del data[ticker][-1]
-            update_tickers_info(exchange_name, data)
-        except Exception as e:
-            logger.error(e)
-    else:
-        data = {}
-        for ticker in tickers_prices:
-            data[ticker] = [tickers_prices[ticker]]
-        update_tickers_info(exchange_name, data)
+    store.push(tickers_prices)
+    if volume_store is not None:
+        # the same keys as the prices, so both stores keep the same row order
+        volume_store.push({symbol: volumes.get(symbol) or np.nan for symbol in tickers_prices})
+    if history is not None:
+        with stage_metrics.timer('history_append', exchange=exchange_name):
+            history.append(exchange.milliseconds(), tickers_prices)
+    stage_metrics.set('symbols', len(tickers_prices), exchange=exchange_name)
+    stage_metrics.set('last_tick', time.time(), exchange=exchange_name)
 
 
-def course_watcher(exchange, exchange_name: str, nums_precision: int) -> None:
+async def snapshot_watcher(exchange_name: str, store: PriceStore, snapshot_minutes: int) -> None:
     """
-    The function `course_watcher` sets up a schedule to periodically call the `watcher` function with
-    the specified parameters.
+    The function `snapshot_watcher` writes a JSON snapshot of the price store every `snapshot_minutes`
+    minutes.
+    
+    :param exchange_name: The `exchange_name` parameter is a string that represents the name of the
+    exchange. It is used in the snapshot filename
+    :type exchange_name: str
+    :param store: The `store` parameter is the `PriceStore` to snapshot
+    :type store: PriceStore
+    :param snapshot_minutes: The `snapshot_minutes` parameter is the interval in minutes between
+    snapshots
+    :type snapshot_minutes: int
+    """
+    while True:
+        await asyncio.sleep(snapshot_minutes * 60)
+        await asyncio.to_thread(update_tickers_info, exchange_name, store)
+
+
+async def course_watcher(exchange, exchange_name: str, nums_precision: int, store: PriceStore,
+                         index: MarketIndex, snapshot_minutes: int = 0, transport=None,
+                         history: TickHistory = None, volume_store: PriceStore = None, interval: float = 60) -> None:
+    """
+    The function `course_watcher` calls the `watcher` function once a minute. If a stream transport is
+    given, the prices are streamed by `stream_watcher` instead of polling.
     
     :param exchange: The "exchange" parameter is the object or instance of the exchange that you want to
     watch. It could be an API client or a connection to a trading platform
@@ -145,18 +187,134 @@ def course_watcher(exchange, exchange_name: str, nums_precision: int) -> None:
     decimal places to round the numbers to. It is used in the `watcher` function to format the numbers
     before displaying them
     :type nums_precision: int
+    :param store: The `store` parameter is the `PriceStore` that the `watcher` function fills
+    :type store: PriceStore
+    :param index: The `index` parameter is the `MarketIndex` with the watched symbols
+    :type index: MarketIndex
+    :param snapshot_minutes: The `snapshot_minutes` parameter is the interval in minutes between JSON
+    snapshots of the store. 0 disables snapshots
+    :type snapshot_minutes: int
+    :param transport: The `transport` parameter is an optional stream transport from the `streaming`
+    module. None means polling with `fetch_tickers` once a minute
+    :param history: The `history` parameter is an optional `TickHistory` that records every tick
+    :type history: TickHistory
+    :param volume_store: The `volume_store` parameter is an optional `PriceStore` of 24h quote volumes,
+    streams carry no volumes, so it is only filled by polling
+    :type volume_store: PriceStore
+    :param interval: The `interval` parameter is the time in seconds between two polls, a minute as the
+    slots of the store are minutes, shorter only to speed up tests with a fake exchange
+    :type interval: float
     """
-    watcher(exchange, exchange_name, nums_precision)
-    schedule.every(1).minutes.do(lambda: watcher(exchange, exchange_name, nums_precision))
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(0.1)
-        except Exception as e:
-            logger.error(e)
+    tasks = []
+    if snapshot_minutes > 0:
+        tasks.append(asyncio.create_task(snapshot_watcher(exchange_name, store, snapshot_minutes)))
+    try:
+        if transport is not None:
+            await stream_watcher(transport, exchange_name, nums_precision, store, index, history)
+        else:
+            next_run = time.monotonic()
+            while True:
+                try:
+                    await watcher(exchange, exchange_name, nums_precision, store, index, history, volume_store)
+                except Exception as e:
+                    logger.error(e)
+                next_run += interval
+                await asyncio.sleep(max(0, next_run - time.monotonic()))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def create_exchange(exchange_name: str, session: aiohttp.ClientSession) -> Exchange:
+    """
+    The function `create_exchange` creates the `ccxt.async_support` exchange of a supported exchange
+    name.
+
+    :param exchange_name: The `exchange_name` parameter is 'binance', 'bybit' or 'kucoin'
+    :type exchange_name: str
+    :param session: The `session` parameter is the shared HTTP session
+    :type session: aiohttp.ClientSession
+    :return: an `Exchange`.
+    """
+    exchange_classes = {
+        'binance': ccxt.async_support.binance,
+        'bybit': ccxt.async_support.bybit,
+        'kucoin': ccxt.async_support.kucoinfutures
+    }
+    if exchange_name not in exchange_classes:
+        raise BaseException('Exchange isn\'t supported')
+    return exchange_classes[exchange_name]({'session': session})
+
+
+def create_transport(config: RawConfigParser, exchange_name: str, exchange: Exchange, session: aiohttp.ClientSession):
+    """
+    The function `create_transport` creates the stream transport of an exchange if `ingestion` is
+    'streaming' in its config section.
+
+    :return: a stream transport, None for polling.
+    """
+    if config.get(exchange_name, 'ingestion', fallback='polling') != 'streaming':
+        return None
+    stream_url = config.get(exchange_name, 'stream_url', fallback='')
+    try:
+        if stream_url:
+            return WebSocketTransport(stream_url, session)
+        return CcxtProTransport(exchange.id, session)
+    except NotSupported as e:
+        logger.error(f'{exchange_name} | {e}, falling back to polling')
 
 
-def sender(config: RawConfigParser, exchange_name: str) -> None:
+def create_history(config: RawConfigParser, exchange_name: str) -> TickHistory:
+    """
+    The function `create_history` creates the `TickHistory` of an exchange if `[history] enabled`.
+
+    :return: a `TickHistory`, None if the history is disabled.
+    """
+    if not config.getboolean('history', 'enabled', fallback=False):
+        return None
+    return TickHistory(
+        os.path.join(config.get('history', 'directory', fallback='history'), exchange_name),
+        config.getint('history', 'retention_days', fallback=30)
+    )
+
+
+def create_alert_store(config: RawConfigParser) -> AlertStore:
+    """
+    The function `create_alert_store` opens the `AlertStore` of the process if `[alert_store] enabled`.
+
+    :return: an `AlertStore`, None if the store is disabled.
+    """
+    if not config.getboolean('alert_store', 'enabled', fallback=True):
+        return None
+    return AlertStore(
+        config.get('alert_store', 'filename', fallback=os.path.join('temp', 'alerts.db')),
+        config.getfloat('alert_store', 'retention_days', fallback=90)
+    )
+
+
+def reload_engine(exchange_name: str, engine: RuleEngine, current: ExchangeSettings, store,
+                  volume_store=None) -> RuleEngine:
+    """
+    The function `reload_engine` builds the rule engine of reloaded exchange settings.
+
+    :param engine: The `engine` parameter is the running `RuleEngine`
+    :type engine: RuleEngine
+    :param current: The `current` parameter is the reloaded `ExchangeSettings`
+    :type current: ExchangeSettings
+    :param store: The `store` parameter is the price store the engine reads, its window is fixed
+    :param volume_store: The `volume_store` parameter is the volume store, None without volume rules
+    :return: the new `RuleEngine`, or `engine` if the new rules don't fit the stores.
+    """
+    reloaded = RuleEngine(current.rules)
+    if reloaded.window > store.window or (reloaded.needs_volume and volume_store is None):
+        # the stores keep their size, a longer window or the first volume rule needs a restart
+        logger.error(f'{exchange_name} | The new rules need a restart, keeping the old rules')
+        return engine
+    logger.info(f'{exchange_name} | Rules reloaded: {", ".join(f"{rule.name} {rule.kind} {rule.threshold:g}" for rule in reloaded.rules)}')
+    return reloaded
+
+
+async def sender(config: RawConfigParser, exchange_name: str, context: WorkerContext) -> None:
     """
     The `sender` function is a function that sends alerts based on price changes in
     cryptocurrency tickers.
@@ -169,77 +327,215 @@ def sender(config: RawConfigParser, exchange_name: str) -> None:
     cryptocurrency exchange. It is used to determine which exchange class to use for fetching data and
     performing operations. The supported exchange names are 'binance', 'bybit', and 'kucoin'
     :type exchange_name: str
+    :param context: The `context` parameter holds the services shared by all exchanges of the process:
+    the HTTP session used by ccxt, news and Telegram requests, the OHLCV cache, the news service, the
+    chart renderer, the Telegram delivery and the settings. Thresholds, rules, the scan interval and the
+    request budget of the exchange are applied when the settings are reloaded
+    :type context: WorkerContext
     """
-    exchange_classes = {
-        'binance': ccxt.binance,
-        'bybit': ccxt.bybit,
-        'kucoin': ccxt.kucoinfutures
-    }
-    if exchange_name not in exchange_classes:
-        raise BaseException('Exchange isn\'t supported')
-    percent_difference = float(config[exchange_name]['percent_difference'])
-    nums_precision = int(config['telegram']['nums_precision'])
-    exchange: Exchange = exchange_classes[exchange_name]()
-    Thread(target=course_watcher, args=(exchange,exchange_name,nums_precision)).start()
-    send_service_message(get_config(), f'{exchange_name.capitalize()} watcher started', exchange_name)
-    while True:
-        changed = False
-        tickers_prices = get_tickers_data(exchange_name)
-        for ticker in tickers_prices:
-            minutes_prices_list = tickers_prices[ticker]
-            if not minutes_prices_list:
-                continue
-            new_price = minutes_prices_list[0]
-            for index, old_price in enumerate(minutes_prices_list):
-                if old_price * (1 + percent_difference / 100) <= new_price:
-                    now_time = exchange.fetch_time()
-                    yesterday_timestamp = now_time - 24*60*60*10**3
-                    half_hour_timestamp = now_time - 30*60*10**3
-                    try:
-                        yesterday_price = exchange.fetch_ohlcv(ticker, '1m', yesterday_timestamp, 1)[0][4]
-                        yesterday_change = round(Decimal((new_price/yesterday_price-1)*100), nums_precision)
-            
-                        half_hour_price = exchange.fetch_ohlcv(ticker, '1m', half_hour_timestamp, 1)[0][4]
-                        half_hour_change = round(Decimal((new_price/half_hour_price-1)*100), nums_precision)
-                    except Exception as e:
-                        logger.error(e)
-                        break
-
-                    with open('message.txt') as f:
-                        msg = f.read()
-                    if is_have_recent_news(config, ticker.split('/')[0]):
-                        news = '🚩Coin news for the last 24 hours🚩'
-                    else:
-                        news = '📢No coin news in the last 24 hours'
-                    msg = msg.format(
-                        ticker=ticker, new_price=round(Decimal(new_price), nums_precision),
-                        old_price=round(Decimal(old_price), nums_precision), news=news,
-                        diff=round(Decimal(new_price-old_price), nums_precision),
-                        percent_diff=round(Decimal((new_price/old_price-1)*100), nums_precision),
-                        minutes=index+1, yesterday_change=yesterday_change, half_hour_change=half_hour_change
-                    )
-                    send_alert_message(get_config(), msg, draw_graph(exchange, ticker, exchange_name, new_price))
-                    tickers_prices[ticker].clear()
-                    changed = True
-                    break
-        if changed:
-            update_tickers_info(exchange_name, tickers_prices)
-        time.sleep(20)
-
-
-def worker(exchange_name: str):
-    """
-    The function `worker` creates a temporary directory if it doesn't exist, updates tickers information
-    for a given exchange, retrieves a configuration, and sends the configuration and exchange name to a
-    sender function.
+    settings = context.settings.current
+    exchange_settings = settings.exchanges[exchange_name]
+    nums_precision = settings.telegram.nums_precision
+    scan_seconds = exchange_settings.scan_seconds
+    snapshot_minutes = config.getint(exchange_name, 'snapshot_minutes', fallback=0)
+    engine = RuleEngine(exchange_settings.rules)
+    window = max(exchange_settings.window, engine.window)
+    exchange = create_exchange(exchange_name, context.session)
+    scheduler = RequestScheduler(
+        exchange_name, exchange.rateLimit, exchange_settings.request_burst, exchange_settings.request_retries,
+        exchange_settings.circuit_failures, exchange_settings.circuit_reset_seconds
+    )
+    store = PriceStore(window=window)
+    volume_store = PriceStore(window=window) if engine.needs_volume else None
+    index = MarketIndex(
+        scheduler.bind(exchange, PRIORITY_BACKGROUND), 'USDT', parse_patterns(config.get(exchange_name, 'include', fallback='')),
+        parse_patterns(config.get(exchange_name, 'exclude', fallback=DEFAULT_EXCLUDE))
+    )
+    await index.refresh()
+    transport = create_transport(config, exchange_name, exchange, context.session)
+    history = create_history(config, exchange_name)
+    pipeline = AlertPipeline(
+        scheduler.bind(exchange, PRIORITY_ENRICHMENT), exchange_name, context, store,
+        config.getint(exchange_name, 'alert_workers', fallback=4)
+    )
+
+    def apply(old: Settings, new: Settings) -> None:
+        nonlocal engine, scan_seconds
+        current = new.exchanges.get(exchange_name)
+        if current is None or current == old.exchanges.get(exchange_name):
+            return
+        scan_seconds = current.scan_seconds
+        scheduler.burst = current.request_burst
+        scheduler.retries = current.request_retries
+        scheduler.failure_threshold = current.circuit_failures
+        scheduler.reset_timeout = current.circuit_reset_seconds
+        engine = reload_engine(exchange_name, engine, current, store, volume_store)
+        if exchange_name in getattr(context.consolidator, 'venues', {}):
+            context.consolidator.register(exchange_name, store, pipeline, engine, volume_store)
+
+    context.settings.subscribe(apply)
+    tasks = [
+        asyncio.create_task(course_watcher(
+            scheduler.bind(exchange, PRIORITY_TICKERS), exchange_name, nums_precision, store, index, snapshot_minutes, transport, history, volume_store
+        )),
+        asyncio.create_task(index.run(config.getfloat(exchange_name, 'markets_refresh_minutes', fallback=60))),
+        asyncio.create_task(pipeline.run())
+    ]
+    if history is not None:
+        tasks.append(asyncio.create_task(history.run()))
+    try:
+        await send_service_message(
+            context.delivery, context.settings.current.telegram.chat_ids, f'{exchange_name.capitalize()} watcher started', exchange_name
+        )
+        if context.consolidator is not None:
+            # the consolidator scans all exchanges at once and submits to the pipeline of this exchange
+            context.consolidator.register(exchange_name, store, pipeline, engine, volume_store)
+            await asyncio.gather(*tasks)
+        while True:
+            with stage_metrics.timer('detection', exchange=exchange_name):
+                volumes = volume_store.matrix() if volume_store is not None else None
+                pumps = engine.evaluate(*store.matrix(), volumes, context.settings.current.prefetch_ratio)
+            context.news_service.prefetch([pump.ticker.split('/')[0] for pump in pumps])
+            for pump in pumps:
+                if engine.confirmed(pump):
+                    pipeline.submit(pump)
+            await asyncio.sleep(scan_seconds)
+    finally:
+        context.settings.unsubscribe(apply)
+        if context.consolidator is not None:
+            context.consolidator.unregister(exchange_name)
+        for task in tasks:
+            task.cancel()
+        scheduler.close()
+        if history is not None:
+            history.close()
+        await exchange.close()
+
+
+async def exchange_worker(config: RawConfigParser, exchange_name: str, context: WorkerContext) -> None:
+    """
+    The function `exchange_worker` runs the `sender` of one exchange and restarts it after errors, so a
+    failing exchange doesn't stop the other exchanges of the process.
     
-    :param exchange_name: The exchange name is a string that represents the name of the cryptocurrency
-    exchange. It is used as a parameter in the `worker` function to perform certain operations specific
-    to that exchange
+    :param config: The `config` parameter is an instance of the `RawConfigParser` class
+    :type config: RawConfigParser
+    :param exchange_name: The `exchange_name` parameter is the name of the exchange to run
     :type exchange_name: str
+    :param context: The `context` parameter holds the services shared by the exchanges
+    :type context: WorkerContext
+    """
+    while True:
+        try:
+            await sender(config, exchange_name, context)
+        except Exception as e:
+            logger.error(f'{exchange_name} | {e}')
+            await asyncio.sleep(10)
+
+
+async def run_workers(exchange_names: list) -> None:
+    """
+    The function `run_workers` runs the given exchanges concurrently on one event loop with one shared
+    HTTP session, OHLCV cache, news service, chart renderer and Telegram delivery. Unless
+    `[consolidation] enabled` is false, one `Consolidator` detects pumps across all exchanges. The
+    stage metrics are served on `[metrics] host:port` together with the sampling profiler toggle. Sent
+    alerts are published on the `AlertBus` and its Unix socket, the demo relay may run in the process.
+    'config.cfg' is parsed once into a `SettingsWatcher` and reloaded every `[settings] reload_seconds`
+    seconds when it changes.
+    
+    :param exchange_names: The `exchange_names` parameter is a list of exchange names, e.g.
+    ['binance', 'bybit', 'kucoin']
+    :type exchange_names: list
+    """
+    settings = SettingsWatcher()
+    config = settings.current.config
+    ohlcv_cache = OhlcvCache(
+        config.getint('cache', 'ohlcv_entries', fallback=128), config.getfloat('cache', 'ohlcv_ttl', fallback=3600)
+    )
+    renderer = get_renderer(config.get('chart', 'renderer', fallback='pillow'))
+    await asyncio.to_thread(renderer.warm_up)
+    async with aiohttp.ClientSession() as session:
+        news_service = NewsService(
+            session, config['news']['cryptopanic_token'],
+            config.getfloat('news', 'ttl_minutes', fallback=10) * 60, config.getfloat('news', 'timeout', fallback=5)
+        )
+        telegram = settings.current.telegram
+        delivery = TelegramDelivery(session, telegram.token, telegram.api_url, telegram.global_rate, telegram.chat_interval)
+        consolidator = None
+        coroutines = [settings.run(config.getfloat('settings', 'reload_seconds', fallback=5))]
+        consolidation = settings.current.consolidation
+        if consolidation.enabled:
+            consolidator = Consolidator(
+                consolidation.cooldown_minutes * 60, consolidation.arbitrage_percent, consolidation.scan_seconds,
+                settings.current.prefetch_ratio
+            )
+
+            async def on_gap(gap: CoinMove) -> None:
+                await send_service_message(delivery, settings.current.telegram.chat_ids, format_gap(gap), gap.cheapest)
+
+            coroutines.append(consolidator.run(news_service, on_gap))
+
+        def apply(old: Settings, new: Settings) -> None:
+            delivery.global_interval = 1 / new.telegram.global_rate
+            delivery.chat_interval = new.telegram.chat_interval
+            if consolidator is not None:
+                consolidator.cooldown = new.consolidation.cooldown_minutes * 60
+                consolidator.arbitrage_percent = new.consolidation.arbitrage_percent
+                consolidator.scan_seconds = new.consolidation.scan_seconds
+                consolidator.prefetch_ratio = new.prefetch_ratio
+
+        settings.subscribe(apply)
+        bus = AlertBus()
+        server = None
+        if config.getboolean('alert_bus', 'enabled', fallback=True):
+            # every worker process has its own socket, demo_bot.py listens to all of them
+            name = 'alerts' if len(exchange_names) != 1 else f'alerts_{exchange_names[0]}'
+            try:
+                server = await bus.serve(os.path.join('temp', f'{name}.sock'))
+            except OSError as e:
+                logger.error(f'Alert bus | {e}')
+        if config.getboolean('demo_bot', 'in_process', fallback=False):
+            demo_delivery = TelegramDelivery(session, settings.current.demo_bot.token, telegram.api_url)
+            coroutines.append(relay(bus.subscribe(), demo_delivery, settings))
+        alert_store = create_alert_store(config)
+        context = WorkerContext(
+            session, ohlcv_cache, news_service, renderer, delivery, consolidator, bus, settings, alert_store
+        )
+        coroutines += [exchange_worker(config, exchange_name, context) for exchange_name in exchange_names]
+        runner = None
+        profiler = SamplingProfiler(config.getfloat('metrics', 'profiler_interval', fallback=0.01))
+        if config.getboolean('metrics', 'profiler', fallback=False):
+            profiler.start()
+        if config.getboolean('metrics', 'enabled', fallback=True):
+            # a single exchange process, e.g. binance_worker.py, may have its own port
+            port = config.getint('metrics', 'port', fallback=9108)
+            if len(exchange_names) == 1:
+                port = config.getint(exchange_names[0], 'metrics_port', fallback=port)
+            try:
+                runner = await serve_metrics(config.get('metrics', 'host', fallback='127.0.0.1'), port, profiler=profiler)
+            except OSError as e:
+                logger.error(f'Metrics server | {e}')
+        try:
+            await asyncio.gather(*coroutines)
+        finally:
+            profiler.stop()
+            if runner is not None:
+                await runner.cleanup()
+            if alert_store is not None:
+                alert_store.close()
+            if server is not None:
+                server.close()
+                os.remove(os.path.join('temp', f'{name}.sock'))
+
+
+def worker(*exchange_names: str):
+    """
+    The function `worker` creates a temporary directory if it doesn't exist and runs the watchers and
+    senders of the given exchanges in one asyncio event loop.
+    
+    :param exchange_names: The exchange names are strings that represent the names of the
+    cryptocurrency exchanges to run, e.g. 'binance'
+    :type exchange_names: str
     """
     if not os.path.exists('temp'):
         os.mkdir('temp')
-    update_tickers_info(exchange_name, {})
-    config = get_config()
-    sender(config, exchange_name)
+    asyncio.run(run_workers(list(exchange_names)))
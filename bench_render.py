@@ -0,0 +1,97 @@
+from chart_renderer import renderers, get_renderer
+
+import subprocess
+import resource
+import random
+import time
+import json
+import sys
+
+
+def make_candlesticks(count: int = 160) -> list:
+    """
+    The function `make_candlesticks` generates a random walk of 5m candles like the chart of an alert.
+
+    :param count: The `count` parameter is the number of candles
+    :type count: int
+    :return: a list of `[timestamp, open, high, low, close, volume]` lists.
+    """
+    random.seed(1)
+    timestamp = int(time.time() * 10**3) - count*5*60*10**3
+    price = 1.0
+    candlesticks = []
+    for _ in range(count):
+        close = price * (1 + random.gauss(0, 0.01))
+        candlesticks.append([
+            timestamp, price, max(price, close) * 1.005, min(price, close) * 0.995, close, random.random() * 1000
+        ])
+        price = close
+        timestamp += 5*60*10**3
+    return candlesticks
+
+
+def bench(name: str, images: int) -> dict:
+    """
+    The function `bench` measures one renderer in the current process.
+
+    :param name: The `name` parameter is the renderer name
+    :type name: str
+    :param images: The `images` parameter is the number of rendered images
+    :type images: int
+    :return: a dictionary with the latency of the cold `warm_up` call, of the first image and the mean
+    and p95 latency of the following images and the peak RSS of the process and of its children in MB.
+    """
+    candlesticks = make_candlesticks()
+    renderer = get_renderer(name)
+    start = time.perf_counter()
+    renderer.warm_up()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    renderer.render(candlesticks, 'BTC/USDT', 'binance', candlesticks[-1][4])
+    first = time.perf_counter() - start
+    latencies = []
+    for _ in range(images):
+        start = time.perf_counter()
+        renderer.render(candlesticks, 'BTC/USDT', 'binance', candlesticks[-1][4])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    if name == 'kaleido':
+        # stop chromium so its peak RSS is accounted in RUSAGE_CHILDREN
+        from plotly.io._kaleido import scope
+        scope._shutdown_kaleido()
+    return {
+        'renderer': name,
+        'cold_ms': cold * 10**3,
+        'first_ms': first * 10**3,
+        'mean_ms': sum(latencies) / len(latencies) * 10**3,
+        'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 10**3,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'children_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def main():
+    images = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    if images < 1:
+        sys.exit(f'usage: {sys.argv[0]} [images], images must be at least 1, got {images}')
+    print(f'{"renderer":<10}{"cold ms":>10}{"first ms":>10}{"mean ms":>10}{"p95 ms":>10}{"RSS MB":>10}{"child MB":>10}')
+    for name in renderers:
+        # every renderer runs in a fresh interpreter, so the peak RSS isn't shared
+        result = subprocess.run(
+            [sys.executable, __file__, '--child', name, str(images)], stdout=subprocess.PIPE, universal_newlines=True
+        )
+        if result.returncode:
+            print(f'{name:<10}failed')
+            continue
+        r = json.loads(result.stdout)
+        print(
+            f'{name:<10}{r["cold_ms"]:>10.1f}{r["first_ms"]:>10.1f}{r["mean_ms"]:>10.1f}{r["p95_ms"]:>10.1f}'
+            f'{r["rss_mb"]:>10.1f}{r["children_rss_mb"]:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        print(json.dumps(bench(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main()
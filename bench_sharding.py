@@ -0,0 +1,81 @@
+from sharding import HashRing, SharedPriceStore, SharedPriceView
+from fake_exchange import FakeExchange
+from rule_engine import RuleEngine, Rule
+
+import multiprocessing
+import asyncio
+import time
+import sys
+import os
+
+
+RULES = [Rule('pump', 'rise', 5, 9), Rule('dump', 'drop', 5, 9), Rule('spike', 'zscore', 6, 8)]
+
+
+def scan(name: str, shard: int, shards: int, seconds: float, results) -> None:
+    """
+    The function `scan` runs the detection of one shard on the shared store as often as possible.
+
+    :param name: The `name` parameter is the name of the shared memory block
+    :type name: str
+    :param shard: The `shard` parameter is the number of the shard
+    :type shard: int
+    :param shards: The `shards` parameter is the number of shards
+    :type shards: int
+    :param seconds: The `seconds` parameter is the duration of the benchmark
+    :type seconds: float
+    :param results: The `results` parameter is the queue that receives the number of scanned symbols
+    """
+    ring = HashRing(shards)
+    view = SharedPriceView(name, lambda symbol: ring.shard_of(symbol) == shard)
+    engine = RuleEngine(RULES)
+    engine.evaluate(*view.matrix())
+    scanned = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        symbols, prices = view.matrix()
+        engine.evaluate(symbols, prices)
+        scanned += len(symbols)
+    view.close()
+    results.put(scanned / seconds)
+
+
+def bench(store: SharedPriceStore, shards: int, seconds: float) -> float:
+    """
+    The function `bench` measures the detection throughput of `shards` processes.
+
+    :return: the scanned symbols per second of all shards.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=scan, args=(store.name, shard, shards, seconds, results)) for shard in range(shards)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total
+
+
+def main():
+    symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    exchange = FakeExchange(symbols=symbols, seed=1)
+    store = SharedPriceStore(10, symbols)
+    for _ in range(10):
+        store.push({symbol: ticker['last'] for symbol, ticker in asyncio.run(exchange.fetch_tickers()).items()})
+    print(f'{"shards":<10}{"symbols/s":>14}{"speedup":>10}')
+    try:
+        baseline = None
+        shards = 1
+        while shards <= (os.cpu_count() or 1):
+            throughput = bench(store, shards, seconds)
+            baseline = baseline or throughput
+            print(f'{shards:<10}{throughput:>14,.0f}{throughput / baseline:>10.2f}')
+            shards *= 2
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from PIL import Image, ImageDraw, ImageFont
+from datetime import datetime
+
+import numpy as np
+import math
+import io
+
+
+class KaleidoRenderer:
+    """
+    The class `KaleidoRenderer` renders the chart with plotly and kaleido. Kaleido keeps its chromium
+    process alive between calls, `warm_up` starts it before the first alert.
+    """
+
+    def warm_up(self) -> None:
+        self.render([[0, 1, 1, 1, 1, 0]], '', '', 1)
+
+    def render(self, candlesticks: list, ticker: str, exchange_label: str, now_price: float) -> bytes:
+        """
+        The function `render` renders candlestick data with a horizontal line indicating the current
+        price to a PNG image.
+
+        :param candlesticks: The `candlesticks` parameter is a list of OHLCV candles as returned by
+        `fetch_ohlcv`
+        :type candlesticks: list
+        :param ticker: The `ticker` parameter is a string that represents the trading pair
+        :type ticker: str
+        :param exchange_label: The `exchange_label` parameter is a string that represents the label or
+        name of the exchange. It is used as the x-axis title
+        :type exchange_label: str
+        :param now_price: The `now_price` parameter represents the current price of the ticker on the
+        exchange
+        :type now_price: float
+        :return: a bytes object, which represents an image in PNG format.
+        """
+        import plotly.graph_objects as go
+
+        dates_data = [datetime.fromtimestamp(i[0]/10**3) for i in candlesticks]
+        open_data = [i[1] for i in candlesticks]
+        high_data = [i[2] for i in candlesticks]
+        low_data = [i[3] for i in candlesticks]
+        close_data = [i[4] for i in candlesticks]
+        # volume_data = [i[5] for i in candlesticks]
+
+        layout = go.Layout(
+            autosize=False,
+            width=1000,
+            height=600,
+            title=f'{ticker}',
+            template='plotly_dark',
+            xaxis_rangeslider_visible=False,
+            yaxis=dict(side='right'),
+            xaxis=dict(showticklabels=False, title=dict(text=f'{exchange_label.capitalize()}', font=dict(size=20, color='#FFFFFF')))
+        )
+        candlestick_chart = go.Candlestick(
+            x=dates_data,
+            open=open_data,
+            high=high_data,
+            low=low_data,
+            close=close_data
+        )
+        fig = go.Figure(data=[candlestick_chart], layout=layout)
+        # sudo apt install fonts-noto-color-emoji
+        fig.add_hline(
+            y=now_price, line_color='yellow',
+            label=dict(
+                text='<b>🚨Signal price🚨</b>',
+                textposition='start',
+                font=dict(color='yellow',size=14,family='Noto Color Emoji;sans-serif')
+            )
+        )
+        return fig.to_image(format='png')
+
+
+class PillowRenderer:
+    """
+    The class `PillowRenderer` draws the same chart as `KaleidoRenderer` (plotly_dark colors, price axis
+    on the right, signal price line, exchange label) directly with Pillow. It needs no browser process
+    and renders an image in a few milliseconds. The emoji of the signal label are drawn with the color
+    emoji font that kaleido uses too, the label is plain text if it isn't installed.
+    """
+
+    width = 1000
+    height = 600
+    margin = (80, 100, 80, 80)  # left, top, right, bottom
+    background = (17, 17, 17)
+    grid = (40, 52, 62)
+    text = (242, 245, 250)
+    increasing = (61, 153, 112)
+    decreasing = (255, 65, 54)
+    signal = (255, 255, 0)
+    # sudo apt install fonts-noto-color-emoji
+    emoji_font = '/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf'
+
+    def __init__(self) -> None:
+        self.title_font = ImageFont.load_default(17)
+        self.tick_font = ImageFont.load_default(12)
+        self.label_font = ImageFont.load_default(14)
+        self.axis_font = ImageFont.load_default(20)
+        self.siren = None
+        try:
+            # the bitmap color emoji font only has the size 109, the glyph is scaled to the label
+            font = ImageFont.truetype(self.emoji_font, 109)
+            glyph = Image.new('RGBA', (136, 128), (0, 0, 0, 0))
+            ImageDraw.Draw(glyph).text((0, 0), '🚨', font=font, embedded_color=True)
+            glyph = glyph.crop(glyph.getbbox())
+            self.siren = glyph.resize((round(glyph.width * 16 / glyph.height), 16), Image.LANCZOS)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def warm_up(self) -> None:
+        pass
+
+    def render(self, candlesticks: list, ticker: str, exchange_label: str, now_price: float) -> bytes:
+        """
+        The function `render` renders candlestick data with a horizontal line indicating the current
+        price to a PNG image.
+
+        :param candlesticks: The `candlesticks` parameter is a list of OHLCV candles as returned by
+        `fetch_ohlcv`
+        :type candlesticks: list
+        :param ticker: The `ticker` parameter is a string that represents the trading pair
+        :type ticker: str
+        :param exchange_label: The `exchange_label` parameter is a string that represents the label or
+        name of the exchange. It is used as the x-axis title
+        :type exchange_label: str
+        :param now_price: The `now_price` parameter represents the current price of the ticker on the
+        exchange
+        :type now_price: float
+        :return: a bytes object, which represents an image in PNG format.
+        """
+        # download_candles turns missing OHLC values into NaN
+        candlesticks = np.asarray(candlesticks, dtype=float).reshape(-1, 6)
+        candlesticks = candlesticks[np.isfinite(candlesticks[:, 1:5]).all(axis=1)].tolist()
+
+        image = Image.new('RGB', (self.width, self.height), self.background)
+        draw = ImageDraw.Draw(image)
+        left, top, right, bottom = self.margin[0], self.margin[1], self.width - self.margin[2], self.height - self.margin[3]
+
+        low = min([candle[3] for candle in candlesticks] + [now_price])
+        high = max([candle[2] for candle in candlesticks] + [now_price])
+        padding = (high - low) * 0.05 or abs(high) * 0.05 or 1
+        low, high = low - padding, high + padding
+
+        def y(price: float) -> float:
+            return bottom - (price - low) / (high - low) * (bottom - top)
+
+        step = 10 ** math.floor(math.log10((high - low) / 5))
+        step *= next(k for k in (1, 2, 5, 10) if (high - low) / (step * k) <= 7)
+        decimals = max(0, -math.floor(math.log10(step)))
+        tick = math.ceil(low / step) * step
+        while tick <= high:
+            draw.line([(left, y(tick)), (right, y(tick))], fill=self.grid)
+            draw.text((right + 6, y(tick)), f'{tick:.{decimals}f}', fill=self.text, font=self.tick_font, anchor='lm')
+            tick += step
+
+        if candlesticks:
+            slot = (right - left) / len(candlesticks)
+            body = max(1, slot * 0.6)
+            for i, (_, open_price, high_price, low_price, close_price, *_) in enumerate(candlesticks):
+                x = left + slot * (i + 0.5)
+                color = self.increasing if close_price >= open_price else self.decreasing
+                draw.line([(x, y(high_price)), (x, y(low_price))], fill=color)
+                y0, y1 = sorted((y(open_price), y(close_price)))
+                draw.rectangle([(x - body / 2, y0), (x + body / 2, max(y1, y0 + 1))], fill=color)
+
+        draw.line([(left, y(now_price)), (right, y(now_price))], fill=self.signal, width=2)
+        label_x = left + 4
+        if self.siren is not None:
+            image.paste(self.siren, (label_x, round(y(now_price)) - 20), self.siren)
+            label_x += self.siren.width + 2
+        draw.text((label_x, y(now_price) - 4), 'Signal price', fill=self.signal, font=self.label_font, anchor='ld')
+        if self.siren is not None:
+            label_x += draw.textlength('Signal price', font=self.label_font) + 2
+            image.paste(self.siren, (round(label_x), round(y(now_price)) - 20), self.siren)
+        draw.text((left, top / 2), ticker, fill=self.text, font=self.title_font, anchor='lm')
+        draw.text(
+            ((left + right) / 2, bottom + self.margin[3] / 2), exchange_label.capitalize(),
+            fill=(255, 255, 255), font=self.axis_font, anchor='mm'
+        )
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+
+renderers = {
+    'pillow': PillowRenderer,
+    'kaleido': KaleidoRenderer
+}
+
+
+def get_renderer(name: str):
+    """
+    The function `get_renderer` creates a chart renderer by its name.
+
+    :param name: The `name` parameter is the renderer name, 'pillow' or 'kaleido'
+    :type name: str
+    :return: an object with `render` and `warm_up` methods.
+    """
+    if name not in renderers:
+        raise BaseException(f'Chart renderer {name} isn\'t supported')
+    return renderers[name]()
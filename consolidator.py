@@ -0,0 +1,252 @@
+from price_store import PriceStore
+from rule_engine import RuleEngine
+from metrics import stage_metrics
+from typing import NamedTuple
+from loguru import logger
+
+import numpy as np
+import warnings
+import asyncio
+import time
+
+
+def coin_of(symbol: str) -> str:
+    """
+    The function `coin_of` returns the base currency of a symbol, e.g. 'BTC' for 'BTC/USDT' and for the
+    kucoin contract 'BTC/USDT:USDT'.
+    """
+    return symbol.split('/')[0]
+
+
+class Venue(NamedTuple):
+    exchange_name: str
+    store: PriceStore
+    pipeline: object
+    engine: RuleEngine
+    volume_store: PriceStore
+
+
+class CoinMove(NamedTuple):
+    """
+    The class `CoinMove` is a pump of one coin seen across the exchanges: `pumps` has the triggers per
+    exchange, `prices` the newest price per exchange and `spread` the gap in percent between the most
+    expensive and the cheapest exchange.
+    """
+    coin: str
+    pumps: dict
+    prices: dict
+    spread: float
+
+    @property
+    def primary(self) -> str:
+        return max(self.pumps, key=lambda exchange_name: abs(self.pumps[exchange_name].percent))
+
+    @property
+    def kind(self) -> str:
+        rule = self.pumps[self.primary].rule
+        return rule.kind if rule is not None else 'rise'
+
+    @property
+    def cheapest(self) -> str:
+        return min(self.prices, key=self.prices.get)
+
+
+def format_gap(gap: CoinMove) -> str:
+    """
+    The function `format_gap` formats the service message of an arbitrage gap.
+
+    :return: the message with the prices of the cheapest and the most expensive exchange.
+    """
+    cheapest = gap.cheapest
+    expensive = max(gap.prices, key=gap.prices.get)
+    return (
+        f'↔️Arbitrage gap {gap.coin} {gap.spread:.2f}%\n'
+        f'{cheapest.capitalize()}: {gap.prices[cheapest]}\n{expensive.capitalize()}: {gap.prices[expensive]}'
+    )
+
+
+class Consolidator:
+    """
+    The class `Consolidator` runs the detection of all exchanges of the process at once. The price
+    stores of the exchanges are aligned by coin into one matrix, the triggers of the rule engines are
+    grouped by coin, so a coin pumping on several exchanges gives one alert. It's sent through the
+    pipeline of the exchange with the largest rise, with the prices of the other exchanges and the
+    spread. A coin isn't alerted again for the same kind of rule within `cooldown` seconds. Coins
+    whose spread reaches `arbitrage_percent` are reported as arbitrage gaps.
+    """
+
+    def __init__(self, cooldown: float = 300, arbitrage_percent: float = 0, scan_seconds: float = 20,
+                 prefetch_ratio: float = 0.7) -> None:
+        """
+        :param cooldown: The `cooldown` parameter is the time in seconds during which a coin isn't
+        alerted again
+        :type cooldown: float
+        :param arbitrage_percent: The `arbitrage_percent` parameter is the minimal spread in percent
+        that is reported as an arbitrage gap, 0 disables the reports
+        :type arbitrage_percent: float
+        :param scan_seconds: The `scan_seconds` parameter is the interval of the scans in seconds
+        :type scan_seconds: float
+        :param prefetch_ratio: The `prefetch_ratio` parameter is the ratio of the thresholds above
+        which the news of a coin are prefetched
+        :type prefetch_ratio: float
+        """
+        # the settings are attributes that `run` reads on every pass, so a reload applies them
+        self.cooldown = cooldown
+        self.arbitrage_percent = arbitrage_percent
+        self.scan_seconds = scan_seconds
+        self.prefetch_ratio = prefetch_ratio
+        self.venues: dict[str, Venue] = {}
+        self._alerted: dict[tuple, float] = {}
+        self._gaps: dict[str, float] = {}
+
+    def register(self, exchange_name: str, store: PriceStore, pipeline, engine: RuleEngine,
+                 volume_store: PriceStore = None) -> None:
+        """
+        The function `register` adds the price store of an exchange to the scans. The store is checked
+        with the rules of `engine` and alerts of the exchange are submitted to `pipeline`.
+        """
+        self.venues[exchange_name] = Venue(exchange_name, store, pipeline, engine, volume_store)
+
+    def unregister(self, exchange_name: str) -> None:
+        self.venues.pop(exchange_name, None)
+
+    def matrix(self, matrices: list = None) -> tuple:
+        """
+        The function `matrix` aligns the price stores of all exchanges by coin.
+
+        :param matrices: The `matrices` parameter is an optional list of `PriceStore.matrix` results in
+        the order of `venues`, they are read from the stores if not given
+        :type matrices: list
+        :return: a tuple `(coins, exchange_names, symbols, prices)`, `symbols` maps `(coin, exchange_name)`
+        to the symbol of the exchange and `prices` is a (coins x exchanges x window) array, column 0 of
+        the last axis is the newest slot and missing prices are NaN.
+        """
+        venues = list(self.venues.values())
+        if matrices is None:
+            matrices = [venue.store.matrix() for venue in venues]
+        coins: dict[str, int] = {}
+        symbols = {}
+        rows = []
+        for venue, (venue_symbols, _) in zip(venues, matrices):
+            venue_rows = []
+            for symbol in venue_symbols:
+                coin = coin_of(symbol)
+                venue_rows.append(coins.setdefault(coin, len(coins)))
+                symbols.setdefault((coin, venue.exchange_name), symbol)
+            rows.append(venue_rows)
+        window = max((prices.shape[1] for _, prices in matrices), default=0)
+        aligned = np.full((len(coins), len(venues), window), np.nan)
+        for column, (venue_rows, (_, prices)) in enumerate(zip(rows, matrices)):
+            if venue_rows:
+                # a coin listed twice on one exchange keeps its first symbol
+                aligned[venue_rows[::-1], column, :prices.shape[1]] = prices[::-1]
+        return list(coins), [venue.exchange_name for venue in venues], symbols, aligned
+
+    def scan(self, ratio: float = 1) -> tuple:
+        """
+        The function `scan` detects the moves of all coins. Every exchange is checked once with its rule
+        engine, the triggers are grouped by coin and the prices are compared in the aligned matrix.
+
+        :param ratio: The `ratio` parameter scales the thresholds of the rules, e.g. 0.7 to find the
+        coins that are close to an alert
+        :type ratio: float
+        :return: a tuple `(moves, gaps)`, a list of `CoinMove` and a list of `CoinMove` whose spread
+        reaches `arbitrage_percent`.
+        """
+        venues = list(self.venues.values())
+        matrices = [venue.store.matrix() for venue in venues]
+        coins, exchange_names, symbols, aligned = self.matrix(matrices)
+        if not coins:
+            return [], []
+        rows = {coin: row for row, coin in enumerate(coins)}
+        grouped: dict[int, dict] = {}
+        for venue, matrix in zip(venues, matrices):
+            volumes = venue.volume_store.matrix() if venue.volume_store is not None else None
+            for pump in venue.engine.evaluate(*matrix, volumes, ratio):
+                coin = coin_of(pump.ticker)
+                if symbols[(coin, venue.exchange_name)] == pump.ticker:
+                    grouped.setdefault(rows[coin], {})[venue.exchange_name] = pump
+        newest = aligned[:, :, 0]
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            spreads = (np.nanmax(newest, axis=1) / np.nanmin(newest, axis=1) - 1) * 100
+
+        def move(row: int, coin_pumps: dict) -> CoinMove:
+            prices = {
+                exchange_names[column]: float(newest[row, column])
+                for column in np.flatnonzero(~np.isnan(newest[row]))
+            }
+            return CoinMove(coins[row], coin_pumps, prices, float(spreads[row]))
+
+        moves = [move(row, coin_pumps) for row, coin_pumps in grouped.items()]
+        gaps = []
+        if self.arbitrage_percent > 0 and len(venues) > 1:
+            gaps = [move(row, grouped.get(row, {})) for row in np.flatnonzero(spreads >= self.arbitrage_percent)]
+        return moves, gaps
+
+    def dispatch(self, moves: list) -> list:
+        """
+        The function `dispatch` submits one alert per coin that reaches the real thresholds and isn't
+        in the cooldown of its kind of rule. The coin is cleared in the stores of the other exchanges,
+        its alert covers them.
+
+        :param moves: The `moves` parameter is a list of `CoinMove` returned by `scan`
+        :type moves: list
+        :return: a list of the submitted `CoinMove`.
+        """
+        now = time.monotonic()
+        submitted = []
+        for move in moves:
+            pumps = {
+                exchange_name: pump for exchange_name, pump in move.pumps.items()
+                if exchange_name in self.venues and RuleEngine.confirmed(pump)
+            }
+            if not pumps:
+                continue
+            move = move._replace(pumps=pumps)
+            key = (move.coin, move.kind)
+            if now - self._alerted.get(key, -np.inf) < self.cooldown:
+                continue
+            primary = self.venues[move.primary]
+            if primary.pipeline.submit(pumps[move.primary], move):
+                self._alerted[key] = now
+                submitted.append(move)
+                for exchange_name, pump in pumps.items():
+                    if exchange_name != move.primary:
+                        self.venues[exchange_name].store.clear(pump.ticker)
+        return submitted
+
+    def report_gaps(self, gaps: list) -> list:
+        """
+        The function `report_gaps` filters the arbitrage gaps that weren't reported within the cooldown.
+
+        :return: a list of `CoinMove`.
+        """
+        now = time.monotonic()
+        fresh = [gap for gap in gaps if now - self._gaps.get(gap.coin, -np.inf) >= self.cooldown]
+        for gap in fresh:
+            self._gaps[gap.coin] = now
+        return fresh
+
+    async def run(self, news_service, on_gap=None) -> None:
+        """
+        The function `run` scans the exchanges every `scan_seconds` seconds until it is cancelled. News
+        of the coins above `prefetch_ratio` of their threshold are prefetched.
+
+        :param news_service: The `news_service` parameter is the `NewsService` of the process
+        :param on_gap: The `on_gap` parameter is an optional coroutine function called with every
+        reported arbitrage gap
+        """
+        while True:
+            try:
+                with stage_metrics.timer('detection', exchange='all'):
+                    moves, gaps = self.scan(self.prefetch_ratio)
+                news_service.prefetch([move.coin for move in moves])
+                self.dispatch(moves)
+                for gap in self.report_gaps(gaps):
+                    logger.info(f'Arbitrage gap {gap.coin} {gap.spread:.2f}% | {gap.prices}')
+                    if on_gap is not None:
+                        await on_gap(gap)
+            except Exception as e:
+                logger.error(f'consolidator | {e}')
+            await asyncio.sleep(self.scan_seconds)
@@ -1,42 +1,54 @@
-from utils import get_config, send_photo_to_telegram
+from settings import SettingsWatcher
+from alert_bus import Throttle, listen
+from telegram_delivery import TelegramDelivery
+from typing import AsyncIterator
 from loguru import logger
 
-import time
-import json
-import os
+import aiohttp
+import asyncio
 
 
-def main():
-    last_msg_filename = 'temp/last_msg.json'
-    if not os.path.exists('temp/'):
-        os.mkdir('temp')
-    if not os.path.exists(last_msg_filename):
-        with open(last_msg_filename, 'w') as f:
-            json.dump({'time': int(time.time())}, f)
-    config = get_config()
-    sleep_hours = float(config['demo_bot']['sleep_hours'])
-    demo_chat_id = get_config()['demo_bot']['demo_chat_id']
-    demo_bot_token = get_config()['demo_bot']['demo_bot_token']
-    while True:
+async def relay(alerts: AsyncIterator, delivery: TelegramDelivery, settings: SettingsWatcher) -> None:
+    """
+    The function `relay` forwards an alert to the demo chat and drops the alerts of the next
+    `sleep_hours` hours. The chat and the interval are read from the current settings for every alert,
+    so a reload applies to the running relay.
+
+    :param alerts: The `alerts` parameter is an async iterator of `Alert`, e.g. a `Subscription` of the
+    `AlertBus` or `listen()`
+    :type alerts: AsyncIterator
+    :param delivery: The `delivery` parameter is the `TelegramDelivery` of the demo bot
+    :type delivery: TelegramDelivery
+    :param settings: The `settings` parameter is the `SettingsWatcher` with the `[demo_bot]` settings
+    :type settings: SettingsWatcher
+    """
+    throttle = Throttle()
+    async for alert in alerts:
+        demo_bot = settings.current.demo_bot
+        throttle.interval = 60*60*demo_bot.sleep_hours
+        if not throttle.ready():
+            continue
+        throttle.mark()
         try:
-            with open(last_msg_filename) as f:
-                msg = json.load(f)
-            while True:
-                try:
-                    with open(last_msg_filename) as file:
-                        new_msg = json.load(file)
-                    if msg['time'] != new_msg['time']:
-                        with open('temp/graph.png', 'rb') as f:
-                            image = f.read()
-                        send_photo_to_telegram(demo_bot_token, demo_chat_id, new_msg['msg'], image)
-                        break
-                    time.sleep(1)
-                except json.decoder.JSONDecodeError:
-                    pass
-            time.sleep(60*60*sleep_hours)
+            await delivery.send_photo([demo_bot.chat_id], alert.msg, alert.image)
         except Exception as e:
             logger.error(e)
 
 
+async def run() -> None:
+    settings = SettingsWatcher()
+    config = settings.current.config
+    async with aiohttp.ClientSession() as session:
+        delivery = TelegramDelivery(session, settings.current.demo_bot.token, settings.current.telegram.api_url)
+        await asyncio.gather(
+            settings.run(config.getfloat('settings', 'reload_seconds', fallback=5)),
+            relay(listen(), delivery, settings)
+        )
+
+
+def main():
+    asyncio.run(run())
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
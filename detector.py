@@ -0,0 +1,50 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Pump(NamedTuple):
+    """
+    The class `Pump` is a trigger. `rule` is the `Rule` of the `RuleEngine` that fired and `value` its
+    measure, both are empty for `detect_pumps`.
+    """
+    ticker: str
+    index: int
+    old_price: float
+    new_price: float
+    percent: float
+    rule: object = None
+    value: float = 0.0
+
+
+def detect_pumps(symbols: list, prices: np.ndarray, percent_difference) -> list:
+    """
+    The function `detect_pumps` looks for pumps in all tickers at once. For every ticker it computes the
+    percent rise from each earlier slot to the newest one and keeps the largest rise if it reaches
+    `percent_difference`.
+
+    :param symbols: The `symbols` parameter is a list of ticker symbols, one per row of `prices`
+    :type symbols: list
+    :param prices: The `prices` parameter is a (symbols x window) array of per-minute prices, column 0
+    is the newest slot and empty slots are NaN, as returned by `PriceStore.matrix`
+    :type prices: np.ndarray
+    :param percent_difference: The `percent_difference` parameter is the minimal rise in percent that
+    triggers an alert, a float or a (symbols x 1) array with a threshold per row
+    :type percent_difference: float | np.ndarray
+    :return: a list of `Pump` tuples. `index` is the age in minutes of the slot with the largest rise.
+    """
+    if prices.shape[0] == 0 or prices.shape[1] < 2:
+        return []
+    new_prices = prices[:, 0]
+    old_prices = prices[:, 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rises = (new_prices[:, None] / old_prices - 1) * 100
+    triggered = old_prices * (1 + percent_difference / 100) <= new_prices[:, None]
+    rises = np.where(triggered, rises, -np.inf)
+    best = rises.argmax(axis=1)
+    rows = np.flatnonzero(triggered.any(axis=1))
+    return [
+        Pump(symbols[row], int(best[row]) + 1, float(old_prices[row, best[row]]),
+             float(new_prices[row]), float(rises[row, best[row]]))
+        for row in rows
+    ]
@@ -0,0 +1,100 @@
+from ccxt.base.exchange import Exchange
+
+import numpy as np
+import time
+import zlib
+
+
+class FakeExchange:
+    """
+    The class `FakeExchange` is a stand-in for a ccxt exchange with a synthetic market, so the workers
+    can be load tested on one box. Every ticker request moves the prices of `symbols` USDT markets by a
+    random walk step and lets each market pump by `pump_percent` with `pump_probability`. It answers
+    `fetch_tickers` like binance and bybit, `futuresPublicGetContractsActive` like kucoin futures, and
+    `fetch_ohlcv` with a random walk of candles that ends at the current price.
+    """
+
+    rateLimit = 0
+
+    def __init__(self, name: str = 'fake', symbols: int = 1000, pump_probability: float = 0.0005,
+                 pump_percent: float = 10, seed: int = None) -> None:
+        """
+        :param name: The `name` parameter is the `id` of the exchange
+        :type name: str
+        :param symbols: The `symbols` parameter is the number of markets
+        :type symbols: int
+        :param pump_probability: The `pump_probability` parameter is the probability that a market pumps
+        on one tick
+        :type pump_probability: float
+        :param pump_percent: The `pump_percent` parameter is the size of a pump in percent
+        :type pump_percent: float
+        :param seed: The `seed` parameter seeds the random walk, the same seed gives the same market
+        :type seed: int
+        """
+        self.id = name
+        self.symbols = [f'F{i:05d}/USDT' for i in range(symbols)]
+        self.pump_probability = pump_probability
+        self.pump_percent = pump_percent
+        self._random = np.random.default_rng(seed)
+        self.prices = np.exp(self._random.normal(0, 2, symbols))
+        self.volumes = np.exp(self._random.normal(14, 1, symbols))
+        self._rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+
+    def milliseconds(self) -> int:
+        return int(time.time() * 10**3)
+
+    @staticmethod
+    def parse_timeframe(timeframe: str) -> int:
+        return Exchange.parse_timeframe(timeframe)
+
+    def tick(self) -> None:
+        """
+        The function `tick` moves the market by one step.
+        """
+        steps = self._random.normal(0, 0.002, len(self.symbols))
+        pumps = self._random.random(len(self.symbols)) < self.pump_probability
+        self.prices *= np.exp(steps) * np.where(pumps, 1 + self.pump_percent / 100, 1)
+        self.volumes *= np.exp(np.abs(steps)) * np.where(pumps, 2, 1)
+
+    async def load_markets(self, reload: bool = False) -> dict:
+        return {
+            symbol: {'symbol': symbol, 'id': symbol.replace('/', '') + 'M', 'quote': 'USDT', 'active': True}
+            for symbol in self.symbols
+        }
+
+    async def fetch_tickers(self) -> dict:
+        self.tick()
+        return {
+            symbol: {'symbol': symbol, 'last': float(price), 'quoteVolume': float(volume)}
+            for symbol, price, volume in zip(self.symbols, self.prices, self.volumes)
+        }
+
+    async def futuresPublicGetContractsActive(self) -> dict:
+        self.tick()
+        return {'data': [
+            {'symbol': symbol.replace('/', '') + 'M', 'lastTradePrice': float(price), 'turnoverOf24h': float(volume)}
+            for symbol, price, volume in zip(self.symbols, self.prices, self.volumes)
+        ]}
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None) -> list:
+        timeframe_ms = self.parse_timeframe(timeframe) * 10**3
+        now = self.milliseconds() // timeframe_ms * timeframe_ms
+        count = min(limit or 1000, 1000)
+        start = now - (count - 1) * timeframe_ms if since is None else -(-since // timeframe_ms) * timeframe_ms
+        timestamps = np.arange(start, min(now, start + (count - 1) * timeframe_ms) + 1, timeframe_ms)
+        if not len(timestamps):
+            return []
+        # the walk of a symbol goes back from the current price and is the same for every call
+        steps = np.random.default_rng(zlib.crc32(symbol.encode())).normal(0, 0.002, (now - start) // timeframe_ms + 1)
+        steps[0] = 0
+        row = self._rows.get(symbol)
+        price = self.prices[row] if row is not None else 1.0
+        closes = price / np.exp(np.cumsum(steps))[(now - timestamps) // timeframe_ms]
+        opens = np.concatenate(([closes[0]], closes[:-1]))
+        return [
+            [int(timestamp), float(open_), float(max(open_, close)), float(min(open_, close)), float(close), 1.0]
+            for timestamp, open_, close in zip(timestamps, opens, closes)
+        ]
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,12 @@
+from base_worker import worker
+from sharding import sharded_worker
+from utils import get_config
+
+if __name__ == '__main__':
+    config = get_config()
+    exchange_names = [name.strip() for name in config.get('workers', 'exchanges', fallback='binance, bybit, kucoin').split(',')]
+    shards = config.getint('sharding', 'shards', fallback=1)
+    if shards > 1:
+        sharded_worker(exchange_names, shards)
+    else:
+        worker(*exchange_names)
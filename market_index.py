@@ -0,0 +1,85 @@
+from ccxt.base.exchange import Exchange
+from fnmatch import fnmatchcase
+from loguru import logger
+
+import asyncio
+
+
+DEFAULT_EXCLUDE = '*DOWN/USDT*, *BULL/USDT*, *BEAR/USDT*, *[0-9]L/USDT*, *[0-9]S/USDT*'
+
+
+def parse_patterns(patterns: str) -> list:
+    """
+    The function `parse_patterns` splits a comma separated list of shell-style symbol patterns from the
+    config, e.g. '*3L/USDT*, LUNA/*'.
+
+    :param patterns: The `patterns` parameter is the comma separated list
+    :type patterns: str
+    :return: a list of patterns.
+    """
+    return [pattern.strip() for pattern in patterns.split(',') if pattern.strip()]
+
+
+class MarketIndex:
+    """
+    The class `MarketIndex` holds the symbols of an exchange that are watched: active markets quoted
+    in `quote` that match the include rules (all markets if there are none) and none of the exclude
+    rules. It is built from `load_markets` and refreshed on a slow schedule, so every tick only does a
+    set lookup per symbol.
+    """
+
+    def __init__(self, exchange: Exchange, quote: str = 'USDT', include: list = None, exclude: list = None) -> None:
+        """
+        :param exchange: The `exchange` parameter is the `ccxt.async_support` exchange
+        :type exchange: Exchange
+        :param quote: The `quote` parameter is the quote currency of the watched markets
+        :type quote: str
+        :param include: The `include` parameter is a list of symbol patterns, if given only matching
+        symbols are watched
+        :type include: list
+        :param exclude: The `exclude` parameter is a list of symbol patterns that are never watched
+        :type exclude: list
+        """
+        self.exchange = exchange
+        self.quote = quote
+        self.include = include or []
+        self.exclude = exclude or []
+        self.symbols: frozenset = frozenset()
+        self.ids: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbols
+
+    def is_eligible(self, market: dict) -> bool:
+        symbol = market['symbol']
+        return (
+            market['quote'] == self.quote and market.get('active') is not False
+            and (not self.include or any(fnmatchcase(symbol, pattern) for pattern in self.include))
+            and not any(fnmatchcase(symbol, pattern) for pattern in self.exclude)
+        )
+
+    async def refresh(self) -> None:
+        """
+        The function `refresh` reloads the markets of the exchange and rebuilds the index.
+        """
+        markets = await self.exchange.load_markets(reload=True)
+        eligible = [market for market in markets.values() if self.is_eligible(market)]
+        self.symbols = frozenset(market['symbol'] for market in eligible)
+        self.ids = {market['id']: market['symbol'] for market in eligible}
+
+    async def run(self, refresh_minutes: float) -> None:
+        """
+        The function `run` refreshes the index every `refresh_minutes` minutes until it is cancelled.
+
+        :param refresh_minutes: The `refresh_minutes` parameter is the refresh interval in minutes
+        :type refresh_minutes: float
+        """
+        while True:
+            await asyncio.sleep(refresh_minutes * 60)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f'{self.exchange.id} markets | {e}')
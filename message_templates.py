@@ -0,0 +1,226 @@
+from consolidator import CoinMove
+from typing import NamedTuple
+from loguru import logger
+
+import string
+import time
+import os
+
+
+HEADLINES = {
+    'rise': '📈Pump in the last <b>{minutes} minutes</b>🆙',
+    'drop': '📉Dump in the last <b>{minutes} minutes</b>🔻',
+    'volume': '📊Volume x{value:.1f} in the last <b>{minutes} minutes</b>',
+    'zscore': '⚡Move of {value:.1f}σ in the last <b>{minutes} minutes</b>'
+}
+NEWS = {
+    True: '🚩Coin news for the last 24 hours🚩',
+    False: '📢No coin news in the last 24 hours'
+}
+# the fields that are formatted with their '%', a '%' after them in older templates is dropped
+PERCENT_FIELDS = ('percent_diff', 'yesterday_change', 'half_hour_change')
+FIELDS = {
+    'headline', 'ticker', 'new_price', 'old_price', 'news', 'diff', 'percent_diff', 'minutes',
+    'yesterday_change', 'half_hour_change', 'venues', 'exchange'
+}
+
+
+class TemplateError(Exception):
+    pass
+
+
+class AlertData(NamedTuple):
+    """
+    The class `AlertData` is the record of an alert that every output format is rendered from. The prices
+    and changes are plain floats, the changes are None without a reference price. `venues` has an
+    `(exchange, price, percent)` tuple per exchange of a coin traded on several exchanges, `percent` is
+    None for an exchange without a trigger.
+    """
+    exchange: str
+    ticker: str
+    kind: str
+    minutes: int
+    value: float
+    old_price: float
+    new_price: float
+    yesterday_change: float
+    half_hour_change: float
+    have_news: bool
+    venues: tuple = ()
+    spread: float = None
+    time: float = 0.0
+
+    @classmethod
+    def venues_of(cls, move: CoinMove) -> tuple:
+        """
+        The function `venues_of` returns the `venues` and `spread` of a `CoinMove`, empty for a coin traded
+        on one exchange.
+        """
+        if move is None or len(move.prices) < 2:
+            return (), None
+        venues = tuple(
+            (exchange_name, price, move.pumps[exchange_name].percent if exchange_name in move.pumps else None)
+            for exchange_name, price in sorted(move.prices.items())
+        )
+        return venues, move.spread
+
+    def to_json(self) -> dict:
+        """
+        The function `to_json` returns the record as a JSON serializable dictionary, e.g. for webhooks.
+        """
+        return {**self._asdict(), 'venues': [
+            {'exchange': exchange_name, 'price': price, 'percent': percent} for exchange_name, price, percent in self.venues
+        ]}
+
+
+def format_number(value: float, precision: int, sign: bool = False, suffix: str = '') -> str:
+    """
+    The function `format_number` rounds a float half to even to `precision` decimals, like
+    `round(Decimal(value), precision)` without creating a `Decimal`.
+
+    :param sign: The `sign` parameter adds a '+' to positive numbers
+    :type sign: bool
+    :param suffix: The `suffix` parameter is the unit after the number, e.g. '%', it isn't added to 'n/a'
+    :type suffix: str
+    :return: the formatted number, 'n/a' for None, e.g. the 24 hours change of a new listing.
+    """
+    if value is None:
+        return 'n/a'
+    return (f'{value:+.{precision}f}' if sign else f'{value:.{precision}f}') + suffix
+
+
+def format_venues(data: AlertData, precision: int) -> str:
+    """
+    The function `format_venues` formats the per-exchange breakdown of an alert for the message.
+
+    :return: an empty string for a coin traded on one exchange, else one line per exchange and the spread.
+    """
+    if not data.venues:
+        return ''
+    lines = [
+        f'🏦{exchange_name.capitalize()}: {format_number(price, precision)}'
+        + (f' ({percent:+.2f}%)' if percent is not None else '')
+        for exchange_name, price, percent in data.venues
+    ]
+    lines.append(f'↔️Spread: {data.spread:.2f}%')
+    return '\n'.join(lines)
+
+
+class MessageTemplate:
+    """
+    The class `MessageTemplate` is a Telegram HTML message template that is parsed once. Unknown
+    placeholders are rejected when the template is loaded instead of failing on the first alert.
+    """
+
+    def __init__(self, text: str, filename: str = '') -> None:
+        """
+        :param text: The `text` parameter is the template with `str.format` placeholders, e.g.
+        '{ticker}', see `FIELDS`. The changes in percent already end with '%'
+        :type text: str
+        :param filename: The `filename` parameter is the path of the template for error messages
+        :type filename: str
+        """
+        self.filename = filename
+        for field in PERCENT_FIELDS:
+            text = text.replace(f'{{{field}}}%', f'{{{field}}}')
+        try:
+            fields = {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+        except ValueError as e:
+            raise TemplateError(f'{filename} | {e}') from e
+        unknown = fields - FIELDS
+        if unknown:
+            raise TemplateError(f'{filename} | unknown fields {", ".join(sorted(unknown))}')
+        self._format = text.format
+        self._venues = 'venues' in fields
+
+    def render(self, data: AlertData, precision: int) -> str:
+        """
+        The function `render` formats the Telegram HTML message of an alert.
+
+        :param data: The `data` parameter is the record of the alert
+        :type data: AlertData
+        :param precision: The `precision` parameter is the number of decimals of the prices and changes
+        :type precision: int
+        :return: the message.
+        """
+        venues = format_venues(data, precision) if self._venues else ''
+        return self._format(
+            headline=HEADLINES[data.kind].format(minutes=data.minutes, value=data.value),
+            exchange=data.exchange, ticker=data.ticker, minutes=data.minutes, news=NEWS[data.have_news],
+            new_price=format_number(data.new_price, precision), old_price=format_number(data.old_price, precision),
+            diff=format_number(data.new_price - data.old_price, precision, True),
+            percent_diff=format_number((data.new_price / data.old_price - 1) * 100, precision, True, '%'),
+            yesterday_change=format_number(data.yesterday_change, precision, suffix='%'),
+            half_hour_change=format_number(data.half_hour_change, precision, suffix='%'),
+            venues=f'\n{venues}' if venues else ''
+        )
+
+
+class TemplateStore:
+    """
+    The class `TemplateStore` loads the message templates once per exchange and language. The first
+    existing file of 'message_<exchange>_<language>.txt', 'message_<exchange>.txt',
+    'message_<language>.txt' and 'message.txt' is used. The choice and the modification time are
+    checked again at most every `check_seconds` seconds, so an edited template is picked up without a
+    restart; an invalid edit is logged and the last valid template is kept.
+    """
+
+    def __init__(self, directory: str = '.', check_seconds: float = 5) -> None:
+        """
+        :param directory: The `directory` parameter is the directory of the templates
+        :type directory: str
+        :param check_seconds: The `check_seconds` parameter is the interval of the file checks
+        :type check_seconds: float
+        """
+        self.directory = directory
+        self.check_seconds = check_seconds
+        self._templates: dict[tuple, tuple] = {}
+
+    def _candidates(self, exchange_name: str, language: str) -> list:
+        names = [f'message_{exchange_name}_{language}.txt', f'message_{exchange_name}.txt', f'message_{language}.txt']
+        if not language:
+            names = [f'message_{exchange_name}.txt']
+        return [os.path.join(self.directory, name) for name in names + ['message.txt']]
+
+    def _stat(self, exchange_name: str, language: str) -> tuple:
+        for filename in self._candidates(exchange_name, language):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            return filename, stat.st_mtime_ns, stat.st_size
+        raise TemplateError(f'No message template in {self.directory}')
+
+    def get(self, exchange_name: str, language: str = '') -> MessageTemplate:
+        """
+        The function `get` returns the template of an exchange and language.
+
+        :param exchange_name: The `exchange_name` parameter is the name of the exchange
+        :type exchange_name: str
+        :param language: The `language` parameter is the language code, e.g. 'en', empty for the default
+        template
+        :type language: str
+        :return: a `MessageTemplate`.
+        """
+        key = (exchange_name, language)
+        cached = self._templates.get(key)
+        now = time.monotonic()
+        if cached is not None and now < cached[2]:
+            return cached[0]
+        stamp = self._stat(exchange_name, language)
+        if cached is not None and cached[1] == stamp:
+            self._templates[key] = (cached[0], stamp, now + self.check_seconds)
+            return cached[0]
+        try:
+            with open(stamp[0], encoding='utf-8') as f:
+                template = MessageTemplate(f.read(), stamp[0])
+        except (OSError, TemplateError) as e:
+            if cached is None:
+                raise
+            logger.error(f'{stamp[0]} not reloaded | {e}')
+            template = cached[0]
+        self._templates[key] = (template, stamp, now + self.check_seconds)
+        return template
+
+
+message_templates = TemplateStore()
@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from threading import Lock
+from aiohttp import web
+
+import bisect
+import time
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+PREFIX = 'pump_bot'
+
+
+def format_labels(labels: tuple, **extra) -> str:
+    labels = labels + tuple(extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class StageMetrics:
+    """
+    The class `StageMetrics` collects latency histograms of named stages, e.g. the fetches of the alert
+    pipeline, counters of events such as retries and gauges such as the number of tracked symbols.
+    Every value is keyed by its name and optional labels such as the exchange. `render` exports them in
+    the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self._stats: dict[tuple, list] = {}
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        """
+        The function `observe` records one duration of a stage.
+
+        :param stage: The `stage` parameter is the name of the stage, e.g. 'ohlcv'
+        :type stage: str
+        :param seconds: The `seconds` parameter is the duration of the stage in seconds
+        :type seconds: float
+        """
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def inc(self, counter: str, value: float = 1, **labels) -> None:
+        """
+        The function `inc` increments a counter.
+
+        :param counter: The `counter` parameter is the name of the counter, e.g. 'watcher_retries'
+        :type counter: str
+        :param value: The `value` parameter is the increment
+        :type value: float
+        """
+        key = (counter, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, gauge: str, value: float, **labels) -> None:
+        """
+        The function `set` sets a gauge.
+
+        :param gauge: The `gauge` parameter is the name of the gauge, e.g. 'symbols'
+        :type gauge: str
+        :param value: The `value` parameter is the current value
+        :type value: float
+        """
+        with self._lock:
+            self._gauges[(gauge, tuple(sorted(labels.items())))] = value
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """
+        The function `timer` is a context manager that observes the duration of its block.
+
+        :param stage: The `stage` parameter is the name of the stage
+        :type stage: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def summary(self) -> dict:
+        """
+        The function `summary` returns the collected statistics.
+
+        :return: a dictionary with `(stage, labels)` keys and `{'count', 'avg', 'max', 'p95'}` values,
+        `p95` is the upper bound of the histogram bucket of the 95th percentile.
+        """
+        with self._lock:
+            summary = {}
+            for key, (count, total, maximum, buckets) in self._stats.items():
+                rank, seen, p95 = count * 0.95, 0, maximum
+                for bound, bucket in zip(BUCKETS, buckets):
+                    seen += bucket
+                    if seen >= rank:
+                        p95 = min(bound, maximum)
+                        break
+                summary[key] = {'count': count, 'avg': total / count, 'max': maximum, 'p95': p95}
+            return summary
+
+    def to_json(self) -> dict:
+        """
+        The function `to_json` returns the stages, counters and gauges as JSON-serializable lists.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in self._counters.items()]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in self._gauges.items()]
+        stages = [{'stage': stage, 'labels': dict(labels), **stats} for (stage, labels), stats in self.summary().items()]
+        return {'stages': stages, 'counters': counters, 'gauges': gauges}
+
+    def render(self) -> str:
+        """
+        The function `render` exports the metrics in the Prometheus text exposition format.
+
+        :return: a string.
+        """
+        lines = [f'# TYPE {PREFIX}_stage_seconds histogram']
+        with self._lock:
+            for (stage, labels), (count, total, _, buckets) in sorted(self._stats.items()):
+                labels = (('stage', stage),) + labels
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, buckets):
+                    cumulative += bucket
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{format_labels(labels, le=le)} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_sum{format_labels(labels)} {total}')
+                lines.append(f'{PREFIX}_stage_seconds_count{format_labels(labels)} {count}')
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f'{PREFIX}_{name}_total{format_labels(labels)} {value:g}')
+            for name in sorted({name for name, _ in self._gauges}):
+                lines.append(f'# TYPE {PREFIX}_{name} gauge')
+                for (gauge, labels), value in sorted(self._gauges.items()):
+                    if gauge == name:
+                        lines.append(f'{PREFIX}_{name}{format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+stage_metrics = StageMetrics()
+
+
+async def serve_metrics(host: str, port: int, metrics: StageMetrics = stage_metrics, profiler=None) -> web.AppRunner:
+    """
+    The function `serve_metrics` starts a local HTTP server with the endpoints `/metrics` in the
+    Prometheus text format and `/metrics.json` for `status_bot.py`. If a `SamplingProfiler` is given,
+    `/profile` returns its collapsed stacks and `/profile/start` and `/profile/stop` toggle it.
+
+    :param host: The `host` parameter is the address to listen on, e.g. '127.0.0.1'
+    :type host: str
+    :param port: The `port` parameter is the port to listen on
+    :type port: int
+    :param metrics: The `metrics` parameter is the `StageMetrics` to export
+    :type metrics: StageMetrics
+    :param profiler: The `profiler` parameter is an optional `SamplingProfiler`
+    :return: the `web.AppRunner`, its `cleanup` stops the server.
+    """
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def json_handler(request: web.Request) -> web.Response:
+        return web.json_response(metrics.to_json())
+
+    async def profile_handler(request: web.Request) -> web.Response:
+        return web.Response(text=profiler.collapsed())
+
+    async def profile_start_handler(request: web.Request) -> web.Response:
+        profiler.start()
+        return web.Response(text='started\n')
+
+    async def profile_stop_handler(request: web.Request) -> web.Response:
+        profiler.stop()
+        return web.Response(text='stopped\n')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/metrics.json', json_handler)
+    if profiler is not None:
+        app.router.add_get('/profile', profile_handler)
+        app.router.add_post('/profile/start', profile_start_handler)
+        app.router.add_post('/profile/stop', profile_stop_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,121 @@
+from datetime import datetime
+from loguru import logger
+
+import aiohttp
+import asyncio
+import time
+
+
+NEWS_URL = 'https://cryptopanic.com/api/v1/posts/'
+PAGE_SIZE = 20
+BATCH_SIZE = 10
+
+
+class NewsService:
+    """
+    The class `NewsService` answers "does the coin have news for the last 24 hours" from the CryptoPanic
+    API. Answers are cached per coin for `ttl` seconds, concurrent lookups of the same coin share one
+    request, coins can be prefetched in batches with the `currencies=` parameter and the last known
+    answer is returned when the API is slow or down.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, api_token: str, ttl: float = 600,
+                 timeout: float = 5, url: str = NEWS_URL) -> None:
+        """
+        :param session: The `session` parameter is the shared HTTP session
+        :type session: aiohttp.ClientSession
+        :param api_token: The `api_token` parameter is the CryptoPanic API token
+        :type api_token: str
+        :param ttl: The `ttl` parameter is the time in seconds an answer is served from the cache
+        :type ttl: float
+        :param timeout: The `timeout` parameter is the timeout of one API request in seconds
+        :type timeout: float
+        :param url: The `url` parameter is the posts endpoint of the API
+        :type url: str
+        """
+        self.session = session
+        self.api_token = api_token
+        self.url = url
+        self.ttl = ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._cache: dict[str, tuple] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _is_fresh(self, coin: str) -> bool:
+        cached = self._cache.get(coin)
+        return cached is not None and time.monotonic() - cached[1] < self.ttl
+
+    def _request(self, coins: list) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(coins))
+        for coin in coins:
+            self._inflight[coin] = task
+
+        def done(_):
+            for coin in coins:
+                if self._inflight.get(coin) is task:
+                    del self._inflight[coin]
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f'News | {",".join(coins)} | {task.exception()}')
+        task.add_done_callback(done)
+        return task
+
+    async def _fetch(self, coins: list) -> dict:
+        params = {'auth_token': self.api_token, 'kind': 'news', 'currencies': ','.join(coins)}
+        async with self.session.get(self.url, params=params, timeout=self.timeout) as r:
+            r.raise_for_status()
+            results = (await r.json())['results']
+        published = {}
+        if len(coins) == 1:
+            if results:
+                published[coins[0]] = results[0]['published_at']
+        else:
+            for post in results:
+                for currency in post.get('currencies') or []:
+                    if currency['code'] in coins:
+                        published.setdefault(currency['code'], post['published_at'])
+        now_date = datetime.utcnow()
+        found = {}
+        for coin in coins:
+            if coin in published:
+                post_date = datetime.strptime(published[coin], '%Y-%m-%dT%H:%M:%SZ')
+                found[coin] = (now_date - post_date).days == 0
+            elif len(coins) == 1 or len(results) < PAGE_SIZE:
+                found[coin] = False
+        fetched_at = time.monotonic()
+        for coin, have_news in found.items():
+            self._cache[coin] = (have_news, fetched_at)
+        return found
+
+    def prefetch(self, coins: list) -> None:
+        """
+        The function `prefetch` starts batched requests for the coins that have no fresh answer and
+        returns immediately. A coin that is absent from a full page of a batch stays unresolved and is
+        looked up alone by `has_recent_news`.
+
+        :param coins: The `coins` parameter is a list of coin codes, e.g. ['BTC', 'ETH']
+        :type coins: list
+        """
+        stale = sorted({coin for coin in coins if not self._is_fresh(coin) and coin not in self._inflight})
+        for i in range(0, len(stale), BATCH_SIZE):
+            self._request(stale[i:i + BATCH_SIZE])
+
+    async def has_recent_news(self, coin: str) -> bool:
+        """
+        The function `has_recent_news` checks if there is news about the coin for the last 24 hours.
+
+        :param coin: The `coin` parameter is the coin code, e.g. 'BTC'
+        :type coin: str
+        :return: a boolean value. On API errors the last known answer (or False) is returned.
+        """
+        if self._is_fresh(coin):
+            return self._cache[coin][0]
+        try:
+            task = self._inflight.get(coin)
+            if task is not None:
+                found = await asyncio.shield(task)
+                if coin in found:
+                    return found[coin]
+            return (await asyncio.shield(self._request([coin])))[coin]
+        except Exception:
+            cached = self._cache.get(coin)
+            return cached[0] if cached is not None else False
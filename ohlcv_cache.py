@@ -0,0 +1,119 @@
+from ccxt.base.exchange import Exchange
+from collections import OrderedDict
+
+import numpy as np
+import asyncio
+import time
+
+
+class OhlcvCache:
+    """
+    The class `OhlcvCache` keeps recent candles per (exchange, symbol, timeframe) in memory. A repeated
+    request only downloads the candles newer than the last cached one (the last cached candle is
+    refreshed too, since it may still be open). Entries that weren't used for `ttl` seconds are dropped
+    and the least recently used entries are evicted above `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 3600) -> None:
+        """
+        :param max_entries: The `max_entries` parameter is the maximal number of cached series
+        :type max_entries: int
+        :param ttl: The `ttl` parameter is the time in seconds after which an unused series is dropped
+        :type ttl: float
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._locks: dict[tuple, asyncio.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        expired = time.monotonic() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry[2] < expired]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        for key in [key for key, lock in self._locks.items() if key not in self._entries and not lock.locked()]:
+            del self._locks[key]
+
+    async def candles(self, exchange: Exchange, symbol: str, timeframe: str, since: int) -> np.ndarray:
+        """
+        The function `candles` returns the candles of a symbol from `since` up to now.
+
+        :param exchange: The `exchange` parameter is the `ccxt.async_support` exchange
+        :type exchange: Exchange
+        :param symbol: The `symbol` parameter is the ticker symbol, e.g. 'BTC/USDT'
+        :type symbol: str
+        :param timeframe: The `timeframe` parameter is the ccxt timeframe, e.g. '1m'
+        :type timeframe: str
+        :param since: The `since` parameter is the timestamp in milliseconds of the first needed candle
+        :type since: int
+        :return: a (candles x 6) NumPy array of `[timestamp, open, high, low, close, volume]` rows.
+        """
+        key = (exchange.id, symbol, timeframe)
+        timeframe_ms = exchange.parse_timeframe(timeframe) * 10**3
+        since -= since % timeframe_ms
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] > since or len(entry[0]) == 0:
+                cached = await download_candles(exchange, symbol, timeframe, since)
+            else:
+                cached = entry[0]
+                fresh = await download_candles(exchange, symbol, timeframe, int(cached[-1, 0]))
+                if len(fresh):
+                    cached = np.vstack([cached[cached[:, 0] < fresh[0, 0]], fresh])
+            cached = cached[cached[:, 0] >= since]
+            self._entries[key] = [cached, since, time.monotonic()]
+            self._entries.move_to_end(key)
+            self._evict()
+        return cached
+
+
+async def download_candles(exchange: Exchange, symbol: str, timeframe: str, since: int) -> np.ndarray:
+    """
+    The function `download_candles` downloads all candles of a symbol from `since` up to now, page by
+    page, since exchanges limit the number of candles per request.
+
+    :param exchange: The `exchange` parameter is the `ccxt.async_support` exchange
+    :type exchange: Exchange
+    :param symbol: The `symbol` parameter is the ticker symbol
+    :type symbol: str
+    :param timeframe: The `timeframe` parameter is the ccxt timeframe
+    :type timeframe: str
+    :param since: The `since` parameter is the timestamp in milliseconds of the first candle
+    :type since: int
+    :return: a (candles x 6) NumPy array.
+    """
+    timeframe_ms = exchange.parse_timeframe(timeframe) * 10**3
+    now = exchange.milliseconds()
+    rows = []
+    while since <= now:
+        batch = [candle for candle in await exchange.fetch_ohlcv(symbol, timeframe, since) if candle[0] >= since]
+        if not batch:
+            break
+        rows.extend(batch)
+        since = batch[-1][0] + timeframe_ms
+    return np.array(
+        [[np.nan if value is None else value for value in row] for row in rows], dtype=float
+    ).reshape(-1, 6)
+
+
+def price_since(candles: np.ndarray, timestamp: int) -> float:
+    """
+    The function `price_since` returns the close price of the first candle that starts at or after
+    `timestamp`, like `fetch_ohlcv(symbol, timeframe, timestamp, 1)[0][4]`.
+
+    :param candles: The `candles` parameter is an array returned by `OhlcvCache.candles`
+    :type candles: np.ndarray
+    :param timestamp: The `timestamp` parameter is the timestamp in milliseconds
+    :type timestamp: int
+    :return: a float, None if there are no candles.
+    """
+    if len(candles) == 0:
+        return None
+    index = min(int(np.searchsorted(candles[:, 0], timestamp)), len(candles) - 1)
+    return float(candles[index, 4])
+
@@ -0,0 +1,164 @@
+from threading import Lock
+
+import numpy as np
+import json
+import os
+
+
+class PriceStore:
+    """
+    The class `PriceStore` keeps the last `window` per-minute prices of every ticker in memory. Each
+    ticker owns one row of a preallocated float64 matrix that is used as a ring buffer, all rows share
+    the same head column, so pushing a new minute costs one dict lookup per ticker no matter how long
+    the history is. Empty slots hold NaN.
+    """
+
+    def __init__(self, window: int = 10, capacity: int = 1024) -> None:
+        """
+        :param window: The `window` parameter is the number of per-minute prices kept for each ticker
+        :type window: int
+        :param capacity: The `capacity` parameter is the initial number of ticker rows. The matrix
+        doubles its size when more tickers appear
+        :type capacity: int
+        """
+        self.window = window
+        self._data = np.full((capacity, window), np.nan)
+        self._index: dict[str, int] = {}
+        self._symbols: list[str] = []
+        self._head = -1
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def _row(self, symbol: str) -> int:
+        row = self._index.get(symbol)
+        if row is None:
+            row = len(self._symbols)
+            if row == self._data.shape[0]:
+                grown = np.full((row * 2, self.window), np.nan)
+                grown[:row] = self._data
+                self._data = grown
+            self._index[symbol] = row
+            self._symbols.append(symbol)
+        return row
+
+    def _order(self) -> list:
+        return [(self._head - i) % self.window for i in range(self.window)]
+
+    def push(self, prices: dict) -> None:
+        """
+        The function `push` starts a new minute slot and writes the given prices into it. Tickers
+        missing from `prices` get NaN in the new slot.
+
+        :param prices: The `prices` parameter is a dictionary with ticker symbols as keys and their
+        last prices as values, as returned by `get_tickers_prices`
+        :type prices: dict
+        """
+        with self._lock:
+            self._head = (self._head + 1) % self.window
+            self._data[:, self._head] = np.nan
+            for symbol, price in prices.items():
+                row = self._row(symbol)
+                self._data[row, self._head] = price
+
+    def advance(self) -> None:
+        """
+        The function `advance` starts a new minute slot that carries over the newest known prices. It is
+        used by the streaming mode, where ticks arrive continuously and `update` overwrites the current
+        slot with the last price seen during the minute.
+        """
+        with self._lock:
+            previous = self._head
+            self._head = (self._head + 1) % self.window
+            if previous < 0:
+                self._data[:, self._head] = np.nan
+            else:
+                self._data[:, self._head] = self._data[:, previous]
+
+    def update(self, prices: dict) -> None:
+        """
+        The function `update` writes the given prices into the current minute slot without starting a
+        new one.
+
+        :param prices: The `prices` parameter is a dictionary with ticker symbols as keys and their
+        last prices as values
+        :type prices: dict
+        """
+        with self._lock:
+            if self._head < 0:
+                self._head = 0
+            for symbol, price in prices.items():
+                row = self._row(symbol)
+                self._data[row, self._head] = price
+
+    def clear(self, symbol: str) -> None:
+        """
+        The function `clear` forgets the history of one ticker, e.g. after an alert was sent for it.
+
+        :param symbol: The `symbol` parameter is the ticker symbol to clear
+        :type symbol: str
+        """
+        with self._lock:
+            row = self._index.get(symbol)
+            if row is not None:
+                self._data[row] = np.nan
+
+    def history(self, symbol: str) -> list:
+        """
+        The function `history` returns the prices of one ticker ordered from the newest slot to the
+        oldest one. Empty slots are returned as NaN so that the list index is the age in minutes.
+
+        :param symbol: The `symbol` parameter is the ticker symbol
+        :type symbol: str
+        :return: a list of `window` floats.
+        """
+        with self._lock:
+            row = self._index.get(symbol)
+            if row is None or self._head < 0:
+                return []
+            return self._data[row, self._order()].tolist()
+
+    def matrix(self) -> tuple:
+        """
+        The function `matrix` returns a consistent copy of the whole store.
+
+        :return: a tuple `(symbols, prices)` where `prices` is a (symbols x window) NumPy array whose
+        column 0 is the newest slot.
+        """
+        with self._lock:
+            symbols = list(self._symbols)
+            if self._head < 0:
+                return symbols, np.full((len(symbols), self.window), np.nan)
+            return symbols, self._data[:len(symbols), self._order()]
+
+    def to_dict(self) -> dict:
+        """
+        The function `to_dict` converts the store to the `{ticker: [newest, ..., oldest]}` format that
+        was used by `temp/{exchange}_tickers.json`. Empty slots are skipped.
+
+        :return: a dictionary.
+        """
+        symbols, prices = self.matrix()
+        data = {}
+        for symbol, row in zip(symbols, prices):
+            values = row[~np.isnan(row)].tolist()
+            if values:
+                data[symbol] = values
+        return data
+
+    def snapshot(self, filename: str) -> None:
+        """
+        The function `snapshot` writes the store to a JSON file. The file is written next to the target
+        and renamed over it, so readers never see a half-written snapshot.
+
+        :param filename: The `filename` parameter is the path of the JSON snapshot
+        :type filename: str
+        """
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_filename, filename)
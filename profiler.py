@@ -0,0 +1,76 @@
+from collections import Counter
+from threading import Thread, Event
+
+import threading
+import time
+import sys
+import os
+
+
+class SamplingProfiler:
+    """
+    The class `SamplingProfiler` samples the stack of a thread, by default the main thread that runs
+    the event loop, from a background thread every `interval` seconds. The samples are aggregated as
+    collapsed stacks that flame graph tools read. Sampling costs nothing while it is stopped.
+    """
+
+    def __init__(self, interval: float = 0.01, thread_id: int = None) -> None:
+        """
+        :param interval: The `interval` parameter is the time in seconds between two samples
+        :type interval: float
+        :param thread_id: The `thread_id` parameter is the ident of the sampled thread, the main thread
+        if not given
+        :type thread_id: int
+        """
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples: Counter = Counter()
+        self._stop = Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """
+        The function `collapsed` returns the samples in the collapsed stack format, one `frame;frame;...
+        count` line per distinct stack.
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+    def top(self, limit: int = 20) -> list:
+        """
+        The function `top` returns the functions that were on top of the stack most often.
+
+        :return: a list of `(function, samples)` tuples.
+        """
+        functions = Counter()
+        for stack, count in self.samples.items():
+            functions[stack.rsplit(';', 1)[-1]] += count
+        return functions.most_common(limit)
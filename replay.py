@@ -0,0 +1,354 @@
+from base_worker import watcher, get_tickers_prices
+from configparser import RawConfigParser
+from market_index import MarketIndex
+from price_store import PriceStore
+from rule_engine import RuleEngine, Rule, parse_rules
+from tick_history import TickHistory
+from typing import NamedTuple
+
+import numpy as np
+import argparse
+import asyncio
+import time
+import json
+import sys
+import os
+
+
+class ReplayExchange:
+    """
+    The class `ReplayExchange` is a stand-in for a ccxt exchange that serves recorded ticker snapshots.
+    `position` selects the current snapshot, `fetch_tickers` and `milliseconds` answer from it.
+    """
+
+    id = 'replay'
+
+    def __init__(self, snapshots: list) -> None:
+        """
+        :param snapshots: The `snapshots` parameter is a list of `(timestamp, {ticker: price})` tuples
+        ordered by time
+        :type snapshots: list
+        """
+        self.snapshots = snapshots
+        self.position = 0
+
+    def milliseconds(self) -> int:
+        return self.snapshots[self.position][0]
+
+    async def load_markets(self, reload: bool = False) -> dict:
+        symbols = set()
+        for _, prices in self.snapshots:
+            symbols.update(prices)
+        return {
+            symbol: {'symbol': symbol, 'id': symbol, 'quote': symbol.split('/')[1].split(':')[0], 'active': True}
+            for symbol in symbols
+        }
+
+    async def fetch_tickers(self) -> dict:
+        return {symbol: {'symbol': symbol, 'last': price} for symbol, price in self.snapshots[self.position][1].items()}
+
+    async def close(self) -> None:
+        pass
+
+
+class Alert(NamedTuple):
+    time: int
+    ticker: str
+    index: int
+    old_price: float
+    new_price: float
+    percent: float
+    latency: float = None
+    kind: str = 'rise'
+
+
+class ReplayReport(NamedTuple):
+    alerts: list
+    snapshots: int
+    ticks: int
+    seconds: float
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds else float('inf')
+
+    @property
+    def mean_latency(self) -> float:
+        latencies = [alert.latency for alert in self.alerts if alert.latency is not None]
+        return sum(latencies) / len(latencies) if latencies else None
+
+
+def move_time(snapshots: list, ticker: str, start: int, end: int, price: float, rising: bool = True) -> int:
+    """
+    The function `move_time` finds the first snapshot between `start` and `end` where the price of the
+    ticker reached `price`, i.e. the moment the move became visible in the recorded data.
+
+    :param rising: The `rising` parameter is False for a move down, the price must fall to `price` then
+    :type rising: bool
+    :return: a timestamp in milliseconds.
+    """
+    for timestamp, prices in snapshots:
+        if start <= timestamp <= end and ticker in prices and (prices[ticker] >= price if rising else prices[ticker] <= price):
+            return timestamp
+    return end
+
+
+def trigger_price(alert: Alert, rule: Rule) -> float:
+    """
+    The function `trigger_price` returns the price at which the rule of an alert fired, the new price for
+    the rules whose threshold isn't a percent of the price.
+    """
+    if rule.kind == 'rise':
+        return alert.old_price * (1 + rule.threshold / 100)
+    if rule.kind == 'drop':
+        return alert.old_price * (1 - rule.threshold / 100)
+    return alert.new_price
+
+
+async def replay(snapshots: list, rules: list, window: int = 10, nums_precision: int = 8,
+                 mode: str = 'polling', scan_seconds: float = 20) -> ReplayReport:
+    """
+    The function `replay` feeds recorded snapshots through the watcher and the `RuleEngine` of the
+    workers as fast as possible and collects the confirmed alerts. The recordings have no volumes, the
+    volume rules never fire. In the 'polling' mode the watcher takes one snapshot per minute,
+    like `course_watcher`, in the 'streaming' mode every snapshot updates the current minute slot, like
+    `stream_watcher`. An alert clears the history of its ticker as a sent alert does. The latency of an
+    alert is the time from the first snapshot that shows its move to the scan that raised it, it is
+    None if the watcher took every snapshot, e.g. a recording of one snapshot per minute in the
+    'polling' mode, since the move is then always seen by the scan of its own snapshot.
+
+    :param snapshots: The `snapshots` parameter is a list of `(timestamp, {ticker: price})` tuples
+    ordered by time
+    :type snapshots: list
+    :param rules: The `rules` parameter is a list of `Rule`, e.g. from `parse_rules`
+    :type rules: list
+    :param window: The `window` parameter is the minimal number of per-minute slots, the rules may need
+    more
+    :type window: int
+    :param nums_precision: The `nums_precision` parameter is used for the minimal price filter
+    :type nums_precision: int
+    :param mode: The `mode` parameter is 'polling' or 'streaming'
+    :type mode: str
+    :param scan_seconds: The `scan_seconds` parameter is the detection interval of the streaming mode
+    :type scan_seconds: float
+    :return: a `ReplayReport`.
+    """
+    exchange = ReplayExchange(snapshots)
+    index = MarketIndex(exchange, 'USDT')
+    await index.refresh()
+    engine = RuleEngine(rules)
+    store = PriceStore(window=max(window, engine.window))
+    alerts = []
+    fired = {}
+    ticks = 0
+    skipped = 0
+    next_minute = next_scan = snapshots[0][0] if snapshots else 0
+    start = time.perf_counter()
+    for position, (timestamp, prices) in enumerate(snapshots):
+        exchange.position = position
+        if mode == 'polling':
+            if timestamp < next_minute:
+                skipped += 1
+                continue
+            await watcher(exchange, 'binance', nums_precision, store, index)
+        else:
+            if timestamp >= next_minute:
+                store.advance()
+            store.update(await get_tickers_prices(exchange, 'binance', nums_precision, index))
+            if timestamp < next_scan:
+                continue
+            next_scan = timestamp + scan_seconds * 10**3
+        while next_minute <= timestamp:
+            next_minute += 60*10**3
+        ticks += len(prices)
+        for pump in engine.evaluate(*store.matrix()):
+            if not engine.confirmed(pump):
+                continue
+            alerts.append(Alert(timestamp, *pump[:5], kind=pump.rule.kind))
+            fired[len(alerts) - 1] = pump.rule
+            store.clear(pump.ticker)
+    seconds = time.perf_counter() - start
+    if mode == 'polling' and not skipped:
+        return ReplayReport(alerts, len(snapshots), ticks, seconds)
+    alerts = [
+        alert._replace(latency=(alert.time - move_time(
+            snapshots, alert.ticker, alert.time - alert.index*60*10**3 - 60*10**3, alert.time,
+            trigger_price(alert, fired[position]), alert.percent >= 0
+        )) / 10**3)
+        for position, alert in enumerate(alerts)
+    ]
+    return ReplayReport(alerts, len(snapshots), ticks, seconds)
+
+
+def load_snapshots(filename: str) -> list:
+    """
+    The function `load_snapshots` reads recorded snapshots from a JSON lines file where every line is
+    `{"time": <ms>, "prices": {ticker: price}}`.
+
+    :param filename: The `filename` parameter is the path of the file
+    :type filename: str
+    :return: a list of `(timestamp, {ticker: price})` tuples.
+    """
+    snapshots = []
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                snapshots.append((record['time'], record['prices']))
+    snapshots.sort(key=lambda snapshot: snapshot[0])
+    return snapshots
+
+
+def snapshots_from_ohlcv(history: dict) -> list:
+    """
+    The function `snapshots_from_ohlcv` turns OHLCV history into snapshots of close prices.
+
+    :param history: The `history` parameter is a dictionary with tickers as keys and lists of
+    `[timestamp, open, high, low, close, volume]` candles as values
+    :type history: dict
+    :return: a list of `(timestamp, {ticker: price})` tuples.
+    """
+    snapshots = {}
+    for ticker, candles in history.items():
+        for candle in candles:
+            snapshots.setdefault(candle[0], {})[ticker] = candle[4]
+    return sorted(snapshots.items())
+
+
+def snapshots_from_history(history: TickHistory, start_day: str = '', end_day: str = '9999') -> list:
+    """
+    The function `snapshots_from_history` turns the ticks of a `TickHistory` into snapshots.
+
+    :param history: The `history` parameter is the tick history of an exchange
+    :type history: TickHistory
+    :param start_day: The `start_day` parameter is the first day in the 'YYYY-MM-DD' format
+    :type start_day: str
+    :param end_day: The `end_day` parameter is the last day in the 'YYYY-MM-DD' format
+    :type end_day: str
+    :return: a list of `(timestamp, {ticker: price})` tuples.
+    """
+    snapshots = []
+    for filename in history.segments(start_day, end_day):
+        data = history.load_segment(filename)
+        symbols = history.symbols[:data.shape[1] - 1]
+        for row in data:
+            known = np.flatnonzero(~np.isnan(row[1:len(symbols) + 1]))
+            snapshots.append((int(row[0]), {symbols[i]: float(row[i + 1]) for i in known}))
+    snapshots.sort(key=lambda snapshot: snapshot[0])
+    return snapshots
+
+
+def synthetic_snapshots(symbols: int, minutes: int, pumps: int = 10, seed: int = 1) -> list:
+    """
+    The function `synthetic_snapshots` generates per-minute random walk prices with `pumps` injected
+    jumps of 10%.
+
+    :param symbols: The `symbols` parameter is the number of tickers
+    :type symbols: int
+    :param minutes: The `minutes` parameter is the number of snapshots
+    :type minutes: int
+    :param pumps: The `pumps` parameter is the number of injected jumps
+    :type pumps: int
+    :param seed: The `seed` parameter is the random seed
+    :type seed: int
+    :return: a list of `(timestamp, {ticker: price})` tuples.
+    """
+    random = np.random.default_rng(seed)
+    prices = np.cumprod(1 + random.normal(0, 0.002, (minutes, symbols)), axis=0)
+    for symbol, minute in zip(random.integers(0, symbols, pumps), random.integers(minutes // 2, minutes, pumps)):
+        prices[minute:, symbol] *= 1.1
+    names = [f'C{i}/USDT' for i in range(symbols)]
+    start = (int(time.time()) // 60 - minutes) * 60*10**3
+    return [(start + minute*60*10**3, dict(zip(names, row.tolist()))) for minute, row in enumerate(prices)]
+
+
+async def record(exchange_name: str, filename: str, minutes: int, interval: float) -> None:
+    """
+    The function `record` polls `fetch_tickers` of a live exchange and appends the snapshots to a JSON
+    lines file that can be replayed.
+    """
+    import ccxt.async_support
+    exchange = getattr(ccxt.async_support, exchange_name)()
+    index = MarketIndex(exchange, 'USDT')
+    try:
+        await index.refresh()
+        end = time.time() + minutes * 60
+        while time.time() < end:
+            prices = await get_tickers_prices(exchange, exchange_name, 8, index)
+            with open(filename, 'a') as f:
+                f.write(json.dumps({'time': exchange.milliseconds(), 'prices': prices}) + '\n')
+            await asyncio.sleep(interval)
+    finally:
+        await exchange.close()
+
+
+def print_report(label: str, report: ReplayReport) -> None:
+    print(
+        f'{label:<24}{report.snapshots:>10}{report.ticks:>12}{len(report.alerts):>8}'
+        f'{"n/a" if report.mean_latency is None else f"{report.mean_latency:.1f}":>12}{report.ticks_per_second:>14.0f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded tickers through the watcher and the detector')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help='throughput on synthetic data')
+    bench_parser.add_argument('--symbols', type=int, nargs='+', default=[1000, 10000, 100000])
+    bench_parser.add_argument('--minutes', type=int, default=30)
+    bench_parser.add_argument('--percent', type=float, default=5)
+    bench_parser.add_argument('--min-ticks', type=float, default=0, help='exit with 1 below this ticks/s')
+    replay_parser = subparsers.add_parser('replay', help='replay a JSON lines recording')
+    replay_parser.add_argument('filename', help='a JSON lines recording or a tick history directory')
+    replay_parser.add_argument('--start-day', default='', help='first day of a tick history, YYYY-MM-DD')
+    replay_parser.add_argument('--end-day', default='9999', help='last day of a tick history, YYYY-MM-DD')
+    replay_parser.add_argument('--exchange', default='binance', help='the config section whose rules are replayed')
+    replay_parser.add_argument('--config', default='config.cfg')
+    replay_parser.add_argument('--percent', type=float, nargs='+', help='replay a rise rule per percent instead')
+    replay_parser.add_argument('--window', type=int, default=10)
+    replay_parser.add_argument('--mode', choices=['polling', 'streaming'], default='polling')
+    replay_parser.add_argument('--alerts', action='store_true', help='print every alert')
+    record_parser = subparsers.add_parser('record', help='record live tickers')
+    record_parser.add_argument('exchange')
+    record_parser.add_argument('filename')
+    record_parser.add_argument('--minutes', type=int, default=60)
+    record_parser.add_argument('--interval', type=float, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        asyncio.run(record(args.exchange, args.filename, args.minutes, args.interval))
+        return
+    print(f'{"run":<24}{"snapshots":>10}{"ticks":>12}{"alerts":>8}{"latency s":>12}{"ticks/s":>14}')
+    if args.command == 'replay':
+        if os.path.isdir(args.filename):
+            snapshots = snapshots_from_history(TickHistory(args.filename), args.start_day, args.end_day)
+        else:
+            snapshots = load_snapshots(args.filename)
+        window = args.window
+        runs = [(f'{args.mode} {percent:g}%', [Rule('pump', 'rise', percent, window - 1)]) for percent in args.percent or []]
+        if not runs:
+            config = RawConfigParser()
+            config.read(args.config)
+            if not config.has_section(args.exchange):
+                parser.error(f'no [{args.exchange}] section in {args.config}, use --percent')
+            window = config.getint(args.exchange, 'window', fallback=window)
+            rules = parse_rules(config, args.exchange, config.getfloat(args.exchange, 'percent_difference'), window)
+            runs = [(f'{args.mode} {args.exchange}', rules)]
+        for label, rules in runs:
+            report = asyncio.run(replay(snapshots, rules, window, mode=args.mode))
+            print_report(label, report)
+            if args.alerts:
+                for alert in report.alerts:
+                    print(f'  {alert.time} {alert.ticker} {alert.kind} {alert.percent:+.2f}% in {alert.index} min'
+                          + (f', latency {alert.latency:.0f}s' if alert.latency is not None else ''))
+    else:
+        slowest = float('inf')
+        for symbols in args.symbols:
+            report = asyncio.run(replay(synthetic_snapshots(symbols, args.minutes), [Rule('pump', 'rise', args.percent, 9)]))
+            print_report(f'{symbols} symbols', report)
+            slowest = min(slowest, report.ticks_per_second)
+        if slowest < args.min_ticks:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
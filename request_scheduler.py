@@ -0,0 +1,252 @@
+from ccxt.base.errors import NetworkError, DDoSProtection, ExchangeNotAvailable
+from metrics import stage_metrics
+
+import contextvars
+import asyncio
+import random
+import heapq
+import time
+
+
+PRIORITY_TICKERS = 0
+PRIORITY_ENRICHMENT = 1
+PRIORITY_BACKGROUND = 2
+# the priority of the scheduled request that runs in the current task, read by `RequestScheduler.throttle`
+_priority = contextvars.ContextVar('priority', default=PRIORITY_ENRICHMENT)
+
+
+def backoff_delay(attempt: int, base: float = 1, maximum: float = 60) -> float:
+    """
+    The function `backoff_delay` returns the pause before retry number `attempt`: exponential backoff
+    capped at `maximum` with full jitter in [0.5, 1.5), so retries of many callers don't line up.
+
+    :param attempt: The `attempt` parameter is the number of failed attempts so far, starting at 0
+    :type attempt: int
+    :return: a delay in seconds.
+    """
+    return min(maximum, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class CircuitOpenError(ExchangeNotAvailable):
+    pass
+
+
+class RequestScheduler:
+    """
+    The class `RequestScheduler` spends the request budget of one exchange. A token bucket is filled at
+    the rate allowed by the ccxt `rateLimit`, waiting requests get the tokens in priority order (ticker
+    polling, then alert enrichment, then background work) and in arrival order within a class. Network
+    errors are retried with jittered exponential backoff, a rate limit answer also pauses the whole
+    bucket. After `failure_threshold` failures in a row the circuit opens and requests fail at once for
+    `reset_timeout` seconds, then one trial request decides whether it closes again. A bound ccxt
+    exchange is throttled by the scheduler only: its `throttle` is replaced by `RequestScheduler.throttle`,
+    so every HTTP request of a method is charged the ccxt cost of its endpoint and ccxt's own FIFO
+    throttler doesn't reorder the granted requests.
+    """
+
+    def __init__(self, name: str, rate_limit: float, burst: float = 10, retries: int = 3,
+                 failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        """
+        :param name: The `name` parameter is the name of the exchange, used in the metrics
+        :type name: str
+        :param rate_limit: The `rate_limit` parameter is the ccxt `rateLimit`, the minimal time in
+        milliseconds between two requests
+        :type rate_limit: float
+        :param burst: The `burst` parameter is the capacity of the bucket
+        :type burst: float
+        :param retries: The `retries` parameter is the number of retries of a failed request
+        :type retries: int
+        :param failure_threshold: The `failure_threshold` parameter is the number of failures in a row
+        that opens the circuit
+        :type failure_threshold: int
+        :param reset_timeout: The `reset_timeout` parameter is the time in seconds the circuit stays open
+        :type reset_timeout: float
+        """
+        self.name = name
+        self.rate = 10**3 / rate_limit if rate_limit else float('inf')
+        self.burst = burst
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.tokens = burst
+        self.failures = 0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._opened_at = None
+        self._trial = False
+        self._waiters: list = []
+        self._counter = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self._exchanges: list = []
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            self._refill(now)
+            _, _, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if now >= self._paused_until and self.tokens >= min(cost, self.burst):
+                heapq.heappop(self._waiters)
+                self.tokens -= cost
+                future.set_result(None)
+                continue
+            delay = max(self._paused_until - now, (min(cost, self.burst) - self.tokens) / self.rate)
+            self._wakeup.clear()
+            try:
+                # a new waiter may have a higher priority than the current head
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self, priority: int = PRIORITY_ENRICHMENT, cost: float = 1) -> None:
+        """
+        The function `acquire` waits until the bucket grants `cost` tokens to a request of `priority`.
+        """
+        if self.rate == float('inf'):
+            return
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        self._counter += 1
+        heapq.heappush(self._waiters, (priority, self._counter, cost, future))
+        self._wakeup.set()
+        await future
+
+    async def throttle(self, cost: float = None) -> None:
+        """
+        The function `throttle` replaces `Exchange.throttle` of the bound ccxt exchanges, ccxt calls it
+        with the cost of the endpoint before every HTTP request.
+        """
+        await self.acquire(_priority.get(), cost or 1)
+
+    def _check_circuit(self) -> None:
+        state = self.state
+        if state == 'open' or (state == 'half-open' and self._trial):
+            stage_metrics.inc('circuit_rejections', exchange=self.name)
+            raise CircuitOpenError(f'{self.name} circuit is open after {self.failures} failures')
+        self._trial = state == 'half-open'
+
+    def _record(self, success: bool) -> None:
+        self._trial = False
+        if success:
+            self.failures = 0
+            self._opened_at = None
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self._opened_at is not None:
+            if self._opened_at is None:
+                stage_metrics.inc('circuit_opened', exchange=self.name)
+            self._opened_at = time.monotonic()
+
+    async def call(self, priority: int, function, *args, cost: float = 1, **kwargs):
+        """
+        The function `call` runs one exchange request within the budget.
+
+        :param priority: The `priority` parameter is one of `PRIORITY_TICKERS`, `PRIORITY_ENRICHMENT`
+        and `PRIORITY_BACKGROUND`
+        :type priority: int
+        :param function: The `function` parameter is the coroutine function of the request, e.g.
+        `exchange.fetch_ohlcv`
+        :param cost: The `cost` parameter is the number of tokens of the request, the methods of a bound
+        ccxt exchange are charged the ccxt cost of each of their HTTP requests instead
+        :type cost: float
+        :return: the result of the request.
+        """
+        throttled = any(getattr(function, '__self__', None) is exchange for exchange in self._exchanges)
+        token = _priority.set(priority)
+        try:
+            return await self._call(priority, function, args, kwargs, cost, throttled)
+        finally:
+            _priority.reset(token)
+
+    async def _call(self, priority: int, function, args: tuple, kwargs: dict, cost: float, throttled: bool):
+        for attempt in range(self.retries + 1):
+            self._check_circuit()
+            if not throttled:
+                await self.acquire(priority, cost)
+            try:
+                result = await function(*args, **kwargs)
+            except NetworkError as e:
+                self._record(False)
+                stage_metrics.inc('request_retries', exchange=self.name)
+                delay = backoff_delay(attempt)
+                if isinstance(e, DDoSProtection):
+                    # RateLimitExceeded is a DDoSProtection, the whole exchange waits
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    self.tokens = 0
+                if attempt == self.retries or self.state == 'open':
+                    raise
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._trial = False
+                raise
+            except Exception:
+                # the exchange answered, e.g. with BadSymbol, so it is reachable
+                self._record(True)
+                raise
+            else:
+                self._record(True)
+                return result
+
+    def close(self) -> None:
+        """
+        The function `close` stops the dispatcher task.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def bind(self, exchange, priority: int) -> 'ScheduledExchange':
+        """
+        The function `bind` returns a view of `exchange` whose requests go through the scheduler with
+        `priority`.
+        """
+        if hasattr(exchange, 'fetch2') and not any(exchange is bound for bound in self._exchanges):
+            # ccxt calls `throttle` with the endpoint cost, the scheduler takes over its rate limiting
+            exchange.throttle = self.throttle
+            self._exchanges.append(exchange)
+        return ScheduledExchange(exchange, self, priority)
+
+
+class ScheduledExchange:
+    """
+    The class `ScheduledExchange` is a view of a ccxt exchange for the code that only needs a few
+    request methods. The methods in `SCHEDULED` are run through the `RequestScheduler`, everything else,
+    e.g. `milliseconds` or `parse_timeframe`, is taken from the exchange as is.
+    """
+
+    SCHEDULED = frozenset({'fetch_tickers', 'fetch_ohlcv', 'load_markets', 'futuresPublicGetContractsActive'})
+
+    def __init__(self, exchange, scheduler: RequestScheduler, priority: int) -> None:
+        self.exchange = exchange
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.exchange, name)
+        if name not in self.SCHEDULED:
+            return attribute
+
+        async def scheduled(*args, **kwargs):
+            return await self.scheduler.call(self.priority, attribute, *args, **kwargs)
+        return scheduled
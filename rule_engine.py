@@ -0,0 +1,186 @@
+from configparser import RawConfigParser
+from detector import Pump
+from typing import NamedTuple
+
+import numpy as np
+
+
+RULE_KINDS = ('rise', 'drop', 'volume', 'zscore')
+MINUTES_PER_DAY = 24*60
+# the floor of the standard deviation of the minute log returns, a flat history would divide by 0
+ZSCORE_MIN_STD = 1e-4
+
+
+class Rule(NamedTuple):
+    """
+    The class `Rule` is one detection rule:
+
+    - 'rise': the price rose by `threshold` percent against any of the last `minutes` slots
+    - 'drop': the price fell by `threshold` percent against any of the last `minutes` slots
+    - 'volume': the 24h quote volume grew during the last `minutes` minutes `threshold` times faster
+      than its daily average
+    - 'zscore': the last one minute return is `threshold` standard deviations of the `minutes` returns
+      before it
+    """
+    name: str
+    kind: str
+    threshold: float
+    minutes: int
+
+    @property
+    def window(self) -> int:
+        return self.minutes + 2 if self.kind == 'zscore' else self.minutes + 1
+
+
+def parse_rules(config: RawConfigParser, exchange_name: str, percent_difference: float, window: int = 10) -> list:
+    """
+    The function `parse_rules` reads the rules of an exchange from the `rule_<name> = <kind> <threshold>
+    <minutes>` keys of its config section, e.g. `rule_dump = drop 7 15`. Without rule keys the only rule
+    is a rise of `percent_difference` against the last `window` - 1 minutes.
+
+    :param config: The `config` parameter is an instance of the `RawConfigParser` class
+    :type config: RawConfigParser
+    :param exchange_name: The `exchange_name` parameter is the config section of the exchange
+    :type exchange_name: str
+    :param percent_difference: The `percent_difference` parameter is the threshold of the default rule
+    :type percent_difference: float
+    :param window: The `window` parameter is the number of per-minute slots of the default rule
+    :type window: int
+    :return: a list of `Rule`.
+    """
+    rules = []
+    for key, value in config[exchange_name].items():
+        if not key.startswith('rule_'):
+            continue
+        kind, threshold, *minutes = value.split()
+        if kind not in RULE_KINDS:
+            raise BaseException(f'Rule kind {kind} isn\'t supported')
+        rules.append(Rule(key[len('rule_'):], kind, float(threshold), int(minutes[0]) if minutes else window - 1))
+    return rules or [Rule('pump', 'rise', percent_difference, window - 1)]
+
+
+class RuleEngine:
+    """
+    The class `RuleEngine` evaluates all rules of an exchange in one pass over the price window. The
+    changes against every older slot, their running maxima and the cumulative sums of the minute
+    returns are computed once, after that every rule is a column lookup, so a rule costs O(symbols)
+    whatever its number of minutes. A ticker gives at most one trigger. If several rules fire, the kind
+    that comes first in `RULE_KINDS` wins and, within a kind, the rule that exceeds its threshold the
+    most, so a huge z-score after a quiet period doesn't turn a rise into a z-score alert. With a lowered
+    `ratio` the near misses only win if no rule fired.
+    """
+
+    def __init__(self, rules: list) -> None:
+        """
+        :param rules: The `rules` parameter is a list of `Rule`
+        :type rules: list
+        """
+        self.rules = list(rules)
+        self.thresholds = np.array([rule.threshold for rule in self.rules])
+        self.priorities = np.array([RULE_KINDS.index(rule.kind) for rule in self.rules])
+        self.window = max(rule.window for rule in self.rules)
+        self.needs_volume = any(rule.kind == 'volume' for rule in self.rules)
+
+    @staticmethod
+    def confirmed(pump: Pump) -> bool:
+        """
+        The function `confirmed` checks that a trigger found with a lowered `ratio` reaches the real
+        threshold of its rule.
+        """
+        return pump.rule is None or pump.value >= pump.rule.threshold
+
+    @staticmethod
+    def _align(symbols: list, volumes: tuple) -> np.ndarray:
+        volume_symbols, volume_prices = volumes
+        if volume_symbols == symbols:
+            return volume_prices
+        rows = {symbol: row for row, symbol in enumerate(volume_symbols)}
+        aligned = np.full((len(symbols), volume_prices.shape[1]), np.nan)
+        for row, symbol in enumerate(symbols):
+            if symbol in rows:
+                aligned[row] = volume_prices[rows[symbol]]
+        return aligned
+
+    def evaluate(self, symbols: list, prices: np.ndarray, volumes: tuple = None, ratio: float = 1.0) -> list:
+        """
+        The function `evaluate` checks all rules for all tickers.
+
+        :param symbols: The `symbols` parameter is a list of ticker symbols, one per row of `prices`
+        :type symbols: list
+        :param prices: The `prices` parameter is a (symbols x window) array of per-minute prices, column 0
+        is the newest slot, as returned by `PriceStore.matrix`
+        :type prices: np.ndarray
+        :param volumes: The `volumes` parameter is the `(symbols, quote volumes)` matrix of a `PriceStore`
+        of 24h quote volumes, None disables the volume rules
+        :type volumes: tuple
+        :param ratio: The `ratio` parameter scales the thresholds, e.g. 0.7 to find the tickers that are
+        close to a trigger
+        :type ratio: float
+        :return: a list of `Pump` tuples with the `rule` that triggered and its `value`.
+        """
+        count, window = prices.shape
+        if count == 0 or window < 2:
+            return []
+        new_prices = prices[:, 0]
+        values = np.full((count, len(self.rules)), -np.inf)
+        kinds = {rule.kind for rule in self.rules}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if kinds & {'rise', 'drop'}:
+                changes = (new_prices[:, None] / prices[:, 1:] - 1) * 100
+                changes[np.isnan(changes)] = -np.inf
+                rises = changes
+                best_rises = np.maximum.accumulate(rises, axis=1)
+            if 'drop' in kinds:
+                drops = -changes
+                drops[np.isinf(drops)] = -np.inf
+                best_drops = np.maximum.accumulate(drops, axis=1)
+            if 'zscore' in kinds:
+                returns = np.log(prices[:, :-1] / prices[:, 1:])
+                known = ~np.isnan(returns[:, 1:])
+                counts = np.cumsum(known, axis=1)
+                sums = np.cumsum(np.where(known, returns[:, 1:], 0), axis=1)
+                squares = np.cumsum(np.where(known, returns[:, 1:] ** 2, 0), axis=1)
+            quote_volumes = self._align(symbols, volumes) if volumes is not None and self.needs_volume else None
+            for column, rule in enumerate(self.rules):
+                minutes = min(rule.minutes, window - 1)
+                if rule.kind == 'rise':
+                    values[:, column] = best_rises[:, minutes - 1]
+                elif rule.kind == 'drop':
+                    values[:, column] = best_drops[:, minutes - 1]
+                elif rule.kind == 'volume' and quote_volumes is not None and minutes < quote_volumes.shape[1]:
+                    expected = quote_volumes[:, 0] * minutes / MINUTES_PER_DAY
+                    values[:, column] = (quote_volumes[:, 0] - quote_volumes[:, minutes]) / expected
+                elif rule.kind == 'zscore' and window > 2:
+                    last = min(minutes, window - 2) - 1
+                    n = counts[:, last]
+                    mean = sums[:, last] / n
+                    std = np.sqrt(np.maximum((squares[:, last] - n * mean**2) / (n - 1), ZSCORE_MIN_STD**2))
+                    values[:, column] = np.where(n >= 2, np.abs(returns[:, 0]) / std, -np.inf)
+        values = np.nan_to_num(values, nan=-np.inf, posinf=-np.inf)
+        scores = values / self.thresholds
+        passing = scores >= ratio
+        # a rule that fired outranks the near misses of a lowered `ratio`, within a tier one kind outranks
+        # any score of the kinds after it and the scores are ranked within a kind
+        tiers = (scores >= 1) * (len(RULE_KINDS) + 1) * np.pi
+        ranks = np.where(passing, tiers + np.arctan(scores) - self.priorities * np.pi, -np.inf)
+        best = ranks.argmax(axis=1)
+        rows = np.flatnonzero(passing.any(axis=1))
+        pumps = []
+        for row in rows:
+            rule = self.rules[best[row]]
+            minutes = min(rule.minutes, window - 1)
+            if rule.kind == 'rise':
+                index = int(rises[row, :minutes].argmax()) + 1
+            elif rule.kind == 'drop':
+                index = int(drops[row, :minutes].argmax()) + 1
+            elif rule.kind == 'volume':
+                known_ages = np.flatnonzero(~np.isnan(prices[row, 1:minutes + 1]))
+                index = int(known_ages[-1]) + 1 if len(known_ages) else 0
+            else:
+                index = 1
+            old_price = float(prices[row, index])
+            pumps.append(Pump(
+                symbols[row], index, old_price, float(new_prices[row]), (float(new_prices[row]) / old_price - 1) * 100,
+                rule, float(values[row, best[row]])
+            ))
+        return pumps
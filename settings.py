@@ -0,0 +1,232 @@
+from configparser import RawConfigParser, Error as ConfigError
+from rule_engine import RULE_KINDS, parse_rules
+from telegram_delivery import TELEGRAM_API_URL
+from typing import NamedTuple
+from loguru import logger
+
+import asyncio
+import os
+
+
+EXCHANGE_NAMES = ('binance', 'bybit', 'kucoin')
+
+
+class SettingsError(Exception):
+    pass
+
+
+class TelegramSettings(NamedTuple):
+    token: str
+    api_url: str
+    chat_ids: tuple
+    nums_precision: int
+    global_rate: float
+    chat_interval: float
+
+
+class ExchangeSettings(NamedTuple):
+    percent_difference: float
+    window: int
+    rules: tuple
+    scan_seconds: float
+    request_burst: float
+    request_retries: int
+    circuit_failures: int
+    circuit_reset_seconds: float
+    alert_cooldown_minutes: float
+    escalation_percent: float
+    language: str
+
+
+class DemoBotSettings(NamedTuple):
+    token: str
+    chat_id: str
+    sleep_hours: float
+
+
+class ConsolidationSettings(NamedTuple):
+    enabled: bool
+    cooldown_minutes: float
+    arbitrage_percent: float
+    scan_seconds: float
+
+
+class Settings(NamedTuple):
+    """
+    The class `Settings` is the parsed and validated content of 'config.cfg'. The values that are read
+    while the workers run, i.e. thresholds, rules, chat lists and rate settings, are typed fields,
+    `config` keeps the parser for the keys that are only read at startup.
+    """
+    config: RawConfigParser
+    telegram: TelegramSettings
+    exchanges: dict
+    demo_bot: DemoBotSettings
+    consolidation: ConsolidationSettings
+    prefetch_ratio: float
+
+
+def _positive(section: str, key: str, value: float) -> float:
+    if not value > 0:
+        raise SettingsError(f'[{section}] {key} must be positive, got {value}')
+    return value
+
+
+def _check_rules(config: RawConfigParser, exchange_name: str) -> None:
+    for key, value in config[exchange_name].items():
+        if not key.startswith('rule_'):
+            continue
+        parts = value.split()
+        if len(parts) not in (2, 3) or parts[0] not in RULE_KINDS:
+            raise SettingsError(f'[{exchange_name}] {key} must be "<{"|".join(RULE_KINDS)}> <threshold> [minutes]"')
+        _positive(exchange_name, key, float(parts[1]))
+        if len(parts) == 3:
+            _positive(exchange_name, key, int(parts[2]))
+
+
+def parse_settings(config: RawConfigParser) -> Settings:
+    """
+    The function `parse_settings` reads and validates the settings of a parsed config.
+
+    :param config: The `config` parameter is an instance of the `RawConfigParser` class
+    :type config: RawConfigParser
+    :return: a `Settings`, a `SettingsError` is raised for missing or invalid values.
+    """
+    try:
+        telegram = TelegramSettings(
+            config['telegram']['token'], config.get('telegram', 'api_url', fallback=TELEGRAM_API_URL),
+            tuple(config['telegram'][key] for key in config['telegram'] if key.startswith('chat_id')),
+            config.getint('telegram', 'nums_precision'),
+            _positive('telegram', 'global_rate', config.getfloat('telegram', 'global_rate', fallback=30)),
+            config.getfloat('telegram', 'chat_interval', fallback=1)
+        )
+        if telegram.nums_precision < 0:
+            raise SettingsError(f'[telegram] nums_precision must not be negative, got {telegram.nums_precision}')
+        exchanges = {}
+        for name in EXCHANGE_NAMES:
+            if not config.has_section(name):
+                continue
+            window = config.getint(name, 'window', fallback=10)
+            if window < 2:
+                raise SettingsError(f'[{name}] window must be at least 2, got {window}')
+            percent_difference = _positive(name, 'percent_difference', config.getfloat(name, 'percent_difference'))
+            _check_rules(config, name)
+            exchanges[name] = ExchangeSettings(
+                percent_difference, window, tuple(parse_rules(config, name, percent_difference, window)),
+                _positive(name, 'scan_seconds', config.getfloat(name, 'scan_seconds', fallback=20)),
+                _positive(name, 'request_burst', config.getfloat(name, 'request_burst', fallback=10)),
+                config.getint(name, 'request_retries', fallback=3),
+                _positive(name, 'circuit_failures', config.getint(name, 'circuit_failures', fallback=5)),
+                config.getfloat(name, 'circuit_reset_seconds', fallback=30),
+                # without its own setting the store cooldown is the consolidation cooldown, so it
+                # doesn't stack a longer silence on top of it
+                config.getfloat(name, 'alert_cooldown_minutes', fallback=config.getfloat(
+                    'alert_store', 'cooldown_minutes', fallback=config.getfloat('consolidation', 'cooldown_minutes', fallback=5)
+                )),
+                config.getfloat(name, 'escalation_percent',
+                                fallback=config.getfloat('alert_store', 'escalation_percent', fallback=50)),
+                config.get(name, 'language', fallback=config.get('telegram', 'language', fallback=''))
+            )
+        demo_bot = None
+        if config.has_option('demo_bot', 'demo_bot_token'):
+            demo_bot = DemoBotSettings(
+                config['demo_bot']['demo_bot_token'], config['demo_bot']['demo_chat_id'],
+                config.getfloat('demo_bot', 'sleep_hours')
+            )
+        consolidation = ConsolidationSettings(
+            config.getboolean('consolidation', 'enabled', fallback=True),
+            config.getfloat('consolidation', 'cooldown_minutes', fallback=5),
+            config.getfloat('consolidation', 'arbitrage_percent', fallback=0),
+            _positive('consolidation', 'scan_seconds', config.getfloat('consolidation', 'scan_seconds', fallback=20))
+        )
+        prefetch_ratio = config.getfloat('news', 'prefetch_ratio', fallback=0.7)
+    except (KeyError, ValueError, ConfigError) as e:
+        raise SettingsError(f'Invalid config | {e!r}') from e
+    return Settings(config, telegram, exchanges, demo_bot, consolidation, prefetch_ratio)
+
+
+def load_settings(filename: str = 'config.cfg') -> Settings:
+    """
+    The function `load_settings` reads, parses and validates a configuration file.
+
+    :param filename: The `filename` parameter is the path of the configuration file
+    :type filename: str
+    :return: a `Settings`.
+    """
+    config = RawConfigParser()
+    if not config.read(filename):
+        raise SettingsError(f'{filename} not found')
+    return parse_settings(config)
+
+
+class SettingsWatcher:
+    """
+    The class `SettingsWatcher` holds the current `Settings` of the process and reloads them when the
+    configuration file changes. The new settings replace the old ones in one assignment and the
+    subscribers are called right after, without yielding to the event loop, so every scan and alert
+    sees either the old or the new settings as a whole. An invalid file is logged and ignored, the
+    workers keep running with the last valid settings.
+    """
+
+    def __init__(self, filename: str = 'config.cfg', settings: Settings = None) -> None:
+        """
+        :param filename: The `filename` parameter is the path of the configuration file
+        :type filename: str
+        :param settings: The `settings` parameter is the initial `Settings`, loaded from `filename` if
+        not given
+        :type settings: Settings
+        """
+        self.filename = filename
+        self._stamp = self._stat()
+        self.current = settings if settings is not None else load_settings(filename)
+        self._subscribers: list = []
+
+    def _stat(self) -> tuple:
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def subscribe(self, callback) -> None:
+        """
+        The function `subscribe` registers a function that is called with the old and the new `Settings`
+        after every reload.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def reload(self) -> bool:
+        """
+        The function `reload` loads the configuration file if it changed since the last load.
+
+        :return: True if new settings were applied.
+        """
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            settings = load_settings(self.filename)
+        except SettingsError as e:
+            logger.error(f'{self.filename} not reloaded | {e}')
+            return False
+        old, self.current = self.current, settings
+        for callback in list(self._subscribers):
+            try:
+                callback(old, settings)
+            except Exception as e:
+                logger.error(f'{self.filename} | {e}')
+        logger.info(f'{self.filename} reloaded')
+        return True
+
+    async def run(self, interval: float = 5) -> None:
+        """
+        The function `run` checks the modification time of the configuration file every `interval`
+        seconds until it is cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.reload()
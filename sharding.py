@@ -0,0 +1,797 @@
+from base_worker import course_watcher, create_exchange, create_transport, create_history, create_alert_store, reload_engine
+from alert_pipeline import AlertPipeline, kind_of, move_of
+from alert_bus import Alert, AlertBus
+from alert_store import AlertStore
+from consolidator import Consolidator, CoinMove, coin_of, format_gap
+from fake_exchange import FakeExchange
+from message_templates import AlertData
+from market_index import MarketIndex, parse_patterns, DEFAULT_EXCLUDE
+from metrics import stage_metrics, serve_metrics
+from news_service import NewsService
+from ohlcv_cache import OhlcvCache
+from chart_renderer import get_renderer
+from price_store import PriceStore
+from request_scheduler import RequestScheduler, PRIORITY_TICKERS, PRIORITY_ENRICHMENT, PRIORITY_BACKGROUND
+from rule_engine import RuleEngine
+from settings import Settings, SettingsWatcher
+from telegram_delivery import TelegramDelivery
+from utils import send_alert_message, send_service_message
+from worker_context import WorkerContext
+from multiprocessing.shared_memory import SharedMemory
+from loguru import logger
+
+import multiprocessing
+import numpy as np
+import argparse
+import asyncio
+import aiohttp
+import hashlib
+import bisect
+import queue
+import time
+import zlib
+import os
+
+
+SEQUENCE, TICKS, ROWS, SYMBOLS_SIZE, SYMBOLS_CAPACITY, WINDOW, CAPACITY = range(7)
+HEADER_SIZE = 8 * 8
+# a reader spins with yields for the first attempts and sleeps 1 ms after them, about 1 s in total
+READ_SPINS, READ_ATTEMPTS = 100, 1000
+
+
+def stable_hash(key: str) -> int:
+    """
+    The function `stable_hash` hashes a string to 64 bits, the same in every process, unlike `hash`.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    The class `HashRing` assigns coins to shards by consistent hashing. Every shard owns `replicas`
+    points on a ring of 64 bit hashes and a coin belongs to the shard of the first point after its hash.
+    All symbols of a coin, on every exchange, belong to the same shard, so the cross-exchange
+    consolidation of a coin happens in one process, and changing the number of shards moves only the
+    coins of the added or removed shards.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64) -> None:
+        """
+        :param shards: The `shards` parameter is the number of shards
+        :type shards: int
+        :param replicas: The `replicas` parameter is the number of points of every shard, more points
+        spread the coins more evenly
+        :type replicas: int
+        """
+        self.shards = shards
+        points = sorted((stable_hash(f'{shard}:{replica}'), shard) for shard in range(shards) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_of(self, symbol: str) -> int:
+        """
+        The function `shard_of` returns the shard of the coin of a symbol, e.g. 'BTC/USDT:USDT'.
+        """
+        return self._shards[bisect.bisect(self._hashes, stable_hash(coin_of(symbol))) % len(self._hashes)]
+
+
+class SharedPriceStore(PriceStore):
+    """
+    The class `SharedPriceStore` is a `PriceStore` that mirrors its prices into a shared memory block
+    for the shard processes. The block holds a header, the symbols as newline separated text and a
+    (capacity x window) matrix ordered from the newest slot. A write makes a sequence counter odd and
+    even again, a reader retries if the counter was odd or changed during its copy, so no lock is
+    shared between processes. A new minute slot is published at once, updates of the current slot by
+    streams every `run` interval. Symbols beyond `capacity` are not published.
+    """
+
+    def __init__(self, window: int = 10, capacity: int = 4096, symbol_size: int = 32) -> None:
+        """
+        :param window: The `window` parameter is the number of per-minute prices kept for each ticker
+        :type window: int
+        :param capacity: The `capacity` parameter is the maximal number of published tickers
+        :type capacity: int
+        :param symbol_size: The `symbol_size` parameter is the space reserved for one symbol in bytes
+        :type symbol_size: int
+        """
+        super().__init__(window)
+        self.capacity = capacity
+        self.ticks = 0
+        self._symbols_capacity = capacity * symbol_size
+        self.shm = SharedMemory(create=True, size=HEADER_SIZE + self._symbols_capacity + capacity * window * 8)
+        self.name = self.shm.name
+        self._header = np.ndarray(8, np.int64, self.shm.buf)
+        self._header[:] = 0
+        self._header[SYMBOLS_CAPACITY] = self._symbols_capacity
+        self._header[WINDOW] = window
+        self._header[CAPACITY] = capacity
+        self._prices = np.ndarray((capacity, window), np.float64, self.shm.buf, HEADER_SIZE + self._symbols_capacity)
+        self._published = 0
+        self._dirty = False
+
+    def push(self, prices: dict) -> None:
+        super().push(prices)
+        self.ticks += 1
+        self.publish()
+
+    def advance(self) -> None:
+        super().advance()
+        self.ticks += 1
+        self.publish()
+
+    def update(self, prices: dict) -> None:
+        if self._head < 0:
+            self.ticks += 1
+        super().update(prices)
+        self._dirty = True
+
+    def clear(self, symbol: str) -> None:
+        super().clear(symbol)
+        self._dirty = True
+
+    def publish(self) -> None:
+        """
+        The function `publish` copies the store into the shared memory block.
+        """
+        symbols, prices = self.matrix()
+        rows = min(len(symbols), self.capacity)
+        text = None
+        if rows != self._published:
+            # the rows of a PriceStore are never reordered, only the new symbols are appended
+            text = '\n'.join(symbols[:rows]).encode()
+            if len(text) > self._symbols_capacity:
+                text = text[:text.rfind(b'\n', 0, self._symbols_capacity + 1)]
+                rows = text.count(b'\n') + 1 if text else 0
+            if rows < len(symbols):
+                logger.error(f'{len(symbols) - rows} symbols exceed the capacity of the shared store')
+        header = self._header
+        header[SEQUENCE] += 1
+        try:
+            if text is not None:
+                self.shm.buf[HEADER_SIZE:HEADER_SIZE + len(text)] = text
+                header[SYMBOLS_SIZE] = len(text)
+                self._published = rows
+            self._prices[:rows] = prices[:rows]
+            header[ROWS] = rows
+            header[TICKS] = self.ticks
+        finally:
+            header[SEQUENCE] += 1
+        self._dirty = False
+
+    async def run(self, interval: float = 1) -> None:
+        """
+        The function `run` publishes the updates of the current slot every `interval` seconds until it is
+        cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self._dirty:
+                self.publish()
+
+    def close(self) -> None:
+        """
+        The function `close` frees the shared memory block.
+        """
+        del self._header, self._prices
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedPriceView:
+    """
+    The class `SharedPriceView` reads the symbols of one shard from the block of a `SharedPriceStore`.
+    It has the `window`, `matrix` and `clear` of a `PriceStore`, so the rule engine, the consolidator
+    and the alert pipeline use it as the store of the shard. The view can't write into the block, so
+    `clear` masks the slots of the ticker up to the current one instead, which hides them from the
+    detection in the same way.
+    """
+
+    def __init__(self, name: str, owns) -> None:
+        """
+        :param name: The `name` parameter is the name of the shared memory block
+        :type name: str
+        :param owns: The `owns` parameter is a function that tells if a symbol belongs to the shard
+        """
+        self.shm = SharedMemory(name=name)
+        self._header = np.ndarray(8, np.int64, self.shm.buf)
+        self.window = int(self._header[WINDOW])
+        self._symbols_capacity = int(self._header[SYMBOLS_CAPACITY])
+        self._prices = np.ndarray(
+            (int(self._header[CAPACITY]), self.window), np.float64, self.shm.buf, HEADER_SIZE + self._symbols_capacity
+        )
+        self.owns = owns
+        self._rows = 0
+        self._selected = np.zeros(0, dtype=np.intp)
+        self._symbols: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._cleared: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def _read(self) -> tuple:
+        header = self._header
+        for attempt in range(READ_ATTEMPTS):
+            if attempt:
+                time.sleep(0 if attempt < READ_SPINS else 0.001)
+            sequence = int(header[SEQUENCE])
+            if sequence % 2:
+                continue
+            rows, ticks = int(header[ROWS]), int(header[TICKS])
+            selected, symbols = self._selected, self._symbols
+            if rows != self._rows:
+                text = bytes(self.shm.buf[HEADER_SIZE:HEADER_SIZE + int(header[SYMBOLS_SIZE])])
+                published = text.decode(errors='replace').split('\n') if text else []
+                if len(published) != rows:
+                    continue
+                added = [row for row in range(self._rows, rows) if self.owns(published[row])]
+                selected = np.concatenate((selected, np.array(added, dtype=np.intp)))
+                symbols = symbols + [published[row] for row in added]
+            prices = self._prices[selected]
+            if int(header[SEQUENCE]) != sequence:
+                continue
+            if rows != self._rows:
+                self._positions.update((symbol, position) for position, symbol in enumerate(symbols) if position >= len(self._symbols))
+                self._rows, self._selected, self._symbols = rows, selected, symbols
+            return ticks, prices
+        stage_metrics.inc('torn_reads', block=self.shm.name)
+        raise RuntimeError(f'{self.shm.name} | no consistent read in {READ_ATTEMPTS} attempts, is the coordinator alive?')
+
+    def matrix(self) -> tuple:
+        """
+        The function `matrix` returns a consistent copy of the prices of the shard.
+
+        :return: a tuple `(symbols, prices)` where `prices` is a (symbols x window) NumPy array whose
+        column 0 is the newest slot.
+        """
+        ticks, prices = self._read()
+        for position, cleared_at in list(self._cleared.items()):
+            age = ticks - cleared_at
+            if age >= self.window:
+                del self._cleared[position]
+            else:
+                prices[position, age:] = np.nan
+        return list(self._symbols), prices
+
+    def clear(self, symbol: str) -> None:
+        position = self._positions.get(symbol)
+        if position is not None:
+            self._cleared[position] = int(self._header[TICKS])
+
+    def close(self) -> None:
+        del self._header, self._prices
+        self.shm.close()
+
+
+def post(outbox, message: tuple, exchange_name: str) -> bool:
+    """
+    The function `post` puts a message into the `outbox` of the coordinator without blocking the event
+    loop of the shard. A message that doesn't fit into the full outbox is dropped and counted.
+
+    :return: True if the message was queued.
+    """
+    try:
+        outbox.put_nowait(message)
+    except queue.Full:
+        logger.warning(f'{exchange_name} | outbox full, {message[0]} dropped')
+        stage_metrics.inc('outbox_drops', exchange=exchange_name, kind=message[0])
+        return False
+    return True
+
+
+class ShardPipeline(AlertPipeline):
+    """
+    The class `ShardPipeline` is the `AlertPipeline` of a shard. The enriched alerts aren't sent by the
+    shard, they are put into the `outbox` queue of the coordinator, which deduplicates, sends and stores
+    them. The shard only starts the cooldown of the symbol in its `AlertStore` index.
+    """
+
+    def __init__(self, *args, outbox, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.outbox = outbox
+
+    async def deliver(self, data: AlertData, msg: str, graph: bytes) -> None:
+        alert = Alert(msg, graph, data.time, self.exchange_name, data.ticker, data.to_json())
+        if not post(self.outbox, ('alert', data.kind, alert), self.exchange_name):
+            raise RuntimeError('outbox full, alert dropped')
+
+    def _record(self, pump, status: str) -> None:
+        if status == 'sent' and self.context.alert_store is not None:
+            self.context.alert_store.mark(self.exchange_name, pump.ticker, kind_of(pump), move_of(pump))
+            return
+        super()._record(pump, status)
+
+
+class AlertDeduplicator:
+    """
+    The class `AlertDeduplicator` drops an alert whose key was accepted within the last `cooldown`
+    seconds.
+    """
+
+    def __init__(self, cooldown: float) -> None:
+        self.cooldown = cooldown
+        self._accepted: dict[tuple, float] = {}
+
+    def accept(self, key: tuple) -> bool:
+        now = time.monotonic()
+        if now - self._accepted.get(key, float('-inf')) < self.cooldown:
+            return False
+        self._accepted[key] = now
+        return True
+
+
+def fake_exchange(exchange_name: str, fake: dict) -> FakeExchange:
+    # the same market in the coordinator and the shards of one run
+    return FakeExchange(exchange_name, seed=zlib.crc32(exchange_name.encode()), **fake)
+
+
+async def shard_exchange(exchange_name: str, context: WorkerContext, store: SharedPriceView,
+                         volume_store: SharedPriceView, outbox, shards: int, fake: dict = None) -> None:
+    """
+    The function `shard_exchange` detects and enriches the alerts of the coins of one shard on one
+    exchange. The request budget of the exchange is split between the shards.
+
+    :param exchange_name: The `exchange_name` parameter is the name of the exchange
+    :type exchange_name: str
+    :param context: The `context` parameter holds the services of the shard process
+    :type context: WorkerContext
+    :param store: The `store` parameter is the `SharedPriceView` of the prices
+    :type store: SharedPriceView
+    :param volume_store: The `volume_store` parameter is the `SharedPriceView` of the volumes, None
+    without volume rules
+    :type volume_store: SharedPriceView
+    :param outbox: The `outbox` parameter is the queue of the coordinator
+    :param shards: The `shards` parameter is the number of shards
+    :type shards: int
+    :param fake: The `fake` parameter is the keyword arguments of the `FakeExchange`, None for the real
+    exchange
+    :type fake: dict
+    """
+    config = context.settings.current.config
+    exchange_settings = context.settings.current.exchanges[exchange_name]
+    exchange = fake_exchange(exchange_name, fake) if fake is not None else create_exchange(exchange_name, context.session)
+    scheduler = RequestScheduler(
+        exchange_name, exchange.rateLimit * shards, max(1.0, exchange_settings.request_burst / shards),
+        exchange_settings.request_retries, exchange_settings.circuit_failures, exchange_settings.circuit_reset_seconds
+    )
+    engine = RuleEngine(exchange_settings.rules)
+    scan_seconds = exchange_settings.scan_seconds
+    pipeline = ShardPipeline(
+        scheduler.bind(exchange, PRIORITY_ENRICHMENT), exchange_name, context, store,
+        config.getint(exchange_name, 'alert_workers', fallback=4), outbox=outbox
+    )
+
+    def apply(old: Settings, new: Settings) -> None:
+        nonlocal engine, scan_seconds
+        current = new.exchanges.get(exchange_name)
+        if current is None or current == old.exchanges.get(exchange_name):
+            return
+        scan_seconds = current.scan_seconds
+        scheduler.burst = max(1.0, current.request_burst / shards)
+        scheduler.retries = current.request_retries
+        scheduler.failure_threshold = current.circuit_failures
+        scheduler.reset_timeout = current.circuit_reset_seconds
+        engine = reload_engine(exchange_name, engine, current, store, volume_store)
+        if exchange_name in getattr(context.consolidator, 'venues', {}):
+            context.consolidator.register(exchange_name, store, pipeline, engine, volume_store)
+
+    context.settings.subscribe(apply)
+    task = asyncio.create_task(pipeline.run())
+    try:
+        if context.consolidator is not None:
+            context.consolidator.register(exchange_name, store, pipeline, engine, volume_store)
+            await task
+        while True:
+            with stage_metrics.timer('detection', exchange=exchange_name):
+                volumes = volume_store.matrix() if volume_store is not None else None
+                pumps = engine.evaluate(*store.matrix(), volumes, context.settings.current.prefetch_ratio)
+            context.news_service.prefetch([pump.ticker.split('/')[0] for pump in pumps])
+            for pump in pumps:
+                if engine.confirmed(pump):
+                    pipeline.submit(pump)
+            await asyncio.sleep(scan_seconds)
+    finally:
+        context.settings.unsubscribe(apply)
+        if context.consolidator is not None:
+            context.consolidator.unregister(exchange_name)
+        task.cancel()
+        scheduler.close()
+        await exchange.close()
+
+
+async def shard_worker(shard: int, shards: int, layout: dict, outbox, fake: dict = None) -> None:
+    """
+    The function `shard_worker` runs one shard: the detection and the enrichment of the coins that the
+    `HashRing` assigns to `shard`, on all exchanges of the coordinator. The prices are read from the
+    shared memory blocks of the coordinator, the alerts are put into its `outbox`.
+
+    :param shard: The `shard` parameter is the number of the shard, from 0 to `shards` - 1
+    :type shard: int
+    :param shards: The `shards` parameter is the number of shards
+    :type shards: int
+    :param layout: The `layout` parameter maps the exchange names to the names of the shared memory
+    blocks of their prices and volumes
+    :type layout: dict
+    :param outbox: The `outbox` parameter is the queue of the coordinator
+    :param fake: The `fake` parameter is the keyword arguments of the `FakeExchange`, None for the real
+    exchanges
+    :type fake: dict
+    """
+    settings = SettingsWatcher()
+    config = settings.current.config
+    ring = HashRing(shards, config.getint('sharding', 'replicas', fallback=64))
+
+    def owns(symbol: str) -> bool:
+        return ring.shard_of(symbol) == shard
+
+    ohlcv_cache = OhlcvCache(
+        config.getint('cache', 'ohlcv_entries', fallback=128), config.getfloat('cache', 'ohlcv_ttl', fallback=3600)
+    )
+    renderer = get_renderer(config.get('chart', 'renderer', fallback='pillow'))
+    await asyncio.to_thread(renderer.warm_up)
+    views = []
+    async with aiohttp.ClientSession() as session:
+        news_service = NewsService(
+            session, config['news']['cryptopanic_token'],
+            config.getfloat('news', 'ttl_minutes', fallback=10) * 60, config.getfloat('news', 'timeout', fallback=5)
+        )
+        consolidator = None
+        coroutines = [settings.run(config.getfloat('settings', 'reload_seconds', fallback=5))]
+        consolidation = settings.current.consolidation
+        if consolidation.enabled:
+            # a shard sees the prices of its coins on every exchange, so it finds their arbitrage gaps,
+            # the coordinator sends them
+            consolidator = Consolidator(
+                consolidation.cooldown_minutes * 60, consolidation.arbitrage_percent, consolidation.scan_seconds,
+                settings.current.prefetch_ratio
+            )
+
+            async def on_gap(gap: CoinMove) -> None:
+                post(outbox, ('gap', None, gap), gap.cheapest)
+
+            coroutines.append(consolidator.run(news_service, on_gap))
+
+            def apply(old: Settings, new: Settings) -> None:
+                consolidator.cooldown = new.consolidation.cooldown_minutes * 60
+                consolidator.arbitrage_percent = new.consolidation.arbitrage_percent
+                consolidator.scan_seconds = new.consolidation.scan_seconds
+                consolidator.prefetch_ratio = new.prefetch_ratio
+
+            settings.subscribe(apply)
+        # a coin is owned by one shard, so the cooldown index of a shard covers all alerts of its coins,
+        # the sent alerts are stored by the coordinator
+        alert_store = create_alert_store(config)
+        context = WorkerContext(session, ohlcv_cache, news_service, renderer, None, consolidator, None, settings, alert_store)
+        for exchange_name, (prices_name, volumes_name) in layout.items():
+            store = SharedPriceView(prices_name, owns)
+            volume_store = SharedPriceView(volumes_name, owns) if volumes_name is not None else None
+            views += [view for view in (store, volume_store) if view is not None]
+            coroutines.append(shard_exchange(exchange_name, context, store, volume_store, outbox, shards, fake))
+        runner = None
+        if config.getboolean('metrics', 'enabled', fallback=True):
+            port = config.getint('metrics', 'port', fallback=9108) + 1 + shard
+            try:
+                runner = await serve_metrics(config.get('metrics', 'host', fallback='127.0.0.1'), port)
+            except OSError as e:
+                logger.error(f'Shard {shard} metrics server | {e}')
+        logger.info(f'Shard {shard}/{shards} started')
+        try:
+            await asyncio.gather(*coroutines)
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+            if alert_store is not None:
+                alert_store.close()
+            for view in views:
+                view.close()
+
+
+def shard_main(shard: int, shards: int, layout: dict, outbox, fake: dict = None) -> None:
+    """
+    The function `shard_main` is the entry point of a shard process.
+    """
+    try:
+        asyncio.run(shard_worker(shard, shards, layout, outbox, fake))
+    except KeyboardInterrupt:
+        pass
+
+
+async def ingest(config, exchange_name: str, settings: SettingsWatcher, session: aiohttp.ClientSession,
+                 store: SharedPriceStore, volume_store: SharedPriceStore, delivery: TelegramDelivery,
+                 fake: dict = None, interval: float = 60) -> None:
+    """
+    The function `ingest` polls or streams the prices of one exchange into its shared stores.
+
+    :param config: The `config` parameter is an instance of the `RawConfigParser` class
+    :param exchange_name: The `exchange_name` parameter is the name of the exchange
+    :type exchange_name: str
+    :param settings: The `settings` parameter is the `SettingsWatcher` of the coordinator
+    :type settings: SettingsWatcher
+    :param session: The `session` parameter is the shared HTTP session
+    :type session: aiohttp.ClientSession
+    :param store: The `store` parameter is the `SharedPriceStore` of the prices
+    :type store: SharedPriceStore
+    :param volume_store: The `volume_store` parameter is the `SharedPriceStore` of the volumes, None
+    without volume rules
+    :type volume_store: SharedPriceStore
+    :param delivery: The `delivery` parameter is the `TelegramDelivery`, None with a fake exchange
+    :type delivery: TelegramDelivery
+    :param fake: The `fake` parameter is the keyword arguments of the `FakeExchange`, None for the real
+    exchange
+    :type fake: dict
+    :param interval: The `interval` parameter is the polling interval in seconds
+    :type interval: float
+    """
+    exchange_settings = settings.current.exchanges[exchange_name]
+    exchange = fake_exchange(exchange_name, fake) if fake is not None else create_exchange(exchange_name, session)
+    scheduler = RequestScheduler(
+        exchange_name, exchange.rateLimit, exchange_settings.request_burst, exchange_settings.request_retries,
+        exchange_settings.circuit_failures, exchange_settings.circuit_reset_seconds
+    )
+    index = MarketIndex(
+        scheduler.bind(exchange, PRIORITY_BACKGROUND), 'USDT', parse_patterns(config.get(exchange_name, 'include', fallback='')),
+        parse_patterns(config.get(exchange_name, 'exclude', fallback=DEFAULT_EXCLUDE))
+    )
+    transport = create_transport(config, exchange_name, exchange, session) if fake is None else None
+    history = create_history(config, exchange_name)
+    tasks = []
+    try:
+        await index.refresh()
+        tasks.append(asyncio.create_task(index.run(config.getfloat(exchange_name, 'markets_refresh_minutes', fallback=60))))
+        tasks.append(asyncio.create_task(store.run()))
+        if history is not None:
+            tasks.append(asyncio.create_task(history.run()))
+        if delivery is not None:
+            await send_service_message(
+                delivery, settings.current.telegram.chat_ids, f'{exchange_name.capitalize()} watcher started', exchange_name
+            )
+        await course_watcher(
+            scheduler.bind(exchange, PRIORITY_TICKERS), exchange_name, settings.current.telegram.nums_precision, store, index,
+            config.getint(exchange_name, 'snapshot_minutes', fallback=0), transport, history, volume_store, interval
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+        scheduler.close()
+        if history is not None:
+            history.close()
+        await exchange.close()
+
+
+async def ingest_worker(config, exchange_name: str, settings: SettingsWatcher, session: aiohttp.ClientSession,
+                        store: SharedPriceStore, volume_store: SharedPriceStore, delivery: TelegramDelivery,
+                        fake: dict = None, interval: float = 60) -> None:
+    """
+    The function `ingest_worker` runs `ingest` and restarts it after errors, as `exchange_worker` does
+    with the `sender`.
+    """
+    while True:
+        try:
+            await ingest(config, exchange_name, settings, session, store, volume_store, delivery, fake, interval)
+        except Exception as e:
+            logger.error(f'{exchange_name} | {e}')
+            await asyncio.sleep(10)
+
+
+async def send_gap(gap: CoinMove, current: Settings, delivery: TelegramDelivery) -> None:
+    """
+    The function `send_gap` sends an arbitrage gap that a shard reported, it is only logged with a fake
+    exchange.
+    """
+    if delivery is None:
+        logger.info(f'Arbitrage gap {gap.coin} {gap.spread:.2f}% dispatched')
+        return
+    try:
+        await send_service_message(delivery, current.telegram.chat_ids, format_gap(gap), gap.cheapest)
+    except Exception as e:
+        logger.error(f'Arbitrage gap {gap.coin} | {e}')
+
+
+async def dispatch_alerts(outbox, settings: SettingsWatcher, delivery: TelegramDelivery, bus: AlertBus,
+                          alert_store: AlertStore = None) -> None:
+    """
+    The function `dispatch_alerts` takes the alerts and the arbitrage gaps of the shards from the
+    `outbox`, drops the repeated alerts and sends the others. With the consolidation a coin is alerted once per kind of rule within the
+    cooldown whatever its exchange, without it once per exchange, so a shard that took over the coins of
+    a restarted shard doesn't repeat their alerts. The alerts are stored after they were sent.
+
+    :param outbox: The `outbox` parameter is the queue of the shards
+    :param settings: The `settings` parameter is the `SettingsWatcher` of the coordinator
+    :type settings: SettingsWatcher
+    :param delivery: The `delivery` parameter is the `TelegramDelivery`, None with a fake exchange, the
+    alerts are only logged then
+    :type delivery: TelegramDelivery
+    :param bus: The `bus` parameter is the `AlertBus` of the coordinator
+    :type bus: AlertBus
+    :param alert_store: The `alert_store` parameter is the `AlertStore` of the coordinator, None if
+    disabled
+    :type alert_store: AlertStore
+    """
+
+    def store(alert: Alert, kind: str, status: str) -> None:
+        if alert_store is None or alert.record is None:
+            return
+        record = alert.record
+        percent = (record['new_price'] / record['old_price'] - 1) * 100
+        try:
+            alert_store.record(
+                alert.exchange, alert.ticker, kind, record['value'] or abs(percent), percent, record['new_price'], status
+            )
+        except Exception as e:
+            logger.error(f'{alert.exchange} | {alert.ticker} | Alert store | {e}')
+
+    deduplicator = AlertDeduplicator(settings.current.consolidation.cooldown_minutes * 60)
+    while True:
+        try:
+            message, kind, alert = await asyncio.to_thread(outbox.get, True, 1)
+        except queue.Empty:
+            continue
+        current = settings.current
+        if message == 'gap':
+            await send_gap(alert, current, delivery)
+            continue
+        deduplicator.cooldown = current.consolidation.cooldown_minutes * 60
+        coin = coin_of(alert.ticker)
+        if not deduplicator.accept((coin, kind) if current.consolidation.enabled else (alert.exchange, coin, kind)):
+            stage_metrics.inc('duplicate_alerts', exchange=alert.exchange)
+            continue
+        try:
+            if delivery is not None:
+                with stage_metrics.timer('send', exchange=alert.exchange):
+                    await send_alert_message(delivery, current.telegram.chat_ids, alert.msg, alert.image, alert.record)
+            bus.publish(alert)
+            stage_metrics.inc('alerts', exchange=alert.exchange, rule=kind)
+            logger.info(f'{alert.exchange} | {alert.ticker} {kind} alert dispatched')
+        except Exception as e:
+            logger.error(f'{alert.exchange} | {alert.ticker} | {e}')
+            stage_metrics.inc('alert_errors', exchange=alert.exchange)
+            store(alert, kind, 'failed')
+        else:
+            store(alert, kind, 'sent')
+
+
+async def supervise(processes: list, start) -> None:
+    """
+    The function `supervise` restarts the shard processes that exited.
+    """
+    while True:
+        await asyncio.sleep(5)
+        for shard, process in enumerate(processes):
+            if not process.is_alive():
+                logger.error(f'Shard {shard} exited with code {process.exitcode}, restarting')
+                stage_metrics.inc('shard_restarts', shard=shard)
+                processes[shard] = start(shard)
+
+
+async def run_sharded(exchange_names: list, shards: int, fake: dict = None, interval: float = 60) -> None:
+    """
+    The function `run_sharded` runs the coordinator of the sharding mode. The coordinator polls or
+    streams the prices of every exchange into a `SharedPriceStore`, `shards` processes run the
+    detection and the enrichment of the coins that the `HashRing` assigns to them, and the coordinator
+    deduplicates and sends their alerts. The shards serve their metrics on the ports following
+    `[metrics] port` and are restarted when they exit.
+
+    :param exchange_names: The `exchange_names` parameter is a list of exchange names, e.g.
+    ['binance', 'bybit', 'kucoin']
+    :type exchange_names: list
+    :param shards: The `shards` parameter is the number of shard processes
+    :type shards: int
+    :param fake: The `fake` parameter is the keyword arguments of a `FakeExchange` that replaces every
+    exchange, e.g. {'symbols': 2000}, None for the real exchanges. Alerts are logged and not sent then
+    :type fake: dict
+    :param interval: The `interval` parameter is the polling interval in seconds, shorter only with a
+    fake exchange
+    :type interval: float
+    """
+    settings = SettingsWatcher()
+    config = settings.current.config
+    capacity = config.getint('sharding', 'capacity', fallback=4096)
+    stores = []
+    layout = {}
+    processes = []
+    context = multiprocessing.get_context('spawn')
+    outbox = context.Queue(config.getint('sharding', 'outbox_size', fallback=1000))
+    try:
+        for exchange_name in exchange_names:
+            exchange_settings = settings.current.exchanges[exchange_name]
+            engine = RuleEngine(exchange_settings.rules)
+            window = max(exchange_settings.window, engine.window)
+            store = SharedPriceStore(window, capacity)
+            volume_store = SharedPriceStore(window, capacity) if engine.needs_volume else None
+            stores += [shared for shared in (store, volume_store) if shared is not None]
+            layout[exchange_name] = (store, volume_store)
+
+        names = {
+            exchange_name: (store.name, volume_store.name if volume_store is not None else None)
+            for exchange_name, (store, volume_store) in layout.items()
+        }
+
+        def start(shard: int) -> multiprocessing.Process:
+            process = context.Process(
+                target=shard_main, args=(shard, shards, names, outbox, fake), name=f'shard-{shard}', daemon=True
+            )
+            process.start()
+            return process
+
+        processes += [start(shard) for shard in range(shards)]
+        async with aiohttp.ClientSession() as session:
+            delivery = None
+            if fake is None:
+                telegram = settings.current.telegram
+                delivery = TelegramDelivery(session, telegram.token, telegram.api_url, telegram.global_rate, telegram.chat_interval)
+
+                def apply(old: Settings, new: Settings) -> None:
+                    delivery.global_interval = 1 / new.telegram.global_rate
+                    delivery.chat_interval = new.telegram.chat_interval
+
+                settings.subscribe(apply)
+            bus = AlertBus()
+            alert_store = create_alert_store(config)
+            server = None
+            if config.getboolean('alert_bus', 'enabled', fallback=True):
+                try:
+                    server = await bus.serve(os.path.join('temp', 'alerts.sock'))
+                except OSError as e:
+                    logger.error(f'Alert bus | {e}')
+            coroutines = [
+                settings.run(config.getfloat('settings', 'reload_seconds', fallback=5)),
+                dispatch_alerts(outbox, settings, delivery, bus, alert_store), supervise(processes, start)
+            ]
+            for exchange_name, (store, volume_store) in layout.items():
+                coroutines.append(ingest_worker(config, exchange_name, settings, session, store, volume_store, delivery, fake, interval))
+            runner = None
+            if config.getboolean('metrics', 'enabled', fallback=True):
+                try:
+                    runner = await serve_metrics(
+                        config.get('metrics', 'host', fallback='127.0.0.1'), config.getint('metrics', 'port', fallback=9108)
+                    )
+                except OSError as e:
+                    logger.error(f'Metrics server | {e}')
+            try:
+                await asyncio.gather(*coroutines)
+            finally:
+                if runner is not None:
+                    await runner.cleanup()
+                if alert_store is not None:
+                    alert_store.close()
+                if server is not None:
+                    server.close()
+                    os.remove(os.path.join('temp', 'alerts.sock'))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(5)
+        outbox.close()
+        outbox.cancel_join_thread()
+        for store in stores:
+            store.close()
+
+
+def sharded_worker(exchange_names: list, shards: int, fake: dict = None, interval: float = 60) -> None:
+    """
+    The function `sharded_worker` creates the temporary directory and runs the coordinator.
+    """
+    if not os.path.exists('temp'):
+        os.mkdir('temp')
+    asyncio.run(run_sharded(exchange_names, shards, fake, interval))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Runs the exchanges with the symbols split across shard processes.')
+    parser.add_argument('exchanges', nargs='*', default=['binance', 'bybit', 'kucoin'])
+    parser.add_argument('--shards', type=int, default=os.cpu_count())
+    parser.add_argument('--fake', type=int, default=0, metavar='SYMBOLS',
+                        help='replace the exchanges by fake exchanges with SYMBOLS markets, alerts are only logged')
+    parser.add_argument('--pump-probability', type=float, default=0.0005)
+    parser.add_argument('--interval', type=float, default=60, help='polling interval in seconds')
+    args = parser.parse_args()
+    fake = {'symbols': args.fake, 'pump_probability': args.pump_probability} if args.fake else None
+    try:
+        sharded_worker(args.exchanges, args.shards, fake, args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,13 @@
 from aiogram import Bot, Dispatcher, executor, types
-from configparser import RawConfigParser
 
-import subprocess
+import asyncio
 import logging
+import aiohttp
+import sqlite3
+import time
+import os
 from utils import get_config
+from alert_store import AlertStore
 
 
 config = get_config()
@@ -12,62 +16,284 @@ BYBIT_WATCHER_SERVICE_NAME = config['bybit']['service_name']
 KUCOIN_WATCHER_SERVICE_NAME = config['kucoin']['service_name']
 BINANCE_WATCHER_SERVICE_NAME = config['binance']['service_name']
 DEMO_BOT_SERVICE_NAME = config['demo_bot']['service_name']
+WATCHER_SERVICES = {
+    'Binance': BINANCE_WATCHER_SERVICE_NAME,
+    'Bybit': BYBIT_WATCHER_SERVICE_NAME,
+    'Kucoin': KUCOIN_WATCHER_SERVICE_NAME,
+}
+
+METRICS_HOST = config.get('metrics', 'host', fallback='127.0.0.1')
+METRICS_PORT = config.getint('metrics', 'port', fallback=9108)
+SHARDS = config.getint('sharding', 'shards', fallback=1)
+METRICS_PORTS = sorted(
+    {METRICS_PORT}
+    | {config.getint(name, 'metrics_port') for name in ('binance', 'bybit', 'kucoin') if config.has_option(name, 'metrics_port')}
+    # the shards of the sharding mode serve on the ports following [metrics] port
+    | {METRICS_PORT + 1 + shard for shard in range(SHARDS if SHARDS > 1 else 0)}
+)
+CACHE_SECONDS = config.getfloat('status_bot', 'cache_seconds', fallback=5)
+COMMAND_TIMEOUT = config.getfloat('status_bot', 'command_timeout', fallback=10)
+ALERTS_DATABASE = config.get('alert_store', 'filename', fallback=os.path.join('temp', 'alerts.db'))
+ALERTS_LIMIT = config.getint('status_bot', 'alerts_limit', fallback=10)
 
 logging.basicConfig(level=logging.INFO)
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher(bot)
 
 
+class Cached:
+    """
+    The class `Cached` keeps the result of a coroutine function for `ttl` seconds. Callers that arrive
+    while the value is being computed await the same task, so a burst of `/status` commands runs the
+    checks once.
+    """
+
+    def __init__(self, function, ttl: float) -> None:
+        self.function = function
+        self.ttl = ttl
+        self._task = None
+        self._expires = 0.0
+
+    async def __call__(self):
+        if self._task is None or (self._task.done() and time.monotonic() >= self._expires):
+            self._task = asyncio.ensure_future(self._run())
+        return await asyncio.shield(self._task)
+
+    async def _run(self):
+        try:
+            return await self.function()
+        finally:
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        if self._task is not None and self._task.done():
+            self._task = None
+
+
+async def systemctl(*args: str, sudo: bool = False) -> tuple:
+    """
+    The function `systemctl` runs `systemctl` without blocking the event loop.
+
+    :param args: The `args` parameter is the arguments of `systemctl`, e.g. ('is-active', 'name')
+    :type args: str
+    :param sudo: The `sudo` parameter runs the command with `sudo`
+    :type sudo: bool
+    :return: a tuple of the return code and the stripped output, (-1, 'unknown') if the command failed
+    or timed out.
+    """
+    command = ('sudo', 'systemctl', *args) if sudo else ('systemctl', *args)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError as e:
+        logging.warning(f'{" ".join(command)} | {e}')
+        return -1, 'unknown'
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), COMMAND_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logging.warning(f'{" ".join(command)} | timed out')
+        return -1, 'unknown'
+    return process.returncode, stdout.decode().strip()
+
+
+async def check_services() -> dict:
+    """
+    The function `check_services` checks the watcher and demo bot services concurrently.
+
+    :return: a dictionary with display name keys and `systemctl is-active` values.
+    """
+    services = {**WATCHER_SERVICES, 'DEMO bot': DEMO_BOT_SERVICE_NAME}
+    results = await asyncio.gather(*(systemctl('is-active', name) for name in services.values()))
+    return {title: output or 'unknown' for title, (_, output) in zip(services, results)}
+
+
+async def control_services(action: str, names: list) -> list:
+    """
+    The function `control_services` starts or stops services concurrently and drops the cached statuses.
+
+    :param action: The `action` parameter is 'start' or 'stop'
+    :type action: str
+    :param names: The `names` parameter is the list of service names
+    :type names: list
+    :return: the list of the services that failed.
+    """
+    results = await asyncio.gather(*(systemctl(action, name, sudo=True) for name in names))
+    service_statuses.invalidate()
+    return [name for name, (code, _) in zip(names, results) if code != 0]
+
+
+async def fetch_metrics() -> list:
+    """
+    The function `fetch_metrics` reads `/metrics.json` of the running workers concurrently.
+
+    :return: a list of the answers, the workers that didn't answer are skipped.
+    """
+    async def fetch(session: aiohttp.ClientSession, port: int):
+        try:
+            async with session.get(f'http://{METRICS_HOST}:{port}/metrics.json') as response:
+                return await response.json()
+        except Exception as e:
+            logging.warning(f'Metrics on port {port} | {e}')
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+        answers = await asyncio.gather(*(fetch(session, port) for port in METRICS_PORTS))
+    return [data for data in answers if data is not None]
+
+
+service_statuses = Cached(check_services, CACHE_SECONDS)
+worker_metrics = Cached(fetch_metrics, CACHE_SECONDS)
+
+
+def worker_health(answers: list) -> str:
+    """
+    The function `worker_health` summarizes the gauges of the workers: the last tick, the number of
+    tracked symbols, the detection latency and the number of pending alerts of each exchange.
+
+    :param answers: The `answers` parameter is the list of `/metrics.json` answers
+    :type answers: list
+    :return: a string, empty if no worker answered.
+    """
+    exchanges = {}
+    for data in answers:
+        for gauge in data['gauges']:
+            exchange = gauge['labels'].get('exchange')
+            if exchange is not None:
+                values = exchanges.setdefault(exchange, {})
+                if gauge['name'] == 'pending_alerts':
+                    # the shards of the sharding mode have their own pipelines
+                    values['pending_alerts'] = values.get('pending_alerts', 0) + gauge['value']
+                else:
+                    values[gauge['name']] = gauge['value']
+        for stage in data['stages']:
+            if stage['stage'] == 'detection':
+                exchanges.setdefault(stage['labels'].get('exchange', ''), {})['detection'] = stage
+    lines = []
+    for exchange, values in sorted(exchanges.items()):
+        parts = []
+        if 'last_tick' in values:
+            parts.append(f'last tick {time.time() - values["last_tick"]:.0f} s ago')
+        if 'symbols' in values:
+            parts.append(f'{values["symbols"]:g} symbols')
+        if 'detection' in values:
+            detection = values['detection']
+            parts.append(f'scan avg {detection["avg"]*10**3:.0f} ms, p95 {detection["p95"]*10**3:.0f} ms')
+        if 'pending_alerts' in values:
+            parts.append(f'{values["pending_alerts"]:g} pending alerts')
+        lines.append(f'{exchange}: {", ".join(parts)}')
+    return '\n'.join(lines)
+
+
+def metrics_summary(answers: list) -> str:
+    """
+    The function `metrics_summary` summarizes the stage latencies and counters of the workers.
+
+    :param answers: The `answers` parameter is the list of `/metrics.json` answers
+    :type answers: list
+    :return: a string, empty if no worker answered.
+    """
+    lines = []
+    for data in answers:
+        for stage in sorted(data['stages'], key=lambda stage: (stage['labels'].get('exchange', ''), stage['stage'])):
+            exchange = stage['labels'].get('exchange', '')
+            lines.append(
+                f'{exchange} {stage["stage"]}: {stage["count"]}x avg {stage["avg"]*10**3:.0f} ms, '
+                f'p95 {stage["p95"]*10**3:.0f} ms, max {stage["max"]*10**3:.0f} ms'.strip()
+            )
+        for counter in data['counters']:
+            labels = ' '.join(str(value) for value in counter['labels'].values())
+            lines.append(f'{labels} {counter["name"]}: {counter["value"]:g}'.strip())
+    return '\n'.join(lines)
+
+
+def alert_report(args: list) -> str:
+    """
+    The function `alert_report` reads the alert store of the workers. Without arguments it counts the
+    alerts of the last 24 hours and lists the last ones, `<exchange> <symbol>` lists the alerts of a
+    symbol in the last 24 hours.
+
+    :param args: The `args` parameter is the list of command arguments
+    :type args: list
+    :return: the report text.
+    """
+    try:
+        store = AlertStore(ALERTS_DATABASE, readonly=True)
+    except sqlite3.Error as e:
+        return f'Alert store unavailable: {e}'
+    try:
+        since = time.time() - 24*60*60
+        if len(args) >= 2:
+            records = store.history(args[0].lower(), args[1].upper(), since)
+            title = f'{args[0].lower()} {args[1].upper()} alerts in 24h:'
+        else:
+            counts = store.counts(since)
+            records = store.recent(ALERTS_LIMIT)
+            title = 'Alerts in 24h: ' + (', '.join(
+                f'{exchange} {count} {status}' for (exchange, status), count in sorted(counts.items())
+            ) or 'none')
+    except sqlite3.Error as e:
+        return f'Alert store unavailable: {e}'
+    finally:
+        store.close()
+    lines = [title] + [
+        f'{time.strftime("%d.%m %H:%M", time.localtime(record.time))} {record.exchange} {record.symbol} '
+        f'{record.kind} {record.percent:+.2f}%' + (f' ({record.status})' if record.status != 'sent' else '')
+        for record in records
+    ]
+    return '\n'.join(lines)
+
+
 @dp.message_handler(commands=['start', 'status'])
 async def status(message: types.Message):
-    bybit_watcher_status = subprocess.run(
-        f'systemctl is-active {BYBIT_WATCHER_SERVICE_NAME}', shell=True,
-        stdout=subprocess.PIPE, universal_newlines=True
-    ).stdout
-    kucoin_watcher_status = subprocess.run(
-        f'systemctl is-active {KUCOIN_WATCHER_SERVICE_NAME}', shell=True,
-        stdout=subprocess.PIPE, universal_newlines=True
-    ).stdout
-    binance_watcher_status = subprocess.run(
-        f'systemctl is-active {BINANCE_WATCHER_SERVICE_NAME}', shell=True,
-        stdout=subprocess.PIPE, universal_newlines=True
-    ).stdout
-    demo_bot_status = subprocess.run(
-        f'systemctl is-active {DEMO_BOT_SERVICE_NAME}', shell=True,
-        stdout=subprocess.PIPE, universal_newlines=True
-    ).stdout
+    statuses, answers = await asyncio.gather(service_statuses(), worker_metrics())
+    health = worker_health(answers)
     await message.answer(
-        f'Hello! I\'m status bot!\nBinance watcher status: {binance_watcher_status}Bybit watcher status: {bybit_watcher_status}Kucoin watcher status: {kucoin_watcher_status}DEMO bot status: {demo_bot_status}'
+        'Hello! I\'m status bot!\n'
+        + ''.join(f'{title} {"watcher " if title in WATCHER_SERVICES else ""}status: {value}\n' for title, value in statuses.items())
+        + (f'\nWorkers:\n{health}' if health else '')
     )
 
 
+@dp.message_handler(commands=['metrics'])
+async def metrics(message: types.Message):
+    summary = metrics_summary(await worker_metrics())
+    await message.answer(f'Metrics:\n{summary}' if summary else 'No worker answered')
+
+
+@dp.message_handler(commands=['alerts'])
+async def alerts(message: types.Message):
+    await message.answer(await asyncio.to_thread(alert_report, message.get_args().split()))
+
+
 @dp.message_handler(commands=['start_watchers'])
 async def start_watchers(message: types.Message):
     await message.answer('Watchers are starting')
-    subprocess.run(f'sudo systemctl start {BINANCE_WATCHER_SERVICE_NAME}', shell=True)
-    subprocess.run(f'sudo systemctl start {BYBIT_WATCHER_SERVICE_NAME}', shell=True)
-    subprocess.run(f'sudo systemctl start {KUCOIN_WATCHER_SERVICE_NAME}', shell=True)
+    failed = await control_services('start', list(WATCHER_SERVICES.values()))
+    if failed:
+        await message.answer(f'Failed to start: {", ".join(failed)}')
 
 
 @dp.message_handler(commands=['stop_watchers'])
 async def stop_watchers(message: types.Message):
-    subprocess.run(f'sudo systemctl stop {BINANCE_WATCHER_SERVICE_NAME}', shell=True)
-    subprocess.run(f'sudo systemctl stop {BYBIT_WATCHER_SERVICE_NAME}', shell=True)
-    subprocess.run(f'sudo systemctl stop {KUCOIN_WATCHER_SERVICE_NAME}', shell=True)
-    await message.answer('All watchers are stopped')
+    failed = await control_services('stop', list(WATCHER_SERVICES.values()))
+    await message.answer(f'Failed to stop: {", ".join(failed)}' if failed else 'All watchers are stopped')
 
 
 @dp.message_handler(commands=['start_demo_bot'])
 async def start_demo_bot(message: types.Message):
     await message.answer('Demo bot is starting')
-    subprocess.run(f'sudo systemctl start {DEMO_BOT_SERVICE_NAME}', shell=True)
+    failed = await control_services('start', [DEMO_BOT_SERVICE_NAME])
+    if failed:
+        await message.answer(f'Failed to start: {DEMO_BOT_SERVICE_NAME}')
 
 
 @dp.message_handler(commands=['stop_demo_bot'])
 async def stop_demo_bot(message: types.Message):
-    subprocess.run(f'sudo systemctl stop {DEMO_BOT_SERVICE_NAME}', shell=True)
-    await message.answer('Demo bot was stopped')
+    failed = await control_services('stop', [DEMO_BOT_SERVICE_NAME])
+    await message.answer(f'Failed to stop: {DEMO_BOT_SERVICE_NAME}' if failed else 'Demo bot was stopped')
 
 
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True)
\ No newline at end of file
+    executor.start_polling(dp, skip_updates=True)
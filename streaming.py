@@ -0,0 +1,160 @@
+from price_store import PriceStore
+from market_index import MarketIndex
+from tick_history import TickHistory
+from metrics import stage_metrics
+from request_scheduler import backoff_delay
+from ccxt.base.errors import NotSupported
+from typing import AsyncIterator
+from loguru import logger
+
+import ccxt.pro
+import aiohttp
+import asyncio
+import time
+import json
+
+
+class CcxtProTransport:
+    """
+    The class `CcxtProTransport` streams tickers of all USDT spot markets of an exchange through ccxt.pro
+    `watch_tickers`.
+    """
+
+    def __init__(self, exchange_id: str, session: aiohttp.ClientSession = None) -> None:
+        """
+        :param exchange_id: The `exchange_id` parameter is the ccxt id of the exchange, e.g. 'binance'
+        :type exchange_id: str
+        :param session: The `session` parameter is an optional HTTP session shared with the rest of the
+        process
+        :type session: aiohttp.ClientSession
+        """
+        self.exchange = getattr(ccxt.pro, exchange_id)({'session': session} if session is not None else {})
+        if not self.exchange.has.get('watchTickers'):
+            raise NotSupported(f'{exchange_id} has no all-market ticker stream')
+
+    async def tickers(self) -> AsyncIterator[dict]:
+        markets = await self.exchange.load_markets()
+        symbols = [
+            symbol for symbol, market in markets.items()
+            if market['quote'] == 'USDT' and market['spot'] and market['active']
+        ]
+        while True:
+            response = await self.exchange.watch_tickers(symbols)
+            yield {symbol: ticker['last'] for symbol, ticker in response.items()}
+
+    async def close(self) -> None:
+        await self.exchange.close()
+
+
+class WebSocketTransport:
+    """
+    The class `WebSocketTransport` streams tickers from a plain websocket server that sends JSON objects
+    of the form `{"BTC/USDT": 27000.5, ...}`. It is used with relays and with a local fake stream server
+    in place of the exchange.
+    """
+
+    def __init__(self, url: str, session: aiohttp.ClientSession = None) -> None:
+        """
+        :param url: The `url` parameter is the websocket url, e.g. 'ws://127.0.0.1:8765'
+        :type url: str
+        :param session: The `session` parameter is an optional HTTP session shared with the rest of the
+        process. Without it the transport opens its own session
+        :type session: aiohttp.ClientSession
+        """
+        self.url = url
+        self._session = session
+        self._own_session = session is None
+
+    async def tickers(self) -> AsyncIterator[dict]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.ws_connect(self.url, heartbeat=30) as ws:
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    yield json.loads(message.data)
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise ws.exception()
+
+    async def close(self) -> None:
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def roll_minutes(store: PriceStore, on_minute=None) -> None:
+    """
+    The function `roll_minutes` starts a new slot in the price store at the beginning of every minute,
+    so the streamed prices are downsampled into the same per-minute slots as in the polling mode.
+
+    :param store: The `store` parameter is the `PriceStore` fed by the stream
+    :type store: PriceStore
+    :param on_minute: The `on_minute` parameter is an optional function called after every new slot
+    """
+    while True:
+        await asyncio.sleep(60 - time.time() % 60)
+        store.advance()
+        if on_minute is not None:
+            on_minute()
+
+
+async def stream_watcher(transport, exchange_name: str, nums_precision: int, store: PriceStore,
+                         index: MarketIndex = None, history: TickHistory = None) -> None:
+    """
+    The function `stream_watcher` reads tickers from a transport and writes them into the current minute
+    slot of the price store and into the tick history. The stream is reopened after errors with
+    jittered exponential backoff.
+
+    :param transport: The `transport` parameter is an object with an async generator method `tickers`
+    yielding `{ticker: price}` dictionaries and a coroutine `close`, e.g. `CcxtProTransport` or
+    `WebSocketTransport`
+    :param exchange_name: The `exchange_name` parameter is a string that represents the name of the
+    exchange. It is used in log messages
+    :type exchange_name: str
+    :param nums_precision: The `nums_precision` parameter is an integer, tickers cheaper than
+    1/10**nums_precision are skipped as in `get_tickers_prices`
+    :type nums_precision: int
+    :param store: The `store` parameter is the `PriceStore` to fill
+    :type store: PriceStore
+    :param index: The `index` parameter is an optional `MarketIndex`, streamed tickers that are not in
+    the index are skipped
+    :type index: MarketIndex
+    :param history: The `history` parameter is an optional `TickHistory`. The streamed updates are
+    downsampled to one tick per minute like in the polling mode, the tick has the last price of every
+    ticker that was updated in the minute
+    :type history: TickHistory
+    """
+    min_price = 1/10**nums_precision
+    # a full-width history row per message would be ~1.4 GB per exchange and day at one message a second
+    minute_prices = {}
+
+    def append_history() -> None:
+        if minute_prices:
+            with stage_metrics.timer('history_append', exchange=exchange_name):
+                history.append(int(time.time() * 10**3), minute_prices)
+            minute_prices.clear()
+
+    roller = asyncio.create_task(roll_minutes(store, append_history if history is not None else None))
+    failures = 0
+    try:
+        while True:
+            try:
+                async for tickers in transport.tickers():
+                    failures = 0
+                    prices = {
+                        ticker: price for ticker, price in tickers.items()
+                        if price is not None and price > min_price and (index is None or ticker in index.symbols)
+                    }
+                    store.update(prices)
+                    if history is not None:
+                        minute_prices.update(prices)
+                    stage_metrics.inc('stream_updates', exchange=exchange_name)
+                    stage_metrics.set('last_tick', time.time(), exchange=exchange_name)
+                    stage_metrics.set('symbols', len(store), exchange=exchange_name)
+            except Exception as e:
+                logger.error(f'{exchange_name} stream | {e}')
+                stage_metrics.inc('stream_errors', exchange=exchange_name)
+                await asyncio.sleep(backoff_delay(failures, base=5))
+                failures += 1
+    finally:
+        roller.cancel()
+        await transport.close()
@@ -0,0 +1,103 @@
+from metrics import stage_metrics
+from request_scheduler import backoff_delay
+from loguru import logger
+
+import aiohttp
+import asyncio
+import time
+
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+
+
+class TelegramDelivery:
+    """
+    The class `TelegramDelivery` sends photos to many Telegram chats concurrently through one keep-alive
+    HTTP session. Requests are spaced to stay under the global and per-chat rate limits of the Bot API,
+    a 429 answer delays the chat by its `retry_after`, other failures are retried with jittered
+    exponential backoff. A photo is uploaded once, the other chats get the returned `file_id`.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, bot_token: str, api_url: str = TELEGRAM_API_URL,
+                 global_rate: float = 30, chat_interval: float = 1, retries: int = 5) -> None:
+        """
+        :param session: The `session` parameter is the shared HTTP session
+        :type session: aiohttp.ClientSession
+        :param bot_token: The `bot_token` parameter is the token of the Telegram bot
+        :type bot_token: str
+        :param api_url: The `api_url` parameter is the Bot API server, e.g. a local fake server in tests
+        :type api_url: str
+        :param global_rate: The `global_rate` parameter is the maximal number of requests per second
+        :type global_rate: float
+        :param chat_interval: The `chat_interval` parameter is the minimal time in seconds between two
+        messages to the same chat
+        :type chat_interval: float
+        :param retries: The `retries` parameter is the number of attempts per chat
+        :type retries: int
+        """
+        self.session = session
+        self.url = f'{api_url}/bot{bot_token}/sendPhoto'
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self.retries = retries
+        self._next_global = 0.0
+        self._next_chat: dict[str, float] = {}
+
+    async def _wait_turn(self, chat_id: str) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+        self._next_global = max(self._next_global, slot) + self.global_interval
+        self._next_chat[chat_id] = slot + self.chat_interval
+        await asyncio.sleep(slot - now)
+
+    async def _send(self, chat_id: str, msg: str, photo) -> dict:
+        for attempt in range(self.retries):
+            await self._wait_turn(chat_id)
+            data = aiohttp.FormData()
+            data.add_field('chat_id', str(chat_id))
+            data.add_field('caption', msg)
+            data.add_field('parse_mode', 'HTML')
+            if isinstance(photo, bytes):
+                data.add_field('photo', photo, filename='photo.png')
+            else:
+                data.add_field('photo', photo)
+            try:
+                with stage_metrics.timer('telegram_request'):
+                    async with self.session.post(self.url, data=data) as response:
+                        r = await response.json()
+                if r['ok']:
+                    return r['result']
+                logger.error(f'Error sending msg to {chat_id}\n{r["description"]}')
+                stage_metrics.inc('telegram_errors', code=r.get('error_code'))
+                if r.get('error_code') == 429:
+                    retry_after = r.get('parameters', {}).get('retry_after', backoff_delay(attempt))
+                    self._next_chat[chat_id] = time.monotonic() + retry_after
+                    continue
+                if 400 <= r.get('error_code', 500) < 500:
+                    return None
+            except Exception as e:
+                logger.error(e)
+                stage_metrics.inc('telegram_errors', code='exception')
+            await asyncio.sleep(backoff_delay(attempt))
+        return None
+
+    async def send_photo(self, chat_ids: list, msg: str, image: bytes) -> None:
+        """
+        The function `send_photo` sends a photo with a caption to all chats. The photo is uploaded to
+        the first chat that accepts it and sent to the other chats by `file_id`.
+
+        :param chat_ids: The `chat_ids` parameter is a list of chat IDs
+        :type chat_ids: list
+        :param msg: The `msg` parameter is the HTML caption of the photo
+        :type msg: str
+        :param image: The `image` parameter is the PNG image
+        :type image: bytes
+        """
+        photo = image
+        pending = list(chat_ids)
+        while pending:
+            result = await self._send(pending.pop(0), msg, photo)
+            if result is not None:
+                photo = result['photo'][-1]['file_id']
+                break
+        await asyncio.gather(*(self._send(chat_id, msg, photo) for chat_id in pending))
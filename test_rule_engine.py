@@ -0,0 +1,36 @@
+from rule_engine import Rule, RuleEngine
+
+import numpy as np
+
+
+RULES = [Rule('pump', 'rise', 5, 5), Rule('spike', 'zscore', 3, 20)]
+
+
+def jump(percent: float) -> np.ndarray:
+    # a quiet minute series with a jump in the newest slot, column 0 is the newest slot
+    rng = np.random.default_rng(1)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, 22)))[::-1]
+    prices[0] = prices[1] * (1 + percent / 100)
+    return prices[None, :]
+
+
+def test_fired_rule_outranks_near_miss():
+    engine = RuleEngine(RULES)
+    prices = jump(4)
+    for ratio in (1.0, 0.7):
+        pumps = engine.evaluate(['COIN/USDT'], prices, ratio=ratio)
+        assert len(pumps) == 1
+        assert pumps[0].rule.kind == 'zscore'
+        assert RuleEngine.confirmed(pumps[0])
+
+
+def test_kind_order_among_fired_rules():
+    pumps = RuleEngine(RULES).evaluate(['COIN/USDT'], jump(6), ratio=0.7)
+    assert pumps[0].rule.kind == 'rise'
+    assert RuleEngine.confirmed(pumps[0])
+
+
+def test_near_miss_without_fired_rule():
+    pumps = RuleEngine([RULES[0]]).evaluate(['COIN/USDT'], jump(4), ratio=0.7)
+    assert pumps[0].rule.kind == 'rise'
+    assert not RuleEngine.confirmed(pumps[0])
@@ -0,0 +1,214 @@
+from datetime import datetime, timezone, timedelta
+from loguru import logger
+
+import numpy as np
+import asyncio
+import json
+import time
+import os
+
+
+MAGIC = 0x5449434B48495354  # 'TICKHIST'
+HEADER = np.dtype([('magic', '<i8'), ('width', '<i8')])
+MIN_CAPACITY = 1024
+
+
+def day_of(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp / 10**3, timezone.utc).strftime('%Y-%m-%d')
+
+
+class TickHistory:
+    """
+    The class `TickHistory` is an append-only store of tick prices of one exchange. The directory holds
+    `symbols.json`, the global symbol index, and daily segment files `{day}.{part}.bin`. A segment is a
+    16-byte header followed by fixed-width float64 rows `[timestamp, price of symbol 0, price of symbol
+    1, ...]`, empty cells are NaN. A new part is started when the symbol index outgrows the row width.
+    Appending a tick is one buffered write, the file is flushed at most every `flush_seconds` seconds.
+    Reads are zero-copy `np.memmap` views.
+    """
+
+    def __init__(self, directory: str, retention_days: int = 30, flush_seconds: float = 10) -> None:
+        """
+        :param directory: The `directory` parameter is the directory of the exchange history
+        :type directory: str
+        :param retention_days: The `retention_days` parameter is the number of days kept on disk
+        :type retention_days: int
+        :param flush_seconds: The `flush_seconds` parameter is the maximal time in seconds an appended
+        tick stays in the write buffer
+        :type flush_seconds: float
+        """
+        self.directory = directory
+        self.retention_days = retention_days
+        self.flush_seconds = flush_seconds
+        self._flushed = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self.symbols: list[str] = []
+        self._index: dict[str, int] = {}
+        symbols_filename = os.path.join(directory, 'symbols.json')
+        if os.path.exists(symbols_filename):
+            with open(symbols_filename) as f:
+                for symbol in json.load(f):
+                    self._add_symbol(symbol)
+        self._saved_symbols = len(self.symbols)
+        self._file = None
+        self._day = None
+        self._width = 0
+
+    def _add_symbol(self, symbol: str) -> int:
+        column = len(self.symbols)
+        self._index[symbol] = column
+        self.symbols.append(symbol)
+        return column
+
+    def _save_symbols(self) -> None:
+        filename = os.path.join(self.directory, 'symbols.json')
+        with open(f'{filename}.tmp', 'w') as f:
+            json.dump(self.symbols, f)
+        os.replace(f'{filename}.tmp', filename)
+        self._saved_symbols = len(self.symbols)
+
+    def _open_segment(self, day: str) -> None:
+        self.close()
+        parts = [name for name in os.listdir(self.directory) if name.startswith(f'{day}.') and name.endswith('.bin')]
+        width = 1 + max(MIN_CAPACITY, 1 << (len(self.symbols) - 1).bit_length())
+        filename = os.path.join(self.directory, f'{day}.{len(parts)}.bin')
+        self._file = open(filename, 'ab')
+        np.array([(MAGIC, width)], dtype=HEADER).tofile(self._file)
+        self._day = day
+        self._width = width
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, timestamp: int, prices: dict) -> None:
+        """
+        The function `append` writes one tick.
+
+        :param timestamp: The `timestamp` parameter is the time of the tick in milliseconds
+        :type timestamp: int
+        :param prices: The `prices` parameter is a dictionary with ticker symbols as keys and their
+        prices as values
+        :type prices: dict
+        """
+        for symbol in prices:
+            if symbol not in self._index:
+                self._add_symbol(symbol)
+        if len(self.symbols) != self._saved_symbols:
+            self._save_symbols()
+        day = day_of(timestamp)
+        if day != self._day or len(self.symbols) >= self._width:
+            self._open_segment(day)
+        row = np.full(self._width, np.nan)
+        row[0] = timestamp
+        index = self._index
+        for symbol, price in prices.items():
+            row[index[symbol] + 1] = price
+        self._file.write(row.tobytes())
+        if time.monotonic() - self._flushed >= self.flush_seconds:
+            self._file.flush()
+            self._flushed = time.monotonic()
+
+    def segments(self, start_day: str = '', end_day: str = '9999') -> list:
+        """
+        The function `segments` lists the segment files between two days, ordered by time.
+
+        :return: a list of file paths.
+        """
+        names = [
+            name for name in os.listdir(self.directory)
+            if name.endswith('.bin') and start_day <= name.split('.')[0] <= end_day
+        ]
+        names.sort(key=lambda name: (name.split('.')[0], int(name.split('.')[1])))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def load_segment(filename: str) -> np.memmap:
+        """
+        The function `load_segment` maps a segment file without copying it.
+
+        :param filename: The `filename` parameter is the path of the segment
+        :type filename: str
+        :return: a read-only (ticks x width) float64 memmap, column 0 holds the timestamps and column
+        i + 1 the prices of `symbols[i]`.
+        """
+        header = np.fromfile(filename, dtype=HEADER, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f'{filename} is not a tick history segment')
+        width = int(header['width'])
+        rows = (os.path.getsize(filename) - HEADER.itemsize) // (width * 8)
+        if rows == 0:
+            return np.empty((0, width))
+        return np.memmap(filename, dtype=np.float64, mode='r', offset=HEADER.itemsize, shape=(rows, width))
+
+    def series(self, symbol: str, start_day: str = '', end_day: str = '9999') -> tuple:
+        """
+        The function `series` returns the ticks of one symbol.
+
+        :param symbol: The `symbol` parameter is the ticker symbol
+        :type symbol: str
+        :return: a tuple `(timestamps, prices)` of NumPy arrays, ticks without a price are skipped.
+        """
+        column = self._index[symbol] + 1
+        timestamps, prices = [], []
+        for filename in self.segments(start_day, end_day):
+            data = self.load_segment(filename)
+            if column < data.shape[1]:
+                known = ~np.isnan(data[:, column])
+                timestamps.append(data[known, 0])
+                prices.append(data[known, column])
+        if not timestamps:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(timestamps), np.concatenate(prices)
+
+    def compact(self, day: str) -> None:
+        """
+        The function `compact` merges the parts of a finished day into one segment whose rows are only
+        as wide as the used symbol columns.
+
+        :param day: The `day` parameter is the day in the 'YYYY-MM-DD' format
+        :type day: str
+        """
+        parts = self.segments(day, day)
+        if not parts or (len(parts) == 1 and self.load_segment(parts[0]).shape[1] == len(self.symbols) + 1):
+            return
+        width = len(self.symbols) + 1
+        filename = os.path.join(self.directory, f'{day}.compact')
+        with open(filename, 'wb') as f:
+            np.array([(MAGIC, width)], dtype=HEADER).tofile(f)
+            for part in parts:
+                data = self.load_segment(part)
+                rows = np.full((len(data), width), np.nan)
+                rows[:, :data.shape[1]] = data[:, :width]
+                rows.tofile(f)
+                del data
+        for part in parts:
+            os.remove(part)
+        os.replace(filename, os.path.join(self.directory, f'{day}.0.bin'))
+
+    def maintain(self) -> None:
+        """
+        The function `maintain` deletes the segments older than `retention_days` and compacts the
+        finished days.
+        """
+        today = datetime.now(timezone.utc)
+        oldest = (today - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        for filename in self.segments(end_day=oldest):
+            if os.path.basename(filename).split('.')[0] < oldest:
+                os.remove(filename)
+        for day in sorted({os.path.basename(filename).split('.')[0] for filename in self.segments()}):
+            if day < today.strftime('%Y-%m-%d') and day != self._day:
+                self.compact(day)
+
+    async def run(self, interval_minutes: float = 60) -> None:
+        """
+        The function `run` calls `maintain` in a thread every `interval_minutes` minutes until it is
+        cancelled.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.maintain)
+            except Exception as e:
+                logger.error(f'{self.directory} | {e}')
+            await asyncio.sleep(interval_minutes * 60)
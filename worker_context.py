@@ -0,0 +1,28 @@
+from ohlcv_cache import OhlcvCache
+from news_service import NewsService
+from telegram_delivery import TelegramDelivery
+from alert_bus import AlertBus
+from settings import SettingsWatcher
+from alert_store import AlertStore
+from typing import NamedTuple
+
+import aiohttp
+
+
+class WorkerContext(NamedTuple):
+    """
+    The class `WorkerContext` holds the services that are created once per process and shared by the
+    workers of all exchanges. `consolidator` is the cross-exchange `Consolidator`, None if every
+    exchange detects on its own, `bus` is the `AlertBus` that receives every sent alert and `settings`
+    is the `SettingsWatcher` with the current settings of the process. `alert_store` is the
+    `AlertStore` that records the sent alerts and holds the cooldowns, None if disabled.
+    """
+    session: aiohttp.ClientSession
+    ohlcv_cache: OhlcvCache
+    news_service: NewsService
+    renderer: object
+    delivery: TelegramDelivery
+    consolidator: object = None
+    bus: AlertBus = None
+    settings: SettingsWatcher = None
+    alert_store: AlertStore = None